@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+
+import sys, os, argparse
+sys.path.append(os.getcwd())
+from roach_tools.digital_sideband_separation.dss_reanalyzer import DssReanalyzer
+
+parser = argparse.ArgumentParser(description="Recompute the sideband ratios, constants and SRR from the raw data of a DSS test archive.")
+parser.add_argument(type=str, dest="datafile", help="Tar file with the data of the DSS test.")
+parser.add_argument("-o", "--outfile", type=str, dest="outfile", default="dss_reanalysis.npz",
+    help="Results file (.npz).")
+parser.add_argument("-m", "--method", type=str, dest="method", default="linear",
+    choices=["linear", "pchip", "spline"], help="Interpolation method of the unmeasured channels.")
+parser.add_argument("-s", "--smoothing", type=float, dest="smoothing", default=0,
+    help="Smoothing factor of the spline interpolation.")
+parser.add_argument("-n", "--no_kerr", dest="kerr_correction", action="store_false",
+    help="Don't apply the Kerr correction to the SRR.")
+parser.add_argument("-w", "--workers", type=int, dest="nworkers", default=None,
+    help="Number of analysis processes (default: number of CPUs).")
+args = parser.parse_args()
+
+cal_interp = {'method' : args.method, 'smoothing' : args.smoothing}
+reanalyzer = DssReanalyzer(args.datafile, cal_interp, args.kerr_correction, args.nworkers)
+results = reanalyzer.run(args.outfile)
+
+for key in sorted(results):
+    print key + ": " + str(results[key].shape)
@@ -277,7 +277,8 @@ class ADCCalibrate:
         elif zdoks!=1 and zdoks!=0:
            logger.error("ZDOK " + str(zdoks) + " is not a valid input, aborting...")
         else:
-           self.inl.do_inl(zdoks)
+           # use the OGP fit residuals in memory if the OGP was done here
+           self.inl.do_inl(zdoks, self.ogp.accumulators.get(zdoks))
            if self.config:
                self.cf.write_inls(zdoks, self.inl.inls)
                self.cf.write_to_file()
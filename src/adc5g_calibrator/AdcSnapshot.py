@@ -87,7 +87,8 @@ class AdcSnapshot:
                 i = iteration if iteration is not None else 1
                 fn = "testdata/adc_snapshots/snapshot_%s_%i" % (snap, i) 
                 data = np.genfromtxt(fn, dtype=int)
-            data_bin = list(((p+128)>>1) ^ (p+128) for p in data)
+            data = np.asarray(data, dtype=int) + 128
+            data_bin = (data >> 1) ^ data
             for i in range(cores_per_snap):
                 data_out.append(data_bin[i::cores_per_snap])
         return data_out          
@@ -70,8 +70,13 @@ class INL:
         for i in range(self.n_cores):
             self.spi.set_inl_registers(self.cores[i], inls[i])
 
-    def do_inl(self, zdok):
-       
+    def do_inl(self, zdok, accumulator = None):
+        """
+        Compute and set the INL corrections from the residuals of the OGP core
+        fits. If accumulator (the CoreFitAccumulator of the OGP fits of this zdok)
+        is given, the residuals are taken from memory, otherwise they are read 
+        from the .res file of the OGP calibration.
+        """
         self.set_zdok(zdok)
 
         #timestamp = '_'
@@ -89,7 +94,12 @@ class INL:
         #fit_cores.fit_inl(FNAME + ".res")
         # The .res file used here is a 256 by 4 (by cores?) list of residuals.  TBF: who writes this?
         # This is used to compute the INLs, which are stored in inl*.meas
-        self.inls = fit_cores.fit_inl(self.get_snapshot_res_filename(), outname = self.get_inl_meas_filename())
+        if accumulator is not None:
+            corrections = accumulator.fit_inl()
+            np.savetxt(self.get_inl_meas_filename(), corrections, fmt=('%3d','%7.4f','%7.4f','%7.4f','%7.4f'))
+            self.inls = corrections.transpose()[1:5]
+        else:
+            self.inls = fit_cores.fit_inl(self.get_snapshot_res_filename(), outname = self.get_inl_meas_filename())
 
         #rww_tools.update_inl(fname = 'inl%s.meas'%timestamp)
         self.update_inl() #fname = self.get_inl_meas_filename())
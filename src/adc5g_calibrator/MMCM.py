@@ -20,6 +20,7 @@ class MMCM:
 
         #self.roach_original_control = {'0':None, '1':None}
 
+        self.mmcm_phases = {} # current MMCM phase step of every zdok, if known
         self.set_zdok(zdok)
 
     def set_zdok(self, zdok):
@@ -31,11 +32,27 @@ class MMCM:
     def get_snap_name(self, zdok):
         return "adcsnap%d" % zdok
 
-    def calibrate_mmcm_phase(self, bitwidth=8, man_trig=True, wait_period=2, ps_range=56, set_phase = True):
+    def calibrate_mmcm_phase(self, bitwidth=8, man_trig=True, wait_period=2, ps_range=56, set_phase = True, coarse_step=4):
         """
-        This function steps through all 56 steps of the MMCM clk-to-out 
-        phase and finds total number of glitchss in the test vector ramp 
+        This function searches the 56 steps of the MMCM clk-to-out 
+        phase for the total number of glitches in the test vector ramp 
         per core. It then finds the least glitchy phase step and sets it.
+        
+        The search first takes snapshots at a coarse subset of the phases
+        (every coarse_step steps, and the last one), and then only refines
+        the edges of the glitch-free windows found, between a glitch-free
+        and a glitchy coarse phase. The glitches of the phases not measured
+        are interpolated from the measured ones. coarse_step=1 measures
+        all the phases. If the selected phase has glitches when it is set,
+        all the phases not measured yet are measured, and the optimal phase
+        is selected again.
+        The MMCM phase is tracked with a counter (see set_mmcm_phase()), so
+        it is only rewound to the start when its position is unknown.
+        :return: tuple (optimal_ps, glitches_per_ps). Note that
+            glitches_per_ps has the measured glitches only for the phases
+            measured in the search, the other values are interpolated (all
+            the values are measured with coarse_step=1, or after a failed
+            check of the optimal phase).
         """
 
         snap_names = [self.snap_name] #["adcsnap%d" % self.zdok]
@@ -43,34 +60,54 @@ class MMCM:
         logger.debug("current spi control: " + str(self.spi.roach_original_control[str(self.zdok)]))
         self.spi.sync_adc()
 
-        glitches_per_ps = []
-
-        #start off by decrementing the mmcm right back to the beginning
-        logger.debug("decrementing mmcm to start")
-        for ps in range(ps_range):
-            self.spi.inc_mmcm_phase(inc=0)
-
-        # then step back up throught the phases counting glitches
-        for ps in range(ps_range):
-            glitches = self.get_total_glitches(snap_names, man_trig, wait_period, ps)
-            glitches_per_ps.append(glitches)
-            self.spi.inc_mmcm_phase()
+        glitches = {} # glitches of every measured phase
+
+        # coarse search, ascending from the start
+        coarse_phases = sorted(set(range(0, ps_range, coarse_step) + [ps_range-1]))
+        for ps in coarse_phases:
+            self.set_mmcm_phase(ps, ps_range)
+            glitches[ps] = self.get_total_glitches(snap_names, man_trig, wait_period, ps)
+
+        # refine the edges of the glitch-free windows, descending from
+        # the current phase (the last coarse phase)
+        refine_phases = set()
+        for start, end in zip(coarse_phases[:-1], coarse_phases[1:]):
+            if (glitches[start] == 0) != (glitches[end] == 0):
+                refine_phases.update(range(start+1, end))
+        for ps in sorted(refine_phases, reverse=True):
+            self.set_mmcm_phase(ps, ps_range)
+            glitches[ps] = self.get_total_glitches(snap_names, man_trig, wait_period, ps)
+        logger.debug("MMCM phases measured: %d of %d" % (len(glitches), ps_range))
+
+        # interpolate the phases not measured: inside glitch-free windows
+        # this gives zero, and inside glitchy regions non-zero values
+        measured = sorted(glitches)
+        glitches_per_ps = [int(round(gl)) for gl in np.interp(range(ps_range), 
+            measured, [glitches[ps] for ps in measured])]
 
         # now that you've gathered that data, use it to find
         # the optimal phase for the MMCM
         optimal_ps = self.find_optimal_phase(glitches_per_ps)
         if optimal_ps is not None and set_phase:
             # if you found something, set the hardware!
-            # first, get back to the start
-            for ps in range(ps_range):
-                self.spi.inc_mmcm_phase(inc=0)
-            # then step up to the optimal phase    
-            for ps in range(optimal_ps):
-                self.spi.inc_mmcm_phase()
+            self.set_mmcm_phase(optimal_ps, ps_range)
             # now just double check that there's no glitches here    
-            glitches = self.get_total_glitches(snap_names, man_trig, wait_period, ps)
-            if glitches != 0:
-                tmsg = "MMCM Optimal Phase of %d should not produce any glitches of %d" % (optimal_ps, glitches)
+            glitches[optimal_ps] = self.get_total_glitches(snap_names, man_trig, wait_period, optimal_ps)
+            if glitches[optimal_ps] != 0 and len(glitches) < ps_range:
+                # the interpolation missed a glitchy region, measure all
+                # the remaining phases and find the optimal phase again
+                logger.info("MMCM phase %d has glitches, measuring all the phases" % optimal_ps)
+                for ps in range(ps_range):
+                    if ps not in glitches:
+                        self.set_mmcm_phase(ps, ps_range)
+                        glitches[ps] = self.get_total_glitches(snap_names, man_trig, wait_period, ps)
+                glitches_per_ps = [glitches[ps] for ps in range(ps_range)]
+                optimal_ps = self.find_optimal_phase(glitches_per_ps)
+                if optimal_ps is not None:
+                    self.set_mmcm_phase(optimal_ps, ps_range)
+                    glitches[optimal_ps] = self.get_total_glitches(snap_names, man_trig, wait_period, optimal_ps)
+            if optimal_ps is not None and glitches[optimal_ps] != 0:
+                tmsg = "MMCM Optimal Phase of %d should not produce any glitches of %d" % (optimal_ps, glitches[optimal_ps])
                 logger.info(tmsg);
                 raise Exception(tmsg)
 
@@ -79,6 +116,25 @@ class MMCM:
 
         return optimal_ps, glitches_per_ps        
 
+    def set_mmcm_phase(self, ps, ps_range=56):
+        """
+        Move the MMCM phase to phase step ps, with the minimum number of
+        increments or decrements from the current phase. If the current
+        phase is unknown, first decrement the MMCM right back to the 
+        beginning (ps_range steps).
+        """
+        if self.zdok not in self.mmcm_phases:
+            logger.debug("decrementing mmcm to start")
+            for i in range(ps_range):
+                self.spi.inc_mmcm_phase(inc=0)
+            self.mmcm_phases[self.zdok] = 0
+
+        while self.mmcm_phases[self.zdok] < ps:
+            self.spi.inc_mmcm_phase()
+            self.mmcm_phases[self.zdok] += 1
+        while self.mmcm_phases[self.zdok] > ps:
+            self.spi.inc_mmcm_phase(inc=0)
+            self.mmcm_phases[self.zdok] -= 1
    
     def get_total_glitches(self, snap_names, man_trig, wait_period, iteration):
 
@@ -88,12 +144,8 @@ class MMCM:
     def count_glitches(self, core, bitwidth=8):
         "Counts number of times the expected result is not found in the ramp."
         ramp_max = 2**bitwidth - 1
-        glitches = 0
-        for i in range(len(core)-1):
-            diff = core[i+1] - core[i]
-            if (diff!=1) and (diff!=-ramp_max):
-                glitches += 1
-        return glitches        
+        diff = np.diff(np.asarray(core, dtype=int))
+        return int(np.count_nonzero((diff != 1) & (diff != -ramp_max)))
 
     def find_optimal_phase_old(self, glitches_per_ps):    
         "Historical method: has bugs concerning edge cases"
@@ -143,7 +195,7 @@ class MMCM:
         if len(indx) > 0:
             # if there is more then one sequence of zero glitches
             # with the largest length, arbitrarily choose the first
-            rgIndx = indx[0] if len(indx[0]) == 1 else indx[0][0]
+            rgIndx = indx[0][0]
             range = sqs[rgIndx]
             # choose the midpoint
             optimal_phase = range[0] + int((range[1] - range[0])/2) 
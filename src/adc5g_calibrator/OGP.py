@@ -9,10 +9,11 @@ logger = logging.getLogger('adc5gLogging')
 
 class OGP:
 
-    def __init__(self, zdok = 0, dir = None, gpib = None, spi = None, adc = None, now = None, roach_name = None, test = False, clockrate = None):
+    def __init__(self, zdok = 0, dir = None, gpib = None, spi = None, adc = None, now = None, roach_name = None, test = False, clockrate = None, save_files = True):
 
         self.dir = dir
         self.test = test
+        self.save_files = save_files # write the snapshots and fit results to text files
         self.roach_name = roach_name if roach_name is not None else "noroach" 
         self.set_clockrate(clockrate)
 
@@ -33,6 +34,7 @@ class OGP:
 
         #self.samp_freq = 2*self.clockrate
         self.ogps = []
+        self.accumulators = {} # fit results of every zdok, also used for INL
 
     def set_clockrate(self, clockrate):
         self.clockrate = clockrate
@@ -157,21 +159,30 @@ class OGP:
           rpt  The number of repeats.  Defaults to 1.  The c1 .. c4 files mentioned
                above are overwritten with each repeat, but new rows of data are added
            to the .fit file for each pass.
+
+        The snapshots are fitted directly from memory. The files are only written 
+        if save_files is True.
         """
         avg_pwr_sinad = 0
+        accumulator = self.accumulators.setdefault(self.zdok, fit_cores.CoreFitAccumulator())
         for i in range(repeat):
           # We skip this interaction with hardware if this is a test, use 
           if not self.test:
               snap = self.adc.get_adc_snapshot(man_trig=True, wait_period=2)
-              np.savetxt(fname, snap,fmt='%d')
+              if self.save_files:
+                  np.savetxt(fname, snap,fmt='%d')
               fname2 = fname
           else:
               # if we're testing, use the intermediate files
+              snap = None
               fname2 = "%s.%d" % (fname, i)
           ogp, pwr_sinad = fit_cores.fit_snap(freq
                                             , self.samp_freq
                                             , fname2
                                             , clear_avgs = i == 0 and not donot_clear
-                                            , prnt = i == repeat-1)
+                                            , prnt = i == repeat-1
+                                            , snap = snap
+                                            , write_files = self.save_files
+                                            , accumulator = accumulator)
           avg_pwr_sinad += pwr_sinad
         return ogp, avg_pwr_sinad/repeat        
@@ -29,6 +29,7 @@ class Adc5gCalibrator(Experiment):
         self.freqs = np.linspace(0, self.bw, self.nchannels, endpoint=False)
         self.now = datetime.datetime.now()
         self.caldir = self.settings.caldir + '_' + self.now.strftime('%Y-%m-%d %H:%M:%S')
+        self.adccals = {} # ADCCalibrate objects of every zdok
 
         # figures and axes
         if self.settings.plot_snapshots:
@@ -151,7 +152,7 @@ class Adc5gCalibrator(Experiment):
         (https://github.com/nrao/adc5g_devel).
         """
         for zdok_info in self.settings.snapshots_info:
-            adccal = self.create_adccalibrate_object(zdok_info['zdok'], zdok_info['names'][0])
+            adccal = self.get_adccalibrate_object(zdok_info['zdok'], zdok_info['names'][0])
             adccal.do_ogp(zdok_info['zdok'], self.test_freq, 10)
 
     def perform_inl_calibration(self):
@@ -160,7 +161,7 @@ class Adc5gCalibrator(Experiment):
         (https://github.com/nrao/adc5g_devel).
         """
         for zdok_info in self.settings.snapshots_info:
-            adccal = self.create_adccalibrate_object(zdok_info['zdok'], zdok_info['names'][0])
+            adccal = self.get_adccalibrate_object(zdok_info['zdok'], zdok_info['names'][0])
             adccal.do_inl(zdok_info['zdok'])
 
     def load_ogp_calibration(self):
@@ -179,6 +180,19 @@ class Adc5gCalibrator(Experiment):
             adccal = self.create_adccalibrate_object(zdok_info['zdok'], zdok_info['names'][0])
             adccal.load_calibrations(self.settings.loaddir, zdok_info['zdok'], ['inl'])
 
+    def get_adccalibrate_object(self, zdok, snapshot):
+        """
+        Get the ADCCalibrate object of a ZDOK, creating it the first time.
+        Reusing the object lets the INL calibration use the OGP fit results
+        in memory.
+        :param zdok: ZDOK port number of the ADC (0 or 1).
+        :param snapshot: snapshot block name from where extraxt the data.
+        :return: adc5g_devel ADCCalibrate object.
+        """
+        if zdok not in self.adccals:
+            self.adccals[zdok] = self.create_adccalibrate_object(zdok, snapshot)
+        return self.adccals[zdok]
+
     def create_adccalibrate_object(self, zdok, snapshot):
         """
         Create the appropate ADCCalibrate object with the parameters from 
@@ -13,25 +13,114 @@ from scipy.optimize import leastsq
 from numpy import arccos, pi, empty, arange, array, absolute
 from matplotlib.pyplot import plot
 from scipy.special import erfc
+import numpy as np
 
 logger = logging.getLogger('adc5gLogging')
 
-sum_result = zeros((15), dtype=float)
-result_cnt = 0
-code_errors = zeros((256,4), dtype='float')
-ce_counts = zeros((256, 4), dtype='int32')
 timestamp = ''
 
+class CoreFitAccumulator:
+  """
+  Accumulates the results of the core fits of any number of snapshots of an
+  ADC (see fit_snap()): the sum of the OGP results, to average them, and the
+  sum and count of the residuals at each output code of each core, the raw
+  data for the INL corrections. Use one accumulator per ADC (zdok), so
+  several ADCs can be calibrated at the same time.
+  """
+  def __init__(self, n_cores=4):
+    self.n_cores = n_cores
+    self.clear()
+
+  def clear(self):
+    self.sum_result = zeros((15), dtype=float)
+    self.result_cnt = 0
+    self.code_errors = zeros((256, self.n_cores), dtype='float')
+    self.ce_counts = zeros((256, self.n_cores), dtype='int32')
+
+  def get_residuals(self):
+    """
+    Average residual at each output code (offset binary) of each core, in
+    the a, b, c, d order of the .res files (cores 1, 3, 2, 4). The codes
+    with one or less residual in any core are set to 0.
+    """
+    res = self.code_errors / np.maximum(self.ce_counts, 1)
+    res[self.ce_counts.min(axis=1) <= 1] = 0
+    return res[:, [0, 2, 1, 3]]
+
+  def fit_inl(self):
+    """
+    Compute the INL corrections from the accumulated residuals (see 
+    fit_inl_residuals()).
+    """
+    return fit_inl_residuals(self.get_residuals())
+
 def fitsin(p, s, c):
   return p[0] +  p[1] * s + p[2] * c
 
 def sin_residuals(p, s, c, adc):
   res = adc - fitsin(p, s, c)
-  for i in range(adc.size):
-    if adc[i] == -128 or adc[i] == 127:
-      res[i] = 0
+  res[(adc == -128) | (adc == 127)] = 0
   return res
 
+def fit_cores_array(snap, sig_freq, samp_freq, n_cores=4):
+  """
+  Fit a sine wave to a snapshot of data, and to each of its cores (the
+  samples are interleaved by core), directly from the snapshot array.
+  The fit parameters are linear (offset, sin and cos amplitudes), so the
+  fits are solved in closed form with linear least squares (5 fits of 3
+  parameters). Clipped samples (codes -128 and 127) are excluded from the
+  fits.
+
+  Returns a tuple (params, fit0, core_fit, pwr_sinad, code_errors, ce_counts):
+    params      (n_cores+1)x3 array with the (offset, sin, cos) parameters
+                of the whole snapshot (row 0) and of each core (rows 1..).
+    fit0        fitted sine of the whole snapshot for every sample.
+    core_fit    fitted sine of its core for every sample.
+    pwr_sinad   SINAD of the whole snapshot fit (linear power ratio).
+    code_errors 256 x n_cores array with the sum of the residuals (code - fit)
+                at each output code (offset binary) of each core.
+    ce_counts   256 x n_cores array with the number of residuals added.
+  """
+  adc = np.asarray(snap, dtype=int).flatten()
+  data_cnt = adc.size
+  del_phi = 2 * math.pi * sig_freq / samp_freq
+  phase = del_phi * np.arange(data_cnt)
+  s = np.sin(phase)
+  c = np.cos(phase)
+  core = np.arange(data_cnt) % n_cores
+
+  # weights of every sample in every fit (0: whole snapshot, 1..: cores)
+  valid = (adc != -128) & (adc != 127)
+  weights = np.vstack((valid, valid & (core == np.arange(n_cores)[:, np.newaxis])))
+
+  # solve every fit with linear least squares (a fit with too few
+  # unclipped samples gets the minimum norm solution, with a warning)
+  basis = np.vstack((np.ones(data_cnt), s, c)).T
+  params = np.zeros((n_cores+1, 3))
+  for k, fit_weights in enumerate(weights):
+    params[k], _, rank, _ = np.linalg.lstsq(basis[fit_weights], adc[fit_weights], rcond=None)
+    if rank < 3:
+      fit_name = "snapshot" if k == 0 else "core %d" % k
+      logger.warning("Not enough unclipped samples to fit the %s (%d samples)" % 
+        (fit_name, np.count_nonzero(fit_weights)))
+
+  fit0 = fitsin(params[0], s, c)
+  core_params = params[1 + core]
+  core_fit = core_params[:, 0] + core_params[:, 1] * s + core_params[:, 2] * c
+
+  ssq0 = np.sum((adc - fit0)**2)
+  amp0 = math.sqrt(params[0][1]**2 + params[0][2]**2)
+  pwr_sinad = (amp0**2)/(2*ssq0/data_cnt)
+
+  # residuals at each output code of each core
+  bins = (adc + 128) * n_cores + core
+  code_errors = np.bincount(bins, weights=adc - core_fit, minlength=256*n_cores)
+  ce_counts = np.bincount(bins, minlength=256*n_cores)
+  code_errors = np.reshape(code_errors, (256, n_cores))
+  ce_counts = np.reshape(ce_counts, (256, n_cores)).astype('int32')
+
+  return params, fit0, core_fit, pwr_sinad, code_errors, ce_counts
+
 def test_fit_snap():
 
     # default values: from nrao_adc5g_test
@@ -47,6 +136,7 @@ def test_fit_snap():
 
     #global freq
     avg_pwr_sinad = 0
+    accumulator = CoreFitAccumulator()
     #if fr == 0:
     #  fr = freq
     for i in range(rpt):
@@ -56,7 +146,7 @@ def test_fit_snap():
       print("savetxt to ..." + fn)
       #np.savetxt(fn, snap,fmt='%d')
       ogp, pwr_sinad = fit_snap(fr, samp_freq, name,\
-         clear_avgs = i == 0 and not donot_clear, prnt = i == rpt-1)
+         clear_avgs = i == 0 and not donot_clear, prnt = i == rpt-1, accumulator = accumulator)
       avg_pwr_sinad += pwr_sinad
     print ogp[3:]    
     ogp = ogp[3:]
@@ -67,66 +157,37 @@ def test_fit_snap():
     diffs = [(abs(x-y), (abs((x-y)/y))*100.) for x, y in zip(t,ogp)] 
     print diffs
     
-def fit_snap(sig_freq, samp_freq, fname, clear_avgs=True, prnt=True):
+def fit_snap(sig_freq, samp_freq, fname, clear_avgs=True, prnt=True, snap=None, write_files=True,
+  accumulator=None):
   """
-  Given a file containing a snapshot of data, separate the data from the
-  4 cores and fit a separate sine wave to each.  From the dc offset, gain
-  and phase of the four fits, report the average and the difference of each
-  core from the average.  Write a line in fname.fit giving these values.
-  Compute the average difference between the fitted value and measured value
-  for each level of each core averaged over the samples (the raw data for
-  INL corrections) and write to fname.res.
+  Given a snapshot of data (or a file containing it), separate the data from
+  the 4 cores and fit a separate sine wave to each (see fit_cores_array()).
+  From the dc offset, gain and phase of the four fits, report the average and
+  the difference of each core from the average.  Write a line in fname.ogp
+  giving these values.  Compute the average difference between the fitted
+  value and measured value for each level of each core averaged over the
+  samples (the raw data for INL corrections) and write to fname.res.
+
+  If snap is given, the data is taken from it instead of reading fname, and
+  fname is only the prefix of the output files. The output files are written
+  only if write_files is True.
+
+  The results are accumulated in accumulator (a CoreFitAccumulator), to
+  average them over several snapshots. If None, a new one is used.
 
   Internally, cores 1-4 are in time sequence, but when the data is
   written out, write in teh sequence 1324 for cores abcd.
   """
-  global sum_result, result_cnt, code_errors, ce_counts
-  p0 = [128.0, 90.0, 90.0]
+  if accumulator is None:
+    accumulator = CoreFitAccumulator()
   ogp = ()
-  
-  # Create lists to hold parameters at sample rate
-  adc = []    # adc value
-  s = []        # sin of signal freq
-  c = []        # cos of signal freq
-  
-  del_phi = 2 * math.pi * sig_freq / samp_freq
-  ifn = fname 
-  ifd=open(ifn, 'r')
-  ofn = fname  + ".ogp"
-  ofd = open(ofn, 'a')
-  if prnt:
-    cfd1fn = fname  + ".a"
-    cfd1 = open(cfd1fn, 'w')
-    cfd2fn = fname  + ".b"
-    cfd2 = open(cfd2fn, 'w')
-    cfd3fn = fname  + ".c"
-    cfd3 = open(cfd3fn, 'w')
-    cfd4fn = fname  + ".d"
-    cfd4 = open(cfd4fn, 'w')
-  data_cnt = 0
-  for line in ifd:
-    if line[0] == "#":
-      continue
-    adc += [int(line)]
-    s += [math.sin(del_phi * data_cnt)]
-    c += [math.cos(del_phi * data_cnt)]
-    data_cnt += 1
-  
-  core1 = adc[0:: 4]
-  core2 = adc[1:: 4]
-  core3 = adc[2:: 4]
-  core4 = adc[3:: 4]
-  s1 = s[0:: 4]
-  s2 = s[1:: 4]
-  s3 = s[2:: 4]
-  s4 = s[3:: 4]
-  c1 = c[0:: 4]
-  c2 = c[1:: 4]
-  c3 = c[2:: 4]
-  c4 = c[3:: 4]
-  
-  ifd.close()
 
+  if snap is None:
+    snap = np.loadtxt(fname, dtype=int, comments='#', ndmin=1)
+  params, Fit0, core_fit, pwr_sinad, code_errors, ce_counts = \
+    fit_cores_array(snap, sig_freq, samp_freq)
+  adc = np.asarray(snap, dtype=int).flatten()
+  data_cnt = adc.size
 
 # express offsets as mV.  1 lsb = 500mV/256. z_fact converts from lsb to mV
 # negate z_fact for negative feedback
@@ -139,57 +200,15 @@ def fit_snap(sig_freq, samp_freq, fname, clear_avgs=True, prnt=True):
 #  d_fact = samp_freq/(2*math.pi*sig_freq)
 #  d_fact = 1
 
-  args0 = (array(s), array(c), array(adc))
-  plsq0 = leastsq(sin_residuals, p0, args0)
-  #if plsq1[1] != 1:
-  #  print "Fit failed to converge"
-  z0 = z_fact * plsq0[0][0]
-  s0a = plsq0[0][1]
-  c0a = plsq0[0][2]
-  amp0 = math.sqrt(s0a**2 + c0a**2)
-  dly0 = d_fact*math.atan2(s0a, c0a)
-  Fit0 = fitsin(plsq0[0], args0[0], args0[1])
-  tmpfn = fname  + ".fit"
-  print("savetxt to ..." + tmpfn)
-  savetxt(tmpfn, Fit0)
-  ssq0 = 0.0
-  for i in range(data_cnt):
-    ssq0 += (adc[i] - Fit0[i])**2
-  pwr_sinad = (amp0**2)/(2*ssq0/data_cnt)
+  if write_files:
+    tmpfn = fname  + ".fit"
+    print("savetxt to ..." + tmpfn)
+    savetxt(tmpfn, Fit0)
 
-  args1 = (array(s1), array(c1), array(core1))
-  plsq1 = leastsq(sin_residuals, p0, args1)
-  #if plsq1[1] != 1:
-  #  print "Fit failed to converge"
-  z1 = z_fact * plsq1[0][0]
-  s1a = plsq1[0][1]
-  c1a = plsq1[0][2]
-  amp1 = math.sqrt(s1a**2 + c1a**2)
-  dly1 = d_fact*math.atan2(s1a, c1a)
-  
-  args2 = (array(s2), array(c2), array(core2))
-  plsq2 = leastsq(sin_residuals, p0, args2)
-  z2 = z_fact * plsq2[0][0]
-  s2a = plsq2[0][1]
-  c2a = plsq2[0][2]
-  amp2 = math.sqrt(s2a**2 + c2a**2)
-  dly2 = d_fact*math.atan2(s2a, c2a)
-  
-  args3 = (array(s3), array(c3), array(core3))
-  plsq3 = leastsq(sin_residuals, p0, args3)
-  z3 = z_fact * plsq3[0][0]
-  s3a = plsq3[0][1]
-  c3a = plsq3[0][2]
-  amp3 = math.sqrt(s3a**2 + c3a**2)
-  dly3 = d_fact*math.atan2(s3a, c3a)
-  
-  args4 = (array(s4), array(c4), array(core4))
-  plsq4 = leastsq(sin_residuals, p0, args4)
-  z4 = z_fact * plsq4[0][0]
-  s4a = plsq4[0][1]
-  c4a = plsq4[0][2]
-  amp4 = math.sqrt(s4a**2 + c4a**2)
-  dly4 = d_fact*math.atan2(s4a, c4a)
+  # offset, amplitude and delay of cores 1-4
+  z1, z2, z3, z4 = z_fact * params[1:, 0]
+  amp1, amp2, amp3, amp4 = np.hypot(params[1:, 1], params[1:, 2])
+  dly1, dly2, dly3, dly4 = d_fact * np.arctan2(params[1:, 1], params[1:, 2])
 
   avz = (z1+z2+z3+z4)/4.0
   avamp = (amp1+amp2+amp3+amp4)/4.0
@@ -201,7 +220,6 @@ def fit_snap(sig_freq, samp_freq, fname, clear_avgs=True, prnt=True):
   a3p = 100*(avamp -amp3)/avamp
   a4p = 100*(avamp -amp4)/avamp
   avdly = (dly1+dly2+dly3+dly4)/4.0
-#  print s1a, c1a, s2a, c2a, s3a, c3a, s4a, c4a
   if prnt:
     print( "#%6.2f  zero(mV) amp(%%)  dly(ps) (adj by .4, .14, .11)" % (sig_freq))
     print( "#avg    %7.4f %7.4f %8.4f" %  (avz, avamp, avdly))
@@ -212,28 +230,25 @@ def fit_snap(sig_freq, samp_freq, fname, clear_avgs=True, prnt=True):
     print( "\nsinad = %.2f" % (10.0*math.log10(pwr_sinad)))
 
   if clear_avgs:
-    sum_result = zeros((15), dtype=float)
-    result_cnt = 0
-    code_errors = zeros((256,4), dtype='float')
-    ce_counts = zeros((256, 4), dtype='int32')
+    accumulator.clear()
 
   result = (sig_freq, avz, avamp,\
       z1-true_zero, a1p, dly1-avdly, z3-true_zero, a3p, dly3-avdly, \
       z2-true_zero, a2p, dly2-avdly, z4-true_zero, a4p, dly4-avdly)
   result_fmt = "%8.4f "*15
-  sum_result += array(result)
-  result_cnt += 1
-#  print "%.3f %.3f %.3f %.3f %d" % (sum_result[5]/result_cnt,\
-#     sum_result[8]/result_cnt,\
-#     sum_result[11]/result_cnt, sum_result[14]/result_cnt, result_cnt)
-  if prnt and result_cnt > 1:
-    avg_result = sum_result/result_cnt
+  accumulator.sum_result += array(result)
+  accumulator.result_cnt += 1
+  if prnt and accumulator.result_cnt > 1:
+    avg_result = accumulator.sum_result/accumulator.result_cnt
     avg_result[0] = sig_freq
     ogp = tuple(avg_result)
-    logstr = str( result_cnt) + " " + result_fmt % ogp
-    print("Writing to file " + ofn + ": " + logstr)
-    ofd.write(logstr)
-    print( "average of %d measurements" % (result_cnt))
+    logstr = str( accumulator.result_cnt) + " " + result_fmt % ogp
+    if write_files:
+      ofn = fname  + ".ogp"
+      print("Writing to file " + ofn + ": " + logstr)
+      with open(ofn, 'a') as ofd:
+        ofd.write(logstr)
+    print( "average of %d measurements" % (accumulator.result_cnt))
     print( "#avg    %7.4f %7.4f %8.4f" %  (ogp[1], ogp[2], 0))
     print( "core A  %7.4f %7.4f %8.4f" %  ogp[3:6])
     print( "core B  %7.4f %7.4f %8.4f" %  ogp[6:9])
@@ -244,61 +259,20 @@ def fit_snap(sig_freq, samp_freq, fname, clear_avgs=True, prnt=True):
   # for each core (n), accumulate the sum of the residuals at each output code
   # in code_errors[code][n]
   # and the count of residuals added in ce_counts[code][n]
-  Fit1 = fitsin(plsq1[0], args1[0], args1[1])
-  for i in range(data_cnt/4):
-    code = core1[i]
-    if prnt:
-      logstr = "%d %d %.2f\n" % (4 * i, code, Fit1[i])
-      cfd1.write(logstr)
-    code_errors[code+128][0] += code - Fit1[i]
-    ce_counts[code+128][0] += 1
-  if prnt:
-    print("written to file " + cfd1fn)
-  Fit2 = fitsin(plsq2[0], args2[0], args2[1])
-  for i in range(data_cnt/4):
-    code = core2[i]
-    if prnt:
-      logstr =  "%d %d %.2f\n" % (4 * i + 1, code, Fit2[i])
-      cfd3.write(logstr)
-    code_errors[code+128][1] += code - Fit2[i]
-    ce_counts[code+128][1] += 1
-  if prnt:
-    print("written to file " + cfd3fn)
-  Fit3 = fitsin(plsq3[0], args3[0], args3[1])
-  for i in range(data_cnt/4):
-    code = core3[i]
-    if prnt:
-      logstr = "%d %d %.2f\n" % (4 * i + 2, code, Fit3[i])
-      cfd2.write(logstr)
-    code_errors[code+128][2] += code - Fit3[i]
-    ce_counts[code+128][2] += 1
-  if prnt:
-    print("written to file " + cfd2fn)
-  Fit4 = fitsin(plsq4[0], args4[0], args4[1])
-  for i in range(data_cnt/4):
-    code = core4[i]
-    if prnt:
-      logstr = "%d %d %.2f\n" % (4 * i + 3, code, Fit4[i])
-      cfd4.write(logstr)
-    code_errors[code+128][3] += code - Fit4[i]
-    ce_counts[code+128][3] += 1
-  if prnt:
-    print("written to file " + cfd4fn)
-  if prnt:
+  accumulator.code_errors += code_errors
+  accumulator.ce_counts += ce_counts
+  if prnt and write_files:
+    # cores 1-4 are written in the files of cores a, c, b, d
+    samples = np.arange(data_cnt)
+    for n, ext in enumerate(['a', 'c', 'b', 'd']):
+      cfdfn = fname + "." + ext
+      savetxt(cfdfn, np.transpose([samples[n::4], adc[n::4], core_fit[n::4]]), fmt="%d %d %.2f")
+      print("written to file " + cfdfn)
     rfdfn = fname + '.res'
-    rfd = open(rfdfn, "w")
     # Since the INL registers are addressed as offset binary, generate the
     # .res file that way
-    for code in range(256):
-      if ce_counts[code].min() > 1:
-        e = code_errors[code]/ce_counts[code]
-        logstr = "%3d %5.3f %5.3f %5.3f %5.3f\n" % \
-                 (code, e[0], e[2], e[1], e[3])
-        rfd.write(logstr)
-      else:
-        logstr = "%3d %5.3f %5.3f %5.3f %5.3f\n" % (code,0,0,0,0)
-        rfd.write(logstr)
-  if prnt:
+    savetxt(rfdfn, np.column_stack((np.arange(256), accumulator.get_residuals())), 
+      fmt="%3d %5.3f %5.3f %5.3f %5.3f")
     print("written to file " + rfdfn)
   return ogp, pwr_sinad
 
@@ -314,10 +288,6 @@ def fit_inl(fname='t.res', outname = None):
       else:
           outname = 'inl%s.meas'%timestamp
 
-  corrections = zeros((17,5), dtype='float')
-  wts = array([1.,2.,3.,4.,5.,6.,7.,8.,9.,10.,11.,12.,13.,14.,15,16,\
-        15.,14.,13.,12.,11.,10.,9.,8.,7.,6.,5.,4.,3.,2.,1.])
-
   data = genfromtxt(fname, unpack=True)
   start_data = int(data[0][0])
   file_limit = len(data[0])
@@ -326,33 +296,9 @@ def fit_inl(fname='t.res', outname = None):
   if data[0][data_limit - start_data - 1] != data_limit - 1:
     print( "there are holes in the data file")
     return
-  for corr_level in range(17):
-    # a and b are positions in the file
-    a = corr_level*16 - 15 - start_data
-    b = a + 31
-    if a < 0:
-      a = 0
-    if a == 0 and start_data == 0:
-      a = 1
-    if b > file_limit:
-      b = file_limit
-    if b == file_limit and data_limit == 256:
-      b -= 1
-    if a > b:
-      continue
-    wt_a = a - corr_level*16 + 15 + start_data
-    wt_b = wt_a -a + b
-    wt = sum(wts[wt_a:wt_b])
-    av1 = sum(data[1][a:b]*wts[wt_a:wt_b])/wt
-    av2 = sum(data[2][a:b]*wts[wt_a:wt_b])/wt
-    av3 = sum(data[3][a:b]*wts[wt_a:wt_b])/wt
-    av4 = sum(data[4][a:b]*wts[wt_a:wt_b])/wt
-    print("%d %7.5f %7.5f %7.5f %7.5f" %  (16*corr_level,av1,av2,av3,av4))
-    corrections[corr_level][0] = 16*corr_level
-    corrections[corr_level][1] = av1
-    corrections[corr_level][2] = av2
-    corrections[corr_level][3] = av3
-    corrections[corr_level][4] = av4
+  corrections = fit_inl_residuals(data[1:5].transpose(), data[0])
+  for level in corrections:
+    print("%d %7.5f %7.5f %7.5f %7.5f" % tuple(level))
   #if fname[:4] == 'hist':
   #  outname = 'hist_inl%s.meas'%timestamp
   #else:
@@ -362,6 +308,31 @@ def fit_inl(fname='t.res', outname = None):
   return corrections.transpose()[1:5]
 
 
+def fit_inl_residuals(residuals, codes=None):
+  """
+  Compute the INL corrections of the 17 correction levels (every 16 codes)
+  from the average residuals at each output code, all levels at once. Each
+  level is the weighted average of the residuals of the 31 codes around it,
+  with triangular weights. The edge codes (0 and 255) are excluded.
+  Returns a 17x5 array: level code and corrections for cores a, b, c, d.
+  residuals  array of codes x 4 with the average residuals of each core.
+  codes      output codes (offset binary) of the residuals rows. Default
+             0 .. 255.
+  """
+  residuals = np.asarray(residuals, dtype=float)
+  if codes is None:
+    codes = np.arange(len(residuals))
+  levels = 16 * np.arange(17)
+
+  # weight of every code in every level
+  dist = np.abs(np.asarray(codes)[np.newaxis, :] - levels[:, np.newaxis])
+  wts = np.where(dist < 16, 16 - dist, 0).astype(float)
+  wts[:, (codes == 0) | (codes == 255)] = 0
+  wt = np.sum(wts, axis=1)[:, np.newaxis]
+  avgs = np.dot(wts, residuals) / np.where(wt > 0, wt, 1)
+
+  return np.column_stack((levels, avgs))
+
 def dosfdr(sig_freq, fname = 'psd'):
   """
   Read the psd data from a file and calculate the SFDR and SINAD.  Write the
@@ -2,10 +2,12 @@ import time
 import numpy as np
 import scipy.stats
 import matplotlib.pyplot as plt
-from ..experiment import Experiment, get_nchannels, init_sources, turn_off_sources
+from ..experiment import Experiment, get_nchannels, init_sources, turn_off_sources, set_sources_freq_mhz
 from ..calanfigure import CalanFigure
 from ..instruments.generator import Generator, create_generator
 from ..axes.spectrum_axis import SpectrumAxis
+from ..frequency_sweep import FrequencySweep
+from ..settle_detector import SettleDetector
 from ..pocket_correlator.mag_ratio_axis import MagRatioAxis
 from ..pocket_correlator.angle_diff_axis import AngleDiffAxis
 
@@ -57,48 +59,20 @@ class AdcSynchronator(Experiment):
         init_sources(self.sources)
 
         # set LO freqs as first freq combination
-        for lo_source, freq in zip(self.lo_sources, self.lo_combination):
-            lo_source.set_freq_mhz(freq)
+        set_sources_freq_mhz(self.lo_sources, self.lo_combination)
         center_freq = sum(self.lo_combination)
 
-        time.sleep(5)
+        sweep = FrequencySweep(self.fpga, self.rf_source, self.settings.spec_info, plt.pause)
+        settle_detector = SettleDetector(self.fpga, self.settings.spec_info, 5)
+        settle_detector.wait_settled()
         print "Synchronizing ADCs..."
         while True:
-            ratios = [[] for i in range(len(self.legends))]
-
-            for i, chnl in enumerate(self.test_channels):
-                # set generator frequency
-                freq = self.freqs[chnl]
-                self.rf_source.set_freq_mhz(center_freq + freq)
-                plt.pause(self.settings.pause_time)
-
-                # get power-crosspower data
-                pow_data = self.fpga.get_bram_data(self.settings.spec_info)
-                crosspow_data = self.fpga.get_bram_data(self.settings.crosspow_info)
-
-                # combine real and imaginary part of crosspow data
-                crosspow_data = np.array(crosspow_data[0::2]) + 1j*np.array(crosspow_data[1::2])
-
-                # compute the complex ratios (magnitude ratio and phase difference)
-                # use first input as reference
-                aa = pow_data[0][chnl]
-                for j, ab in enumerate(crosspow_data):
-                    ratios[j].append(np.conj(ab[chnl]) / aa) # (ab*)* / aa* = a*b / aa* = b/a
-
-                # plot spectrum
-                spec_data_dbfs = self.scale_dbfs_spec_data(pow_data, self.settings.spec_info)
-                for j, spec in enumerate(spec_data_dbfs):
-                    self.figure.axes[j].plot(spec)
-            
-                # plot the magnitude ratio and phase difference
-                self.figure.axes[-2].plotxy(self.test_freqs[:i+1], np.abs(ratios))
-                self.figure.axes[-1].plotxy(self.test_freqs[:i+1], np.angle(ratios, deg=True))
-
-            # plot last frequency
-            plt.pause(self.settings.pause_time) 
+            self.ratios = [[] for i in range(len(self.legends))]
+            sweep.run(center_freq + self.test_freqs, self.read_corr_data, self.reduce_corr_point, 
+                self.test_channels)
 
             # get delays between adcs
-            delays = self.compute_adc_delays_freq(self.test_freqs[:i+1], ratios) 
+            delays = self.compute_adc_delays_freq(self.test_freqs, self.ratios) 
             
             # if the sync regs are 1 more than the computed delays,
             # assume that the first reg is for the reference
@@ -119,10 +93,47 @@ class AdcSynchronator(Experiment):
                 # apply delays
                 for sync_delay, sync_reg in zip(self.sync_delays, self.sync_regs):
                     self.fpga.set_reg(sync_reg, sync_delay)
-                time.sleep(5)
+                settle_detector.wait_settled()
 
         turn_off_sources(self.sources)
 
+    def read_corr_data(self):
+        """
+        Read the power and crosspower data of the current sweep point.
+        :return: tuple with the power data and complex crosspower data.
+        """
+        pow_data = self.fpga.get_bram_data(self.settings.spec_info)
+        crosspow_data = self.fpga.get_bram_data(self.settings.crosspow_info)
+
+        # combine real and imaginary part of crosspow data
+        crosspow_data = np.array(crosspow_data[0::2]) + 1j*np.array(crosspow_data[1::2])
+
+        return pow_data, crosspow_data
+
+    def reduce_corr_point(self, i, data):
+        """
+        Compute the complex ratios (magnitude ratio and phase difference)
+        of a sweep point and plot the results.
+        :param i: index of the point in the sweep.
+        :param data: power and crosspower data read with read_corr_data().
+        """
+        pow_data, crosspow_data = data
+        chnl = self.test_channels[i]
+
+        # use first input as reference
+        aa = pow_data[0][chnl]
+        for j, ab in enumerate(crosspow_data):
+            self.ratios[j].append(np.conj(ab[chnl]) / aa) # (ab*)* / aa* = a*b / aa* = b/a
+
+        # plot spectrum
+        spec_data_dbfs = self.scale_dbfs_spec_data(pow_data, self.settings.spec_info)
+        for j, spec in enumerate(spec_data_dbfs):
+            self.figure.axes[j].plot(spec)
+    
+        # plot the magnitude ratio and phase difference
+        self.figure.axes[-2].plotxy(self.test_freqs[:i+1], np.abs(self.ratios))
+        self.figure.axes[-1].plotxy(self.test_freqs[:i+1], np.angle(self.ratios, deg=True))
+
     def compute_adc_delays_freq(self, freqs, ratios):
         """
         Compute the adc delay between two or more unsynchronized adcs using 
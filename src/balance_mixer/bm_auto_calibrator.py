@@ -3,7 +3,8 @@ import numpy as np
 import matplotlib.pyplot as plt
 from ..calanfigure import CalanFigure
 from ..experiment import Experiment, get_nchannels
-from ..digital_sideband_separation.dss_calibrator import float2fixed
+from ..settle_detector import SettleDetector
+from ..constant_bank import ConstantBank
 from ..axes.spectrum_axis import SpectrumAxis
 from ..pocket_correlator.mag_ratio_axis import MagRatioAxis
 from ..pocket_correlator.angle_diff_axis import AngleDiffAxis
@@ -19,10 +20,6 @@ class BmAutoCalibrator(Experiment):
         self.nchannels = get_nchannels(self.settings.synth_info)
         self.freqs = np.linspace(0, self.bw, self.nchannels, endpoint=False)
 
-        # const dtype info
-        self.consts_nbits = np.dtype(self.settings.const_brams_info['data_type']).alignment * 8
-        self.consts_bin_pt = self.settings.const_bin_pt
-
         # figures
         self.calfigure = CalanFigure(n_plots=4, create_gui=False)
         self.synfigure = CalanFigure(n_plots=1, create_gui=False)
@@ -35,6 +32,15 @@ class BmAutoCalibrator(Experiment):
         #
         self.synfigure.create_axis(0, SpectrumAxis, self.freqs, 'Synth spec')
 
+        # data settle detectors (wait 5 seconds if no accumulation counter)
+        self.spec_settle  = SettleDetector(self.fpga, self.settings.spec_info, 5)
+        self.synth_settle = SettleDetector(self.fpga, self.settings.synth_info, 5)
+
+        # bank with the constant sets of the test, switched with the 
+        # minimum bram writes (the synth data is settled after each switch)
+        self.const_bank = ConstantBank(self.fpga, self.settings.const_brams_info,
+            self.settings.const_bin_pt, self.synth_settle)
+
         # power source control
         #self.noise_source = vxi11.Instrument('TCPIP::192.168.1.38::INSTR')
 
@@ -45,26 +51,28 @@ class BmAutoCalibrator(Experiment):
         initial_time = time.time()
         # first get calibration constants
         print "\tCompute calibration constants..."; step_time = time.time()
-        time.sleep(5)
+        self.spec_settle.wait_settled()
         ab_ratios, cal_a2, cal_b2, cal_ab = self.compute_calibration()
         print "\tdone (" + str(time.time() - step_time) + "[s])"
 
+        # prepare the fixed point constant sets
+        self.const_bank.add('rf_ideal',  1*np.ones(self.nchannels, dtype=np.complex))
+        self.const_bank.add('lo_ideal', -1*np.ones(self.nchannels, dtype=np.complex))
+        self.const_bank.add('rf_cal',   -1*ab_ratios)
+        self.const_bank.add('lo_cal',    1*ab_ratios)
+
         ###############################################################
         if self.settings.do_digital:
             print "### Computing parameters for cold source ###"
             [zero_cold_a, zero_cold_b] = self.get_single_ended_data()
 
-            consts = 1*np.ones(self.nchannels, dtype=np.complex)
-            rf_cold_ideal = self.get_synth_data("Loading ideal constants RF (1) and getting data...", consts)
+            rf_cold_ideal = self.get_synth_data("Loading ideal constants RF (1) and getting data...", 'rf_ideal')
 
-            consts = -1*np.ones(self.nchannels, dtype=np.complex)
-            lo_cold_ideal = self.get_synth_data("Loading ideal constants LO (-1) and getting data...", consts)
+            lo_cold_ideal = self.get_synth_data("Loading ideal constants LO (-1) and getting data...", 'lo_ideal')
 
-            consts = -1*ab_ratios
-            rf_cold_cal = self.get_synth_data("Loading calibrated constants RF and getting data...", consts)
+            rf_cold_cal = self.get_synth_data("Loading calibrated constants RF and getting data...", 'rf_cal')
 
-            consts = 1*ab_ratios
-            lo_cold_cal = self.get_synth_data("Loading calibrated constants LO and getting data...", consts)
+            lo_cold_cal = self.get_synth_data("Loading calibrated constants LO and getting data...", 'lo_cal')
 
         ###############################################################
             raw_input("Now set the noise source to hot and press start...")
@@ -73,33 +81,25 @@ class BmAutoCalibrator(Experiment):
             #time.sleep(1)
             [zero_hot_a, zero_hot_b] = self.get_single_ended_data()
 
-            consts = 1*np.ones(self.nchannels, dtype=np.complex)
-            rf_hot_ideal = self.get_synth_data("Loading ideal constants RF (1) and getting data...", consts)
+            rf_hot_ideal = self.get_synth_data("Loading ideal constants RF (1) and getting data...", 'rf_ideal')
 
-            consts = -1*np.ones(self.nchannels, dtype=np.complex)
-            lo_hot_ideal = self.get_synth_data("Loading ideal constants LO (-1) and getting data...", consts)
+            lo_hot_ideal = self.get_synth_data("Loading ideal constants LO (-1) and getting data...", 'lo_ideal')
 
-            consts = -1*ab_ratios
-            rf_hot_cal = self.get_synth_data("Loading calibrated constants RF and getting data...", consts)
+            rf_hot_cal = self.get_synth_data("Loading calibrated constants RF and getting data...", 'rf_cal')
 
-            consts = 1*ab_ratios
-            lo_hot_cal = self.get_synth_data("Loading calibrated constants LO and getting data...", consts)
+            lo_hot_cal = self.get_synth_data("Loading calibrated constants LO and getting data...", 'lo_cal')
 
         ##############################################################
             raw_input("Now turn off the LO noise and press start...")
             [zero_hot_a_nolo, zero_hot_b_nolo] = self.get_single_ended_data()
 
-            consts = 1*np.ones(self.nchannels, dtype=np.complex)
-            rf_hot_ideal_nolo = self.get_synth_data("Loading ideal constants RF (1) and getting data...", consts)
+            rf_hot_ideal_nolo = self.get_synth_data("Loading ideal constants RF (1) and getting data...", 'rf_ideal')
 
-            consts = -1*np.ones(self.nchannels, dtype=np.complex)
-            lo_hot_ideal_nolo = self.get_synth_data("Loading ideal constants LO (-1) and getting data...", consts)
+            lo_hot_ideal_nolo = self.get_synth_data("Loading ideal constants LO (-1) and getting data...", 'lo_ideal')
 
-            consts = -1*ab_ratios
-            rf_hot_cal_nolo = self.get_synth_data("Loading calibrated constants RF and getting data...", consts)
+            rf_hot_cal_nolo = self.get_synth_data("Loading calibrated constants RF and getting data...", 'rf_cal')
 
-            consts = 1*ab_ratios
-            lo_hot_cal_nolo = self.get_synth_data("Loading calibrated constants LO and getting data...", consts)
+            lo_hot_cal_nolo = self.get_synth_data("Loading calibrated constants LO and getting data...", 'lo_cal')
 
         ##############################################################
             raw_input("Now set the noise source to cold and press start...")
@@ -108,17 +108,13 @@ class BmAutoCalibrator(Experiment):
             #time.sleep(1)
             [zero_cold_a_nolo, zero_cold_b_nolo] = self.get_single_ended_data()
 
-            consts = 1*np.ones(self.nchannels, dtype=np.complex)
-            rf_cold_ideal_nolo = self.get_synth_data("Loading ideal constants RF (1) and getting data...", consts)
+            rf_cold_ideal_nolo = self.get_synth_data("Loading ideal constants RF (1) and getting data...", 'rf_ideal')
 
-            consts = -1*np.ones(self.nchannels, dtype=np.complex)
-            lo_cold_ideal_nolo = self.get_synth_data("Loading ideal constants LO (-1) and getting data...", consts)
+            lo_cold_ideal_nolo = self.get_synth_data("Loading ideal constants LO (-1) and getting data...", 'lo_ideal')
 
-            consts = -1*ab_ratios
-            rf_cold_cal_nolo = self.get_synth_data("Loading calibrated constants RF and getting data...", consts)
+            rf_cold_cal_nolo = self.get_synth_data("Loading calibrated constants RF and getting data...", 'rf_cal')
 
-            consts = 1*ab_ratios
-            lo_cold_cal_nolo = self.get_synth_data("Loading calibrated constants LO and getting data...", consts)
+            lo_cold_cal_nolo = self.get_synth_data("Loading calibrated constants LO and getting data...", 'lo_cal')
 
         ##############################################################
         if self.settings.do_analog:
@@ -179,6 +175,8 @@ class BmAutoCalibrator(Experiment):
             lo_cold_analog_nolo=lo_cold_analog_nolo,
             lo_hot_analog_nolo =lo_hot_analog_nolo)
 
+        print "Spec settle times: " + self.spec_settle.get_settle_summary()
+        print "Synth settle times: " + self.synth_settle.get_settle_summary()
         print "Total time: " + str(time.time() - initial_time) + "[s]"
 
     def compute_calibration(self):
@@ -208,37 +206,31 @@ class BmAutoCalibrator(Experiment):
         return ab_ratios, cal_a2, cal_b2, cal_ab
 
     def get_single_ended_data(self):
-        sleep_time = 5
         print "Getting single ended data..."; step_time = time.time()
-        time.sleep(sleep_time)
+        self.spec_settle.wait_settled()
         [a, b] = self.fpga.get_bram_data(self.settings.spec_info)
         print "\tdone (" + str(time.time() - step_time) + "[s])"
         return [a, b]
 
-    def get_synth_data(self, msg, consts):
-        sleep_time = 5
+    def get_synth_data(self, msg, const_set):
         print msg; step_time = time.time()
-        self.load_constants(consts)
-        time.sleep(sleep_time)
+        # if the constants are not switched, the data still has to settle
+        # after the changes in the inputs
+        if not self.const_bank.load(const_set):
+            self.synth_settle.wait_settled()
         pwr_data = self.fpga.get_bram_data(self.settings.synth_info)
         self.plot_synth(pwr_data)
         print "\tdone (" + str(time.time() - step_time) + "[s])"
         return pwr_data
 
     def get_analog_data(self):
-        sleep_time = 5
         print "Getting analog data..."; step_time = time.time()
-        time.sleep(sleep_time)
+        self.spec_settle.wait_settled()
         pwr_data = self.fpga.get_bram_data(self.settings.spec_info)[0]
         self.plot_synth(pwr_data)
         print "\tdone (" + str(time.time() - step_time) + "[s])"
         return pwr_data
 
-    def load_constants(self, consts):
-        consts_real = float2fixed(self.consts_nbits, self.consts_bin_pt, np.real(consts))
-        consts_imag = float2fixed(self.consts_nbits, self.consts_bin_pt, np.imag(consts))
-        self.fpga.write_bram_data(self.settings.const_brams_info, [consts_real, consts_imag])
-
     def plot_synth(self, data):
         data_plot = self.scale_dbfs_spec_data(data, self.settings.synth_info)
         self.synfigure.axes[0].plot(data_plot)
@@ -1,6 +1,6 @@
 import numpy as np
 from ..experiment import Experiment, get_nchannels
-from ..digital_sideband_separation.dss_calibrator import float2fixed
+from ..fixed_point import float2fixed
 
 class BmLoadConstants(Experiment):
     """
@@ -13,10 +13,13 @@ class CalanFpga():
     data grab from multiple snapshots, bram arrays, interleave bram arrays, 
     etc.
     """
-    def __init__(self):
+    def __init__(self, board=None):
         """
         Initialize the CalanFpga object. You must specify the config file as
         the second argument in the command-line arguments.
+        :param board: dictionary with config file parameters to override
+            (e.g. roach_ip, rf_source, lo_sources). Used to control several
+            ROACHs with the same config file.
         """
         if len(sys.argv) <= 1:
             print("Please provide a config file as a command line argument: " +
@@ -32,12 +35,23 @@ class CalanFpga():
         if len(sys.argv) > 2:
             self.parse_commandline_args(sys.argv[2:])
 
+        if board is not None:
+            for attrname, attrval in board.items():
+                setattr(self.settings, attrname, attrval)
+
         if self.settings.simulated:
             self.fpga = DummyFpga(self.settings)
         else:
             self.fpga = corr.katcp_wrapper.FpgaClient(self.settings.roach_ip, 
                 self.settings.roach_port)
             time.sleep(1)
+
+        # host-side images of the written brams, used to write only the
+        # bytes that changed (see write_bram_bytes())
+        self.bram_images = {}
+
+        # bram locations of single channels (see get_bram_channel_data())
+        self.channel_locations = {}
     
     def parse_commandline_args(self, arg_list):
         """
@@ -116,6 +130,7 @@ class CalanFpga():
         """
         print 'Programming FPGA with ' + self.settings.boffile + '...'
         self.fpga.progdev(os.path.basename(self.settings.boffile))
+        self.bram_images = {}
         time.sleep(1)
         print 'done'
 
@@ -128,6 +143,7 @@ class CalanFpga():
         print 'Uploading and programming FPGA with ' + \
             self.settings.boffile + '...'
         self.fpga.upload_program_bof(self.settings.boffile, 3000)
+        self.bram_images = {}
         time.sleep(1)
         print 'done'
 
@@ -158,16 +174,18 @@ class CalanFpga():
         self.reset_regs(self.settings.reset_regs)
         print 'Done setting and reseting registers'
 
-    def set_reg(self, reg, val, verbose=True):
+    def set_reg(self, reg, val, verbose=True, blindwrite=False):
         """
         Set a register.
         :param reg: register name in the FPGA model.
         :param val: value to set the register.
         :param verbose: True: be verbose.
+        :param blindwrite: True: don't read back the register to check the 
+            write (saves a request to the ROACH).
         """
         if verbose:
             print '\tSetting %s to %i... ' %(reg, val)
-        self.fpga.write_int(reg, val)
+        self.fpga.write_int(reg, val, blindwrite=blindwrite)
         if verbose:
             print '\tdone'
     
@@ -180,16 +198,18 @@ class CalanFpga():
         for reg in regs:
             self.reset_reg(reg, verbose)
 
-    def reset_reg(self, reg, verbose=True):
+    def reset_reg(self, reg, verbose=True, blindwrite=False):
         """
         Reset a register (->1->0).
         :param reg: register name in the FPGA model.
         :param verbose: True: be verbose.
+        :param blindwrite: True: don't read back the register to check the 
+            writes.
         """
         if verbose:
             print '\tResetting %s... ' %reg
-        self.fpga.write_int(reg, 1)
-        self.fpga.write_int(reg, 0)
+        self.fpga.write_int(reg, 1, blindwrite=blindwrite)
+        self.fpga.write_int(reg, 0, blindwrite=blindwrite)
         if verbose:
             print '\tdone'
 
@@ -326,20 +346,62 @@ class CalanFpga():
             interleaved/deinterleaved data.
         """
         bram_data = self.get_bram_data_raw(bram_info)
+        return arrange_bram_data(bram_data, bram_info)
 
-        # manage interleave/deinterleave data
-        if 'interleave' in bram_info and bram_info['interleave']==True:
-            bram_data = interleave_array(bram_data)
+    def get_bram_channel_data(self, bram_info, chnl):
+        """
+        Read a single channel of all the spectra of a group of brams (e.g.
+        one channel of every beam of a beamformer), reading only the words
+        that contain the channel, instead of the full brams. The location of
+        the channel in the brams is computed once per bram_info and channel 
+        (see get_bram_channel_locations()), and the words of the same bram
+        are read in a single request.
+        :param bram_info: dictionary with the info from the bram. Same as
+            the get_bram_data param.
+        :param chnl: channel to read.
+        :return: numpy array with the channel value of every spectrum, with
+            the same structure as the spectra returned by get_bram_data().
+        """
+        key = (repr(sorted(bram_info.items())), chnl)
+        if key not in self.channel_locations:
+            self.channel_locations[key] = self.get_bram_channel_locations(bram_info, chnl)
+        bram_names, elements = self.channel_locations[key]
+
+        dtype = np.dtype(bram_info['data_type'])
+        chnl_data = np.zeros(elements.shape, dtype=dtype)
+        for bram in np.unique(bram_names):
+            bram_mask = bram_names == bram
+            # read the 32-bit words spanning all the channel elements in the bram
+            start = np.min(elements[bram_mask]) * dtype.itemsize // 4 * 4
+            end = (np.max(elements[bram_mask]) + 1) * dtype.itemsize
+            end = int(np.ceil(end / 4.0)) * 4
+            words = np.frombuffer(self.fpga.read(bram, int(end-start), int(start)), dtype=dtype)
+            chnl_data[bram_mask] = words[elements[bram_mask] - start/dtype.itemsize]
+
+        return chnl_data
+
+    def get_bram_channel_locations(self, bram_info, chnl):
+        """
+        Compute the location in the brams of a channel of all the spectra
+        of a group of brams. The bram element indices are arranged with the
+        same interleave/deinterleave/divide rules as the data in 
+        get_bram_data(), so the locations always match its output.
+        :param bram_info: dictionary with the info from the bram. Same as
+            the get_bram_data param.
+        :param chnl: channel to locate.
+        :return: tuple (bram names array, bram element indices array), with
+            the structure of the spectra returned by get_bram_data().
+        """
+        names = np.array(bram_info['bram_names'])
+        nelements = 2**bram_info['addr_width'] * bram_info['word_width'] / 8 / \
+            np.dtype(bram_info['data_type']).itemsize
         
-        elif 'deinterleave_by' in bram_info:
-            bram_data = deinterleave_array(bram_data, bram_info['deinterleave_by'])
-            bram_data = list(chain.from_iterable(bram_data)) # flatten list
-
-        elif 'divide_by' in bram_info:
-            bram_data = divide_array(bram_data, bram_info['divide_by'])
-            bram_data = list(chain.from_iterable(bram_data)) # flatten list
-
-        return bram_data
+        # encode (bram number, element index) as a single integer
+        bram_numbers = np.reshape(np.arange(names.size), names.shape + (1,))
+        positions = bram_numbers * nelements + np.arange(nelements)
+        positions = np.array(arrange_bram_data(positions, bram_info))[..., chnl]
+        
+        return names.flatten()[positions // nelements], positions % nelements
 
     def get_bram_data_sync(self, bram_info):
         """
@@ -400,7 +462,7 @@ class CalanFpga():
             # change the data to the correct data type
             data = data.astype(dtype)
 
-            self.fpga.write(brams, data.tobytes())
+            self.write_bram_bytes(brams, data.tobytes())
             return
 
         elif isinstance(brams, list): # case bram list
@@ -409,6 +471,76 @@ class CalanFpga():
                 new_bram_info['bram_names'] = bram_name
                 self.write_bram_data_raw(new_bram_info, data_item)
 
+    def write_bram_bytes(self, bram, databytes):
+        """
+        Write a byte string into a bram, sending only the byte ranges that
+        changed from the last write to the same bram (kept in a host-side 
+        image of the bram). The changed 32-bit words are coalesced into 
+        contiguous writes, merging changes closer than bram_write_gap bytes
+        (every write request has a fixed overhead). Writing the same data
+        that is already in the bram is a no-op. The images are cleared when
+        the FPGA is programmed, and kept unchanged if a write fails, so the
+        write can be retried.
+        :param bram: bram name.
+        :param databytes: byte string to write.
+        """
+        bram_write_gap = 256
+        old_image = self.bram_images.get(bram)
+        if old_image is None or len(old_image) != len(databytes):
+            self.fpga.write(bram, databytes)
+            self.bram_images[bram] = databytes
+            return
+
+        # changed words
+        nwords = int(np.ceil(len(databytes) / 4.0))
+        old_bytes = np.frombuffer(old_image, dtype=np.uint8)
+        new_bytes = np.frombuffer(databytes, dtype=np.uint8)
+        changed_words = np.unique(np.nonzero(old_bytes != new_bytes)[0] // 4)
+        if len(changed_words) == 0:
+            return
+
+        # coalesce the changed words into ranges [start, end)
+        breaks = np.nonzero(np.diff(changed_words) > bram_write_gap/4)[0]
+        starts = np.concatenate(([changed_words[0]], changed_words[breaks+1]))
+        ends = np.concatenate((changed_words[breaks], [changed_words[-1]])) + 1
+        for start, end in zip(4*starts, 4*np.minimum(ends, nwords)):
+            self.fpga.write(bram, databytes[start:end], int(start))
+
+        # update the image only after all the writes succeeded
+        self.bram_images[bram] = databytes
+
+    def get_bram_image_raw(self, bram_info):
+        """
+        Get the data last written in a bram from its host-side image (see
+        write_bram_bytes()), without reading the FPGA. If the bram was not
+        written since the FPGA was programmed, the data is all zeros.
+        :param bram_info: dictionary with the info from the bram. 
+            The dictionary format is the same as for get_bram_data_raw().
+        :return: numpy array with the bram data (if single bram name), 
+            or list of numpy arrays following the same structure as the 
+            'bram_names' list. The arrays are writable copies.
+        """
+        brams = bram_info['bram_names']
+
+        if isinstance(brams, str): # case single bram 
+            width = bram_info['word_width']
+            depth = 2**bram_info['addr_width']
+            dtype = np.dtype(bram_info['data_type'])
+
+            image = self.bram_images.get(brams)
+            if image is None:
+                return np.zeros(depth*width/8/dtype.itemsize, dtype=dtype)
+            return np.frombuffer(image, dtype=dtype).copy()
+
+        elif isinstance(brams, list): # case bram list
+            bram_data_list = []
+            for bram_name in bram_info['bram_names']:
+                new_bram_info = bram_info.copy()
+                new_bram_info['bram_names'] = bram_name
+                bram_data_list.append(self.get_bram_image_raw(new_bram_info))
+
+            return bram_data_list
+
     def write_bram_data(self, bram_info, data):
         """
         Interleaves or deinterleaves data and then writes it to
@@ -473,6 +605,31 @@ class CalanFpga():
         print "done"
         
 
+def arrange_bram_data(bram_data, bram_info):
+    """
+    Combine or separate the data of a group of brams into spectra,
+    following the interleave/deinterleave/divide keys of bram_info.
+    :param bram_data: numpy array or list of numpy arrays with the raw data
+        of the brams, as read with CalanFpga's get_bram_data_raw().
+    :param bram_info: dictionary with the info from the bram. Same as
+        the CalanFpga's get_bram_data param.
+    :return: numpy array or list of numpy arrays with the 
+        interleaved/deinterleaved data.
+    """
+    # manage interleave/deinterleave data
+    if 'interleave' in bram_info and bram_info['interleave']==True:
+        bram_data = interleave_array(bram_data)
+    
+    elif 'deinterleave_by' in bram_info:
+        bram_data = deinterleave_array(bram_data, bram_info['deinterleave_by'])
+        bram_data = list(chain.from_iterable(bram_data)) # flatten list
+
+    elif 'divide_by' in bram_info:
+        bram_data = divide_array(bram_data, bram_info['divide_by'])
+        bram_data = list(chain.from_iterable(bram_data)) # flatten list
+
+    return bram_data
+
 def interleave_array(a):
     """
     Receives an array of unknown depth. Interleave the array inner most
@@ -0,0 +1,65 @@
+import numpy as np
+from scipy.interpolate import PchipInterpolator, UnivariateSpline
+
+def interp_complex(x, xp, fp, method='linear', smoothing=0):
+    """
+    Interpolate complex data (e.g. sideband ratios) measured in a subset of
+    channels. The magnitude and the unwrapped phase are interpolated
+    separately, which follows the smooth variation of the ratios much
+    better than interpolating the real and imaginary parts.
+    :param x: points (channels) where to evaluate the interpolation.
+    :param xp: measured points (channels), increasing.
+    :param fp: complex data of the measured points.
+    :param method: interpolation method: 'linear', 'pchip' (monotone
+        cubic) or 'spline' (cubic smoothing spline).
+    :param smoothing: smoothing factor of the 'spline' method (see
+        scipy.interpolate.UnivariateSpline). 0 interpolates the data.
+    :return: array with the interpolated complex data.
+    """
+    xp = np.asarray(xp, dtype=np.float64)
+    fp = np.asarray(fp, dtype=np.complex128)
+    mag = np.abs(fp)
+    phase = np.unwrap(np.angle(fp))
+
+    if method == 'linear' or len(xp) < 4:
+        mag_interp = np.interp(x, xp, mag)
+        phase_interp = np.interp(x, xp, phase)
+    elif method == 'pchip':
+        mag_interp = PchipInterpolator(xp, mag, extrapolate=False)(x)
+        phase_interp = PchipInterpolator(xp, phase, extrapolate=False)(x)
+        # out of range points take the closest measured value, as in np.interp
+        mag_interp = np.where(np.isnan(mag_interp), np.interp(x, xp, mag), mag_interp)
+        phase_interp = np.where(np.isnan(phase_interp), np.interp(x, xp, phase), phase_interp)
+    elif method == 'spline':
+        # the smoothing factor is relative to the data scale
+        mag_interp = UnivariateSpline(xp, mag, s=smoothing*np.sum(mag**2), ext=3)(x)
+        phase_interp = UnivariateSpline(xp, phase, s=smoothing*len(xp), ext=3)(x)
+    else:
+        print "Error: Unknown interpolation method '" + str(method) + "'."
+        exit()
+
+    return mag_interp * np.exp(1j*phase_interp)
+
+def holdout_error(xp, fp, method='linear', smoothing=0):
+    """
+    Estimate the error of an interpolation by holding out every other
+    measured point (excluding the edges), interpolating them from the
+    rest of the points, and comparing with their measured values. As the
+    held-out interpolation uses twice the point spacing, the estimate is
+    pessimistic for the full data.
+    :param xp: measured points (channels), increasing.
+    :param fp: complex data of the measured points.
+    :param method: interpolation method (see interp_complex()).
+    :param smoothing: smoothing factor of the 'spline' method.
+    :return: array with the relative error (|interpolated - measured| /
+        |measured|) of the held-out points.
+    """
+    xp = np.asarray(xp)
+    fp = np.asarray(fp)
+    if len(xp) < 3:
+        return np.array([])
+
+    held = np.arange(1, len(xp)-1, 2)
+    kept = np.setdiff1d(np.arange(len(xp)), held)
+    fp_interp = interp_complex(xp[held], xp[kept], fp[kept], method, smoothing)
+    return np.abs(fp_interp - fp[held]) / np.abs(fp[held])
@@ -0,0 +1,60 @@
+import numpy as np
+from fixed_point import float2fixed
+
+class ConstantBank():
+    """
+    Bank of precomputed constant sets for the complex constant brams of a
+    model (e.g. ideal and calibrated constants of the balance mixer). The
+    fixed point images of every set are computed once when the set is
+    added, and switching sets only writes the brams (with the differential
+    writes of CalanFpga.write_bram_data). The active set is tracked, so
+    loading the set that is already active does nothing.
+    If a SettleDetector of the spectrometer affected by the constants is
+    given, every switch waits until the accumulation counter confirms that
+    the spectrometer data reflects the new constants.
+    """
+    def __init__(self, calanfpga, const_brams_info, bin_pt, settle_detector=None):
+        """
+        :param calanfpga: CalanFpga object.
+        :param const_brams_info: bram_info of the constant brams, with the
+            real and imaginary part brams.
+        :param bin_pt: binary point of the constants.
+        :param settle_detector: SettleDetector used to confirm that the data
+            reflects the new constants after a switch. If None, no wait is done.
+        """
+        self.fpga = calanfpga
+        self.const_brams_info = const_brams_info
+        self.nbits = np.dtype(const_brams_info['data_type']).alignment * 8
+        self.bin_pt = bin_pt
+        self.settle_detector = settle_detector
+        self.sets = {}
+        self.active = None
+
+    def add(self, name, consts):
+        """
+        Add a constant set to the bank, computing its fixed point images.
+        If a set with the same name exists, it is replaced.
+        :param name: name of the set.
+        :param consts: complex constants array.
+        """
+        consts_real = float2fixed(self.nbits, self.bin_pt, np.real(consts))
+        consts_imag = float2fixed(self.nbits, self.bin_pt, np.imag(consts))
+        self.sets[name] = [consts_real, consts_imag]
+        if self.active == name:
+            self.active = None
+
+    def load(self, name):
+        """
+        Load a constant set in the brams, if it is not already active.
+        :param name: name of the set.
+        :return: True if the constants were switched, False if the set
+            was already active.
+        """
+        if self.active == name:
+            return False
+
+        self.fpga.write_bram_data(self.const_brams_info, self.sets[name])
+        self.active = name
+        if self.settle_detector is not None:
+            self.settle_detector.wait_settled()
+        return True
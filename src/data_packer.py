@@ -0,0 +1,77 @@
+import os, shutil, gzip, tarfile, multiprocessing
+
+class DataPacker():
+    """
+    Packs the data directory of an experiment into a .tar.gz archive,
+    compressing the subdirectories (e.g. the LO combination directories of
+    the DSS test) in a background process pool while the experiment keeps
+    measuring. Every subdirectory is compressed as an independent gzip
+    member holding its part of the tar stream, and the final archive is
+    the concatenation of these members plus a last member with the rest of
+    the files and the end of the tar stream. The result is a standard
+    .tar.gz archive, with the same member layout as a directory packed in
+    a single pass.
+    """
+    def __init__(self, datadir, nworkers=2):
+        """
+        :param datadir: data directory to pack.
+        :param nworkers: number of processes compressing in background.
+        """
+        self.datadir = datadir
+        self.pool = multiprocessing.Pool(nworkers)
+        self.parts = {}
+
+    def pack_dir(self, dirname):
+        """
+        Start the compression of a finished subdirectory in background.
+        :param dirname: name of the subdirectory inside the data directory.
+        """
+        partname = self.datadir + '/' + dirname + '.part.gz'
+        self.parts[dirname] = (partname, self.pool.apply_async(pack_part,
+            (self.datadir + '/' + dirname, dirname, partname)))
+
+    def stop(self):
+        """
+        Wait for the pending compressions and stop the process pool.
+        """
+        self.pool.close()
+        self.pool.join()
+
+    def write_archive(self, filename):
+        """
+        Wait for the pending compressions and write the final archive with
+        the compressed subdirectories and the rest of the files of the
+        data directory.
+        :param filename: name of the archive.
+        """
+        self.stop()
+        with open(filename, 'wb') as archive:
+            for dirname in sorted(self.parts):
+                partname, result = self.parts[dirname]
+                result.get() # raise the compression error if any
+                with open(partname, 'rb') as partfile:
+                    shutil.copyfileobj(partfile, archive)
+
+            # last member, with the end of the tar stream
+            gzfile = gzip.GzipFile(fileobj=archive, mode='wb')
+            tar = tarfile.open(fileobj=gzfile, mode='w')
+            for datafile in sorted(os.listdir(self.datadir)):
+                if datafile not in self.parts and not datafile.endswith('.part.gz'):
+                    tar.add(self.datadir + '/' + datafile, datafile)
+            tar.close()
+            gzfile.close()
+
+def pack_part(path, arcname, partname):
+    """
+    Compress a directory into a gzip file with its part of a tar stream
+    (without the end of archive blocks).
+    :param path: path of the directory.
+    :param arcname: name of the directory in the archive.
+    :param partname: name of the gzip file.
+    """
+    gzfile = gzip.open(partname, 'wb')
+    tar = tarfile.open(fileobj=gzfile, mode='w')
+    tar.add(path, arcname)
+    # close only the gzip file, the end of archive blocks are written in
+    # the last member of the archive
+    gzfile.close()
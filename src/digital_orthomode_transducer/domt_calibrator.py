@@ -1,14 +1,20 @@
 # -*- coding: utf-8 -*-
-import os, time, datetime, itertools, json, tarfile, shutil
+import os, time, datetime, itertools, json, shutil
 import numpy as np
 import matplotlib.pyplot as plt
-from ..experiment import Experiment, get_nchannels, init_sources, turn_off_sources
+from ..experiment import Experiment, get_nchannels, init_sources, turn_off_sources, set_sources_freq_mhz
 from ..calanfigure import CalanFigure
 from ..instruments.generator import Generator, create_generator
 from ..axes.spectrum_axis import SpectrumAxis
+from ..frequency_sweep import FrequencySweep
+from ..run_journal import RunJournal
+from ..data_packer import DataPacker
+from ..complex_interpolation import interp_complex, holdout_error
+from ..raw_data_store import RawDataStore
 from ..pocket_correlator.mag_ratio_axis import MagRatioAxis
 from ..pocket_correlator.angle_diff_axis import AngleDiffAxis
-from ..digital_sideband_separation.dss_calibrator import get_lo_combinations, float2fixed, check_overflow
+from ..digital_sideband_separation.dss_calibrator import get_lo_combinations, get_lo_label
+from ..fixed_point import float2fixed
 from pol_axis import PolAxis
 
 class DomtCalibrator(Experiment):
@@ -37,6 +43,13 @@ class DomtCalibrator(Experiment):
         self.lo_sources = [create_generator(lo_source) for lo_source in self.settings.lo_sources]
         self.sources = self.lo_sources + [self.rf_source]
         self.lo_combinations = get_lo_combinations(self.settings.lo_sources)
+
+        # interpolation of the channels not measured in the calibration.
+        # Format: cal_interp = {'method' : 'spline', 'smoothing' : 0}
+        # (see complex_interpolation.interp_complex())
+        self.cal_interp = {'method' : 'linear', 'smoothing' : 0}
+        if hasattr(self.settings, 'cal_interp'):
+            self.cal_interp.update(self.settings.cal_interp)
         
         # figures
         self.calfigure_0deg  = CalanFigure(n_plots=6, create_gui=False)
@@ -72,10 +85,14 @@ class DomtCalibrator(Experiment):
         self.polfigure.create_axis(3, PolAxis, self.freqs, 'Y pol isolation')
 
         # data save attributes
-        self.dataname = self.settings.boffile[:self.settings.boffile.index('.')]
-        self.dataname = 'domttest ' + self.dataname + ' '
-        self.datadir = self.dataname + datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        os.mkdir(self.datadir)
+        if hasattr(self.settings, 'resume_dir'):
+            # continue an interrupted test
+            self.datadir = self.settings.resume_dir
+        else:
+            self.dataname = self.settings.boffile[:self.settings.boffile.index('.')]
+            self.dataname = 'domttest ' + self.dataname + ' '
+            self.datadir = self.dataname + datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            os.mkdir(self.datadir)
         self.testinfo = {'bw'               : self.settings.bw,
                          'nchannels'        : self.nchannels,
                          'cal_acc_len'      : self.fpga.read_reg(self.settings.spec_info['acc_len_reg']),
@@ -83,10 +100,35 @@ class DomtCalibrator(Experiment):
                          'use_ideal_consts' : self.settings.ideal_consts,
                          'cal_chnl_step'    : self.settings.cal_chnl_step,
                          'syn_chnl_step'    : self.settings.syn_chnl_step,
+                         'cal_interp'       : self.cal_interp,
                          'lo_combinations'  : self.lo_combinations}
 
-        with open(self.datadir + '/testinfo.json', 'w') as jsonfile:
-            json.dump(self.testinfo, jsonfile, indent=4)
+        if hasattr(self.settings, 'resume_dir'):
+            self.check_resume_testinfo()
+        else:
+            with open(self.datadir + '/testinfo.json', 'w') as jsonfile:
+                json.dump(self.testinfo, jsonfile, indent=4)
+
+    def check_resume_testinfo(self):
+        """
+        Check that the test to resume was run with the same channels as 
+        the current configuration, so its saved data can be reused.
+        """
+        try:
+            with open(self.datadir + '/testinfo.json', 'r') as jsonfile:
+                old_testinfo = json.load(jsonfile)
+        except IOError:
+            print "Error: No test to resume in " + self.datadir
+            exit()
+
+        for key in ['nchannels', 'cal_chnl_step', 'syn_chnl_step']:
+            if old_testinfo[key] != self.testinfo[key]:
+                print "Error: Parameter " + key + " of the test to resume (" + \
+                    str(old_testinfo[key]) + ") differs from the config file (" + \
+                    str(self.testinfo[key]) + ")."
+                exit()
+
+        print "Resuming test in " + self.datadir
         
     def run_domt_test(self):
         """
@@ -95,18 +137,40 @@ class DomtCalibrator(Experiment):
         init_sources(self.sources)
 
         initial_time = time.time()
+
+        # the data of every finished LO combination is compressed in 
+        # background while the next one is measured
+        pack_workers = 2
+        if hasattr(self.settings, 'pack_workers'):
+            pack_workers = self.settings.pack_workers
+        packer = DataPacker(self.datadir, pack_workers)
+
         for lo_comb in self.lo_combinations:
             cycle_time = time.time()
-            lo_label = '_'.join(['LO'+str(i+1)+'_'+str(lo/1e3)+'GHZ' for i,lo in enumerate(lo_comb)]) 
+            lo_label = get_lo_label(lo_comb)
             lo_datadir = self.datadir + "/" + lo_label
-            os.mkdir(lo_datadir)
+            if not os.path.exists(lo_datadir):
+                os.mkdir(lo_datadir)
+            self.journal = RunJournal(lo_datadir)
             
             print lo_label
-            for i, lo in enumerate(lo_comb):
-                self.lo_sources[i].set_freq_mhz(lo)
+            if self.journal.is_done('lo_comb'):
+                print "\tAlready done in previous run, skipping..."
+                packer.pack_dir(lo_label)
+                continue
+
+            set_sources_freq_mhz(self.lo_sources, lo_comb)
+            self.rawdata = RawDataStore(lo_datadir + '/rawdata.h5')
                 
-                # compute calibration constants (sideband ratios)
-                if not self.settings.ideal_consts:
+            # compute calibration constants (sideband ratios)
+            if not self.settings.ideal_consts:
+                if self.journal.is_done('in_ratios'):
+                    print "\tLoading input ratios from previous run..."
+                    in_ratios = np.load(lo_datadir+'/in_ratios.npz')
+                    in_ratios_0deg  = in_ratios['in_ratios_0deg']
+                    in_ratios_90deg = in_ratios['in_ratios_90deg']
+
+                else:
                     raw_input('Please angle the OMT cavity to 0° and press enter...')
                     print "\tComputing input ratios, angle 0°..."; step_time = time.time()
                     self.calfigure_0deg.set_window_title('Calibration 0° ' + lo_label)
@@ -122,46 +186,59 @@ class DomtCalibrator(Experiment):
                     # save in ratios
                     np.savez(lo_datadir+'/in_ratios', in_ratios_0deg=in_ratios_0deg, 
                         in_ratios_90deg=in_ratios_90deg)
+                    self.journal.set_done('in_ratios')
+
+                # constant computation
+                H = compute_cal_consts(in_ratios_0deg, in_ratios_90deg)
 
-                    # constant computation
-                    H = compute_cal_consts(in_ratios_0deg, in_ratios_90deg)
+            else: # use ideal constants
+                H_ideal = np.array([[0.5, 0.0, -0.5,  0.0],
+                                    [0.0, 0.5,  0.0, -0.5]], dtype=np.complex128)
+                H = np.repeat(H_ideal[:,:,np.newaxis], self.nchannels, axis=2)
 
-                else: # use ideal constants
-                    n = self.nchannels
-                    H = np.repeat(np.array([[1, 0, 0, 0],
-                                            [0, 0, 0, 0]])[:,:,np.newaxis], n, axis=2)
-                    H = [[0.5*np.ones(n), np.zeros(n), -0.5*np.ones(n),     np.zeros(n)],
-                         [np.zeros(n), 0.5*np.ones(n),     np.zeros(n), -0.5*np.ones(n)]]
+            #if self.settings.45deg_calibration:
+            if self.settings.calibration_45deg:
+                if self.journal.is_done('in_ratios_45deg'):
+                    print "\tLoading input ratios 45° from previous run..."
+                    in_ratios_45deg = np.load(lo_datadir+'/in_ratios_45deg.npy')
 
-                #if self.settings.45deg_calibration:
-                if self.settings.calibration_45deg:
+                else:
                     raw_input('Please angle the OMT cavity to 45° and press enter...')
                     print "\tComputing input ratios, angle 45°..."; step_time = time.time()
                     self.calfigure_45deg.set_window_title('Calibration 45° ' + lo_label)
                     in_ratios_45deg  = self.compute_input_ratios(lo_comb, lo_datadir, 45, self.calfigure_45deg)
-                    H = self.compute_45deg_calibration(in_ratios_45deg, H)
+                    np.save(lo_datadir+'/in_ratios_45deg', in_ratios_45deg)
+                    self.journal.set_done('in_ratios_45deg')
                     print "\tdone (" + str(time.time() - step_time) + "[s])" 
-                    
-                # test H dimensions
-                print "H dims: " + str(np.array(H).shape)
-                # load constants
-                print "\tLoading constants..."; step_time = time.time()
-                H_real = float2fixed(self.consts_nbits, self.consts_bin_pt, np.real(H))
-                H_imag = float2fixed(self.consts_nbits, self.consts_bin_pt, np.imag(H))
-                self.fpga.write_bram_data(self.settings.const_brams_info, [H_real, H_imag])
-                print "\tdone (" + str(time.time() - step_time) + "[s])"
 
-                # compute pol isolation
+                H = self.compute_45deg_calibration(in_ratios_45deg, H)
+                
+            # test H dimensions
+            print "H dims: " + str(H.shape)
+            # load constants
+            print "\tLoading constants..."; step_time = time.time()
+            H_real = float2fixed(self.consts_nbits, self.consts_bin_pt, np.real(H))
+            H_imag = float2fixed(self.consts_nbits, self.consts_bin_pt, np.imag(H))
+            self.fpga.write_bram_data(self.settings.const_brams_info, [H_real, H_imag])
+            print "\tdone (" + str(time.time() - step_time) + "[s])"
+
+            # compute pol isolation
+            self.polfigure.fig.canvas.set_window_title('Pol Iso Computation ' + lo_label)
+            if not self.journal.is_done('pol_x'):
                 raw_input('Please angle the OMT cavity to 0° and press enter...')
                 print "\tComputing pol-x iso..."; step_time = time.time()
-                self.polfigure.fig.canvas.set_window_title('Pol Iso Computation ' + lo_label)
                 self.compute_pol_iso(lo_comb, lo_datadir, 'x', self.polfigure.axes[2])
                 print "\tdone (" + str(time.time() - step_time) + "[s])"
+            if not self.journal.is_done('pol_y'):
                 raw_input('Please angle the OMT cavity to 90° and press enter...')
                 print "\tComputing pol-y iso..."; step_time = time.time()
                 self.compute_pol_iso(lo_comb, lo_datadir, 'y', self.polfigure.axes[3])
                 print "\tdone (" + str(time.time() - step_time) + "[s])"
 
+            self.rawdata.close()
+            self.journal.set_done('lo_comb')
+            packer.pack_dir(lo_label)
+
         # turn off sources
         turn_off_sources(self.sources)
 
@@ -170,10 +247,7 @@ class DomtCalibrator(Experiment):
 
         # compress saved data
         print "\tCompressing data..."; step_time = time.time()
-        tar = tarfile.open(self.datadir + ".tar.gz", "w:gz")
-        for datafile in os.listdir(self.datadir):
-            tar.add(self.datadir + '/' + datafile, datafile)
-        tar.close()
+        packer.write_archive(self.datadir + ".tar.gz")
         print "\tdone (" + str(time.time() - step_time) + "[s])"
 
         # delete data folder
@@ -199,60 +273,93 @@ class DomtCalibrator(Experiment):
         :param fig: figure to plot.
         :return: input ratios as a list of vectors.
         """
-        in_ratios = [[] for i in range(4)]
+        self.in_ratios = [[] for i in range(4)]
         rf_freqs = lo_comb[0] + sum(lo_comb[1:]) + self.freqs
         ref = self.ang2ref[ang]
 
-        cal_datadir = lo_datadir + '/cal_rawdata'
-        # creates directory for the raw calibration data if doesn't exists
-        try:
-            os.mkdir(cal_datadir)
-        except OSError:
-            pass
-
         # set the reference for correlation computation
         self.fpga.set_reg('ref_select', ref)
 
-        for i, chnl in enumerate(self.cal_channels):
-            # set generator frequency
-            self.rf_source.set_freq_mhz(rf_freqs[chnl])    
-            # plot while the generator is changing to frequency to give the system time to update
-            plt.pause(self.settings.pause_time) 
+        sweep = FrequencySweep(self.fpga, self.rf_source, self.settings.spec_info, plt.pause)
+        sweep.run(rf_freqs[self.cal_channels], self.read_cal_data,
+            lambda i, data: self.reduce_cal_point(i, data, ang, fig), self.cal_channels,
+            self.load_cal_data(ang))
 
-            # get power-crosspower data
-            cal_pow = self.fpga.get_bram_data(self.settings.spec_info)
-            cal_crosspow = self.fpga.get_bram_data(self.settings.crosspow_info)
+        # compute interpolations
+        in_ratios = []
+        for ratio_arr in self.in_ratios:
+            in_ratios.append(interp_complex(range(self.nchannels), self.cal_channels, ratio_arr,
+                **self.cal_interp))
+
+        # estimate the interpolation error with held-out channels
+        errors = np.concatenate([holdout_error(self.cal_channels, ratio_arr, **self.cal_interp)
+            for ratio_arr in self.in_ratios])
+        if len(errors) > 0:
+            print "\tInterpolation error estimate: max " + str(100*np.max(errors)) + \
+                "%, rms " + str(100*np.sqrt(np.mean(errors**2))) + "%"
 
-            # combine real and imaginary part of crosspow data
-            cal_crosspow = np.array(cal_crosspow[0::2]) + 1j*np.array(cal_crosspow[1::2])            
+        return in_ratios
 
-            # save cal rawdata
-            np.savez(cal_datadir + '/'+'ang_'+str(ang)+'_chnl_' + str(chnl), 
-                cal_pow=cal_pow, cal_crosspow=cal_crosspow)
+    def read_cal_data(self):
+        """
+        Read the power and crosspower data of the current calibration sweep point.
+        :return: tuple with the power data and the complex crosspower data.
+        """
+        cal_pow = self.fpga.get_bram_data(self.settings.spec_info)
+        cal_crosspow = self.fpga.get_bram_data(self.settings.crosspow_info)
 
-            # compute ratios
-            # get the reference power
-            aa = cal_pow[ref][chnl]
-            for j, ab in enumerate(cal_crosspow):
-                in_ratios[j].append(np.conj(ab[chnl]) / aa) # (ab*)* / aa* = a*b / aa* = b/a
+        # combine real and imaginary part of crosspow data
+        cal_crosspow = np.array(cal_crosspow[0::2]) + 1j*np.array(cal_crosspow[1::2])            
 
-            # plot spec data
-            cal_pow_plot = self.scale_dbfs_spec_data(cal_pow, self.settings.spec_info)
-            for j, spec_plot in enumerate(cal_pow_plot):
-                fig.axes[j].plot(spec_plot)
+        return cal_pow, cal_crosspow
 
-            # plot the magnitude ratio and phase difference
-            fig.axes[4].plotxy(self.cal_freqs[:i+1], np.abs(in_ratios))
-            fig.axes[5].plotxy(self.cal_freqs[:i+1], np.angle(in_ratios, deg=True))
+    def load_cal_data(self, ang):
+        """
+        Load the raw data of the calibration points completed in a 
+        previous run of the test, as recorded in the journal.
+        :param ang: angle of the omt input of the measurement.
+        :return: list with the calibration data of the completed points.
+        """
+        data = []
+        for rawdata in self.rawdata.read('cal_'+str(ang)+'deg', self.journal.get_points('cal_'+str(ang)+'deg')):
+            data.append((rawdata['cal_pow'], rawdata['cal_crosspow']))
 
-        # plot last frequency
-        plt.pause(self.settings.pause_time) 
+        return data
 
-        # compute interpolations
-        for i, ratio_arr in enumerate(in_ratios):
-            in_ratios[i] = np.interp(range(self.nchannels), self.cal_channels, ratio_arr)
+    def reduce_cal_point(self, i, data, ang, fig):
+        """
+        Save the raw data of a calibration sweep point, compute its 
+        input ratios and plot the results.
+        :param i: index of the point in the calibration sweep.
+        :param data: calibration data read with read_cal_data().
+        :param ang: angle of the omt input in which the measurement is 
+            performed.
+        :param fig: figure to plot.
+        """
+        cal_pow, cal_crosspow = data
+        chnl = self.cal_channels[i]
+        ref = self.ang2ref[ang]
 
-        return in_ratios
+        # save cal rawdata
+        self.rawdata.append('cal_'+str(ang)+'deg', i, chnl=chnl,
+            cal_pow=cal_pow, cal_crosspow=cal_crosspow)
+
+        # compute ratios
+        # get the reference power
+        aa = cal_pow[ref][chnl]
+        for j, ab in enumerate(cal_crosspow):
+            self.in_ratios[j].append(np.conj(ab[chnl]) / aa) # (ab*)* / aa* = a*b / aa* = b/a
+
+        # plot spec data
+        cal_pow_plot = self.scale_dbfs_spec_data(cal_pow, self.settings.spec_info)
+        for j, spec_plot in enumerate(cal_pow_plot):
+            fig.axes[j].plot(spec_plot)
+
+        # plot the magnitude ratio and phase difference
+        fig.axes[4].plotxy(self.cal_freqs[:i+1], np.abs(self.in_ratios))
+        fig.axes[5].plotxy(self.cal_freqs[:i+1], np.angle(self.in_ratios, deg=True))
+
+        self.journal.set_points('cal_'+str(ang)+'deg', i+1)
 
     def compute_45deg_calibration(self, in_ratios, H_arr):
         """
@@ -265,27 +372,31 @@ class DomtCalibrator(Experiment):
             measurements.
         :return: fully calibrated matrix.
         """
-        # transpose arrays for proper domensions for iteration
+        # transpose arrays to stacks of matrices, one for every channel
         H_arr = np.transpose(H_arr, (2,0,1)) # (2,4,2048) -> (2048, 2, 4)
         in_ratios = np.transpose(in_ratios)  # (4,2048) -> (2048,4)
+        n = len(H_arr)
 
-        H_new = []
-        for V, H in zip(in_ratios, H_arr):
-            S_lin  = np.dot(H, V)
-            [sl, sr] = np.dot([[1,-1j],[1,+1j]], S_lin)
+        # synthesized linear and circular polarizations of every channel
+        S_lin = np.einsum('nij,nj->ni', H_arr, in_ratios)
+        sl = S_lin[:,0] - 1j*S_lin[:,1]
+        sr = S_lin[:,0] + 1j*S_lin[:,1]
 
-            sl2 = np.abs(sl)**2; sr2 = np.abs(sr)**2
-            sin_e = 0.5*(sl2 + sr2) - 1
-            cos_e = np.sqrt(1 - sin_e**2)
+        sl2 = np.abs(sl)**2; sr2 = np.abs(sr)**2
+        sin_e = 0.5*(sl2 + sr2) - 1
+        cos_e = np.sqrt(1 - sin_e**2)
 
-            sin_p = (sl2 - sr2) / (2*sin_e*cos_e + 2*cos_e)
-            cos_p = (2*np.imag(sr * np.conj(sl))) / (2*sin_e*cos_e + 2*cos_e)
-            
-            E = np.array([[1, sin_p],[0, cos_p]])
-            P = np.array([[1, 0], [0, cos_p+1j*sin_p]])
-            corr_mat = np.linalg.inv(np.dot(P,E))
+        sin_p = (sl2 - sr2) / (2*sin_e*cos_e + 2*cos_e)
+        cos_p = (2*np.imag(sr * np.conj(sl))) / (2*sin_e*cos_e + 2*cos_e)
+
+        # stacked correction matrices, inverted all at once
+        E = np.zeros((n, 2, 2), dtype=np.complex128)
+        E[:,0,0] = 1; E[:,0,1] = sin_p; E[:,1,1] = cos_p
+        P = np.zeros((n, 2, 2), dtype=np.complex128)
+        P[:,0,0] = 1; P[:,1,1] = cos_p + 1j*sin_p
+        corr_mat = np.linalg.inv(np.matmul(P, E))
 
-            H_new.append(np.dot(corr_mat, H))
+        H_new = np.matmul(corr_mat, H_arr)
 
         # reshape array into original dimensions
         H_new = np.transpose(H_new, (1,2,0)) # (2048,2,4) -> (2,4,2048)
@@ -303,61 +414,85 @@ class DomtCalibrator(Experiment):
         :param pol: polarization being measured (i.e. omt input angle).
         :param ax: axis to plot polarization isolation.
         """
-        iso = []
+        self.iso = []
         rf_freqs = lo_comb[0] + sum(lo_comb[1:]) + self.freqs
 
-        syn_datadir = lo_datadir + '/pol_rawdata'
-        try:
-            os.mkdir(syn_datadir)
-        except OSError:
-            pass
- 
-        for i, chnl in enumerate(self.syn_channels):
-            # set generator
-            self.rf_source.set_freq_mhz(rf_freqs[chnl])
-            # plot while the generator is changing to frequency to give the system time to update
-            plt.pause(self.settings.pause_time) 
-            
-            # get polarization power data
-            polx, poly = self.fpga.get_bram_data(self.settings.synth_info)
-
-            # plot spec data
-            [polx_plot, poly_plot] = \
-                self.scale_dbfs_spec_data([polx, poly], self.settings.synth_info)
-            self.polfigure.axes[0].plot(polx_plot)
-            self.polfigure.axes[1].plot(poly_plot)
-
-            # save syn rawdata
-            np.savez(syn_datadir+'/pol'+str(pol)+'_chnl_'+str(chnl), polx=polx, poly=poly)
-
-            # Compute polarization isolation
-            if pol == 'x':
-                iso.append(np.divide(poly[chnl], polx[chnl], dtype=np.float64))
-            else: # pol=='y'
-                iso.append(np.divide(polx[chnl], poly[chnl], dtype=np.float64))
-
-            # plot polarization isolation
-            ax.plotxy(self.syn_freqs[:i+1], iso)
-        
-        # plot last frequency
-        plt.pause(self.settings.pause_time)
+        sweep = FrequencySweep(self.fpga, self.rf_source, self.settings.synth_info, plt.pause)
+        sweep.run(rf_freqs[self.syn_channels], self.read_syn_data,
+            lambda i, data: self.reduce_pol_point(i, data, pol, ax), self.syn_channels,
+            self.load_syn_data(pol))
 
         # save srr data
-        np.save(lo_datadir+"/pol_"+str(pol)+"_iso", iso)
+        np.save(lo_datadir+"/pol_"+str(pol)+"_iso", self.iso)
+        self.journal.set_result('pol_'+str(pol)+'_iso', self.iso)
+        self.journal.set_done('pol_'+str(pol))
+
+    def read_syn_data(self):
+        """
+        Read the polarization power data of the current sweep point.
+        :return: list with the x and y polarization power data.
+        """
+        return self.fpga.get_bram_data(self.settings.synth_info)
+
+    def load_syn_data(self, pol):
+        """
+        Load the raw data of the polarization isolation points completed 
+        in a previous run of the test, as recorded in the journal.
+        :param pol: polarization of the measurement.
+        :return: list with the polarization power data of the completed points.
+        """
+        data = []
+        for rawdata in self.rawdata.read('pol_'+str(pol), self.journal.get_points('pol_'+str(pol)+'_points')):
+            data.append([rawdata['polx'], rawdata['poly']])
+
+        return data
+
+    def reduce_pol_point(self, i, data, pol, ax):
+        """
+        Save the raw data of a polarization isolation sweep point, compute
+        its isolation and plot the results.
+        :param i: index of the point in the sweep.
+        :param data: polarization power data read with read_syn_data().
+        :param pol: polarization being measured (i.e. omt input angle).
+        :param ax: axis to plot polarization isolation.
+        """
+        polx, poly = data
+        chnl = self.syn_channels[i]
+
+        # plot spec data
+        [polx_plot, poly_plot] = \
+            self.scale_dbfs_spec_data([polx, poly], self.settings.synth_info)
+        self.polfigure.axes[0].plot(polx_plot)
+        self.polfigure.axes[1].plot(poly_plot)
+
+        # save syn rawdata
+        self.rawdata.append('pol_'+str(pol), i, chnl=chnl, polx=polx, poly=poly)
+
+        # Compute polarization isolation
+        if pol == 'x':
+            self.iso.append(np.divide(poly[chnl], polx[chnl], dtype=np.float64))
+        else: # pol=='y'
+            self.iso.append(np.divide(polx[chnl], poly[chnl], dtype=np.float64))
+
+        # plot polarization isolation
+        ax.plotxy(self.syn_freqs[:i+1], self.iso)
+
+        self.journal.set_points('pol_'+str(pol)+'_points', i+1)
 
     def print_iso_plot(self):
         """
-        Print isolation plot using the data saved from the test.
+        Print isolation plot using the isolation results saved in the
+        journals of the test.
         """
         fig = plt.figure()
         for lo_comb in self.lo_combinations:
-            lo_label = '_'.join(['LO'+str(i+1)+'_'+str(lo/1e3)+'GHZ' for i,lo in enumerate(lo_comb)]) 
-            datadir = self.datadir + '/' + lo_label
+            lo_label = get_lo_label(lo_comb)
+            journal = RunJournal(self.datadir + '/' + lo_label)
 
-            iso_datax = np.load(datadir + '/pol_x_iso.npy')
-            iso_datay = np.load(datadir + '/pol_y_iso.npy')
+            iso_datax = journal.get_result('pol_x_iso')
+            iso_datay = journal.get_result('pol_y_iso')
             
-            freqs = lo_comb[0]/1.0e3 + sum(lo_comb[1:])/1.0e3 + self.syn_freqs
+            freqs = lo_comb[0]/1.0e3 + sum(lo_comb[1:])/1.0e3 + self.syn_freqs/1.0e3
             
             plt.plot(freqs, iso_datax, '-r')
             plt.plot(freqs, iso_datay, '-b')
@@ -372,16 +507,19 @@ def compute_cal_consts(gx, gy):
     Compute the calibration constants as the pseudo inverse of the
     gain matrix of an OMT. As the gain matrix is frequency dependant
     an array of gains element is expected for each frequency component.
+    The pseudo-inverse is computed for all the channels at once on the
+    stacked matrices, so singular (e.g. dead) channels don't fail the
+    whole computation.
     More info about the pseudo-inverse:
     https://docs.scipy.org/doc/numpy/reference/generated/numpy.linalg.pinv.html
     :param gx: x components of the gain matrix
     :param gy: y components of the gain matrix
-    :return: list of calibration matrices H
+    :return: array of calibration matrices H, with shape (2, 4, nchannels).
     """
-    # combine gx and gy to form an array of matrices
+    # combine gx and gy to form an array of matrices (nchannels, 4, 2)
     G = np.transpose(np.dstack((gx,gy)), (1,0,2))
 
-    # compute pseudo inverse
+    # compute pseudo inverse (nchannels, 2, 4)
     H = np.linalg.pinv(G)
     H = np.transpose(H, (1,2,0))
 
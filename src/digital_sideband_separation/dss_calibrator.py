@@ -1,10 +1,18 @@
-import os, time, datetime, itertools, json, tarfile, shutil
+import os, time, datetime, itertools, json, shutil
 import numpy as np
 import matplotlib.pyplot as plt
-from ..experiment import Experiment, get_nchannels, init_sources, turn_off_sources
+from ..experiment import Experiment, get_nchannels, init_sources, turn_off_sources, set_sources_freq_mhz
 from ..calanfigure import CalanFigure
 from ..instruments.generator import Generator, create_generator
 from ..axes.spectrum_axis import SpectrumAxis
+from ..frequency_sweep import FrequencySweep
+from ..run_journal import RunJournal
+from ..raw_data_store import RawDataStore
+from ..lo_scheduler import LoScheduler
+from ..data_packer import DataPacker
+from ..tone_comb import ToneComb
+from ..complex_interpolation import interp_complex, holdout_error
+from ..fixed_point import float2fixed
 from ..pocket_correlator.mag_ratio_axis import MagRatioAxis
 from ..pocket_correlator.angle_diff_axis import AngleDiffAxis
 from srr_axis import SrrAxis
@@ -34,6 +42,22 @@ class DssCalibrator(Experiment):
         self.lo_sources = [create_generator(lo_source) for lo_source in self.settings.lo_sources]
         self.sources = self.lo_sources + [self.rf_source]
         self.lo_combinations = get_lo_combinations(self.settings.lo_sources)
+
+        # tone comb for the calibration sweeps. If the config file has the 
+        # comb_sources parameter (list of generators), their tones are 
+        # added to the RF source tone to measure several channels at once
+        self.comb_sources = [self.rf_source]
+        if hasattr(self.settings, 'comb_sources'):
+            self.comb_sources += [create_generator(comb_source) for comb_source in self.settings.comb_sources]
+            self.sources += self.comb_sources[1:]
+        self.cal_comb = ToneComb(self.comb_sources, self.cal_channels)
+
+        # interpolation of the channels not measured in the calibration.
+        # Format: cal_interp = {'method' : 'spline', 'smoothing' : 0}
+        # (see complex_interpolation.interp_complex())
+        self.cal_interp = {'method' : 'linear', 'smoothing' : 0}
+        if hasattr(self.settings, 'cal_interp'):
+            self.cal_interp.update(self.settings.cal_interp)
         
         # figures
         self.calfigure_lsb = CalanFigure(n_plots=4, create_gui=False)
@@ -57,10 +81,14 @@ class DssCalibrator(Experiment):
         self.srrfigure.create_axis(3, SrrAxis, self.freqs, 'SRR LSB')
 
         # data save attributes
-        self.dataname = self.settings.boffile[:self.settings.boffile.index('.')]
-        self.dataname = 'dsstest ' + self.dataname + ' '
-        self.datadir = self.dataname + datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        os.mkdir(self.datadir)
+        if hasattr(self.settings, 'resume_dir'):
+            # continue an interrupted test
+            self.datadir = self.settings.resume_dir
+        else:
+            self.dataname = self.settings.boffile[:self.settings.boffile.index('.')]
+            self.dataname = 'dsstest ' + self.dataname + ' '
+            self.datadir = self.dataname + datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            os.mkdir(self.datadir)
         self.testinfo = {'bw'               : self.settings.bw,
                          'nchannels'        : self.nchannels,
                          'cal_acc_len'      : self.fpga.read_reg(self.settings.spec_info['acc_len_reg']),
@@ -70,88 +98,81 @@ class DssCalibrator(Experiment):
                          'ideal_const'      : str(self.settings.ideal_consts['val']),
                          'cal_chnl_step'    : self.settings.cal_chnl_step,
                          'srr_chnl_step'    : self.settings.srr_chnl_step,
+                         'cal_ntones'       : self.cal_comb.ntones,
+                         'cal_interp'       : self.cal_interp,
                          'lo_combinations'  : self.lo_combinations}
 
-        with open(self.datadir + '/testinfo.json', 'w') as jsonfile:
-            json.dump(self.testinfo, jsonfile, indent=4)
+        if hasattr(self.settings, 'resume_dir'):
+            self.check_resume_testinfo()
+        else:
+            with open(self.datadir + '/testinfo.json', 'w') as jsonfile:
+                json.dump(self.testinfo, jsonfile, indent=4)
+
+    def check_resume_testinfo(self):
+        """
+        Check that the test to resume was run with the same channels as 
+        the current configuration, so its saved data can be reused.
+        """
+        try:
+            with open(self.datadir + '/testinfo.json', 'r') as jsonfile:
+                old_testinfo = json.load(jsonfile)
+        except IOError:
+            print "Error: No test to resume in " + self.datadir
+            exit()
+
+        for key in ['nchannels', 'cal_chnl_step', 'srr_chnl_step']:
+            if old_testinfo[key] != self.testinfo[key]:
+                print "Error: Parameter " + key + " of the test to resume (" + \
+                    str(old_testinfo[key]) + ") differs from the config file (" + \
+                    str(self.testinfo[key]) + ")."
+                exit()
+
+        if old_testinfo.get('cal_ntones', 1) != self.testinfo['cal_ntones']:
+            print "Error: The number of comb tones of the test to resume differs from the config file."
+            exit()
+
+        print "Resuming test in " + self.datadir
         
     def run_dss_test(self):
         """
         Perform a full DSS test, with constants and SRR computation. 
+        If the config file has the boards parameter, the LO combinations
+        are spread across the boards (see LoScheduler).
         """
-        init_sources(self.sources)
-
         initial_time = time.time()
-        for lo_comb in self.lo_combinations:
-            cycle_time = time.time()
-            lo_label = '_'.join(['LO'+str(i+1)+'_'+str(lo/1e3)+'GHZ' for i,lo in enumerate(lo_comb)]) 
-            lo_datadir = self.datadir + "/" + lo_label
-            os.mkdir(lo_datadir)
-            
-            print lo_label
-            for i, lo in enumerate(lo_comb):
-                self.lo_sources[i].set_freq_mhz(lo)
-                
-                # Hot-Cold Measurement
-                if self.settings.kerr_correction:
-                    print "\tMake hotcold test..."; step_time = time.time()
-                    M_DSB = self.make_hotcold_measurement()
-                    print "\tdone (" + str(time.time() - step_time) + "[s])"
-                else:
-                    M_DSB = None
-                
-                # compute calibration constants (sideband ratios)
-                if not self.settings.ideal_consts['load']:
-                    print "\tComputing sideband ratios, tone in USB..."; step_time = time.time()
-                    self.calfigure_usb.set_window_title('Calibration USB ' + lo_label)
-                    sb_ratios_usb = self.compute_sb_ratios_usb(lo_comb, lo_datadir)
-                    print "\tdone (" + str(time.time() - step_time) + "[s])" 
-
-                    print "\tComputing sideband ratios, tone in LSB..."; step_time = time.time()
-                    self.calfigure_lsb.set_window_title('Calibration LSB ' + lo_label)
-                    sb_ratios_lsb = self.compute_sb_ratios_lsb(lo_comb, lo_datadir)
-                    print "\tdone (" + str(time.time() - step_time) + "[s])"
-
-                    # save sb ratios
-                    np.savez(lo_datadir+'/sb_ratios', sb_ratios_usb=sb_ratios_usb, sb_ratios_lsb=sb_ratios_lsb)
-
-                    # constant computation
-                    consts_usb = -1.0 * sb_ratios_usb
-                    consts_lsb = -1.0 * sb_ratios_lsb
-
-                else:
-                    const = self.settings.ideal_consts['val']
-                    consts_usb = const * np.ones(self.nchannels, dtype=np.complex128)
-                    consts_lsb = const * np.ones(self.nchannels, dtype=np.complex128)
-
-                # load constants
-                print "\tLoading constants..."; step_time = time.time()
-                consts_usb_real = float2fixed(self.consts_nbits, self.consts_bin_pt, np.real(consts_usb))
-                consts_usb_imag = float2fixed(self.consts_nbits, self.consts_bin_pt, np.imag(consts_usb))
-                consts_lsb_real = float2fixed(self.consts_nbits, self.consts_bin_pt, np.real(consts_lsb))
-                consts_lsb_imag = float2fixed(self.consts_nbits, self.consts_bin_pt, np.imag(consts_lsb))
-                self.fpga.write_bram_data(self.settings.const_brams_info, 
-                    [consts_lsb_real, consts_lsb_imag, consts_usb_real, consts_usb_imag])
-                print "\tdone (" + str(time.time() - step_time) + "[s])"
 
-                # compute SRR
-                print "\tComputing SRR..."; step_time = time.time()
-                self.srrfigure.fig.canvas.set_window_title('SRR Computation ' + lo_label)
-                self.compute_srr(M_DSB, lo_comb, lo_datadir)
-                print "\tdone (" + str(time.time() - step_time) + "[s])"
-
-        # turn off sources
-        turn_off_sources(self.sources)
+        # the data of every finished LO combination is compressed in 
+        # background while the next one is measured
+        pack_workers = 2
+        if hasattr(self.settings, 'pack_workers'):
+            pack_workers = self.settings.pack_workers
+        packer = DataPacker(self.datadir, pack_workers)
+        
+        if hasattr(self.settings, 'boards'):
+            scheduler = LoScheduler(DssCalibrator, self.datadir, self.settings.boards)
+            failed = scheduler.run(self.lo_combinations, 
+                lambda lo_comb: packer.pack_dir(get_lo_label(lo_comb)))
+            if failed:
+                packer.stop()
+                print "Some LO combinations failed. Fix the problem and resume the test with:"
+                print "\t--resume_dir \"'" + self.datadir + "'\""
+                return
+
+        else:
+            init_sources(self.sources)
+            for lo_comb in self.lo_combinations:
+                self.run_lo_comb(lo_comb)
+                packer.pack_dir(get_lo_label(lo_comb))
+
+            # turn off sources
+            turn_off_sources(self.sources)
 
         # print srr (full) plot
         self.print_srr_plot()
 
         # compress saved data
         print "\tCompressing data..."; step_time = time.time()
-        tar = tarfile.open(self.datadir + ".tar.gz", "w:gz")
-        for datafile in os.listdir(self.datadir):
-            tar.add(self.datadir + '/' + datafile, datafile)
-        tar.close()
+        packer.write_archive(self.datadir + ".tar.gz")
         print "\tdone (" + str(time.time() - step_time) + "[s])"
 
         # delete data folder
@@ -159,6 +180,85 @@ class DssCalibrator(Experiment):
 
         print "Total time: " + str(time.time() - initial_time) + "[s]"
 
+    def run_lo_comb(self, lo_comb):
+        """
+        Perform the DSS test for a single LO combination: constants 
+        computation and loading, and SRR computation.
+        :param lo_comb: LO frequency combination to test.
+        """
+        lo_label = get_lo_label(lo_comb)
+        lo_datadir = self.datadir + "/" + lo_label
+        if not os.path.exists(lo_datadir):
+            os.mkdir(lo_datadir)
+        self.journal = RunJournal(lo_datadir)
+        
+        print lo_label
+        if self.journal.is_done('lo_comb'):
+            print "\tAlready done in previous run, skipping..."
+            return
+
+        set_sources_freq_mhz(self.lo_sources, lo_comb)
+        self.rawdata = RawDataStore(lo_datadir + '/rawdata.h5')
+            
+        # Hot-Cold Measurement
+        if self.settings.kerr_correction:
+            print "\tMake hotcold test..."; step_time = time.time()
+            M_DSB = self.make_hotcold_measurement()
+            print "\tdone (" + str(time.time() - step_time) + "[s])"
+        else:
+            M_DSB = None
+        
+        # compute calibration constants (sideband ratios)
+        if not self.settings.ideal_consts['load']:
+            if self.journal.is_done('sb_ratios'):
+                print "\tLoading sideband ratios from previous run..."
+                sb_ratios = np.load(lo_datadir+'/sb_ratios.npz')
+                sb_ratios_usb = sb_ratios['sb_ratios_usb']
+                sb_ratios_lsb = sb_ratios['sb_ratios_lsb']
+
+            else:
+                print "\tComputing sideband ratios, tone in USB..."; step_time = time.time()
+                self.calfigure_usb.set_window_title('Calibration USB ' + lo_label)
+                sb_ratios_usb = self.compute_sb_ratios_usb(lo_comb, lo_datadir)
+                print "\tdone (" + str(time.time() - step_time) + "[s])" 
+
+                print "\tComputing sideband ratios, tone in LSB..."; step_time = time.time()
+                self.calfigure_lsb.set_window_title('Calibration LSB ' + lo_label)
+                sb_ratios_lsb = self.compute_sb_ratios_lsb(lo_comb, lo_datadir)
+                print "\tdone (" + str(time.time() - step_time) + "[s])"
+
+                # save sb ratios
+                np.savez(lo_datadir+'/sb_ratios', sb_ratios_usb=sb_ratios_usb, sb_ratios_lsb=sb_ratios_lsb)
+                self.journal.set_done('sb_ratios')
+
+            # constant computation
+            consts_usb = -1.0 * sb_ratios_usb
+            consts_lsb = -1.0 * sb_ratios_lsb
+
+        else:
+            const = self.settings.ideal_consts['val']
+            consts_usb = const * np.ones(self.nchannels, dtype=np.complex128)
+            consts_lsb = const * np.ones(self.nchannels, dtype=np.complex128)
+
+        # load constants
+        print "\tLoading constants..."; step_time = time.time()
+        consts_usb_real = float2fixed(self.consts_nbits, self.consts_bin_pt, np.real(consts_usb))
+        consts_usb_imag = float2fixed(self.consts_nbits, self.consts_bin_pt, np.imag(consts_usb))
+        consts_lsb_real = float2fixed(self.consts_nbits, self.consts_bin_pt, np.real(consts_lsb))
+        consts_lsb_imag = float2fixed(self.consts_nbits, self.consts_bin_pt, np.imag(consts_lsb))
+        self.fpga.write_bram_data(self.settings.const_brams_info, 
+            [consts_lsb_real, consts_lsb_imag, consts_usb_real, consts_usb_imag])
+        print "\tdone (" + str(time.time() - step_time) + "[s])"
+
+        # compute SRR
+        print "\tComputing SRR..."; step_time = time.time()
+        self.srrfigure.fig.canvas.set_window_title('SRR Computation ' + lo_label)
+        self.compute_srr(M_DSB, lo_comb, lo_datadir)
+        print "\tdone (" + str(time.time() - step_time) + "[s])"
+
+        self.rawdata.close()
+        self.journal.set_done('lo_comb')
+
     def make_hotcold_test(self):
         """
         Perform a hotcold test (Kerr calibration) to the determine the M_DSB parameter to
@@ -208,46 +308,20 @@ class DssCalibrator(Experiment):
         :param lo_datadir: diretory for the data of the current LO frequency combination.
         :return: USB sideband ratios
         """
-        sb_ratios = []
+        self.sb_ratios = np.nan * np.ones(len(self.cal_channels), dtype=np.complex128)
         rf_freqs = lo_comb[0] + sum(lo_comb[1:]) + self.freqs
 
-        cal_datadir = lo_datadir + '/cal_rawdata'
-        # creates directory for the raw calibration data
-        os.mkdir(cal_datadir)
-
-        for i, chnl in enumerate(self.cal_channels):
-            # set generator frequency
-            self.rf_source.set_freq_mhz(rf_freqs[chnl])    
-            # plot while the generator is changing to frequency to give the system time to update
-            plt.pause(self.settings.pause_time) 
-
-            # get power-crosspower data
-            cal_a2, cal_b2 = self.fpga.get_bram_data(self.settings.spec_info)
-            cal_ab_re, cal_ab_im = self.fpga.get_bram_data(self.settings.crosspow_info)
-
-            # save cal rawdata
-            np.savez(cal_datadir + '/usb_chnl_' + str(chnl), 
-                cal_a2=cal_a2, cal_b2=cal_b2, cal_ab_re=cal_ab_re, cal_ab_im=cal_ab_im)
-
-            # compute constant
-            ab = cal_ab_re[chnl] + 1j*cal_ab_im[chnl]
-            sb_ratios.append(np.conj(ab) / cal_a2[chnl]) # (ab*)* / aa* = a*b / aa* = b/a = LSB/USB
-
-            # plot spec data
-            [cal_a2_plot, cal_b2_plot] = \
-                self.scale_dbfs_spec_data([cal_a2, cal_b2], self.settings.spec_info)
-            self.calfigure_usb.axes[0].plot(cal_a2_plot)
-            self.calfigure_usb.axes[1].plot(cal_b2_plot)
-
-            # plot the magnitude ratio and phase difference
-            self.calfigure_usb.axes[2].plotxy(self.cal_freqs[:i+1], [np.abs(sb_ratios)])
-            self.calfigure_usb.axes[3].plotxy(self.cal_freqs[:i+1], [np.angle(sb_ratios, deg=True)])
+        # turn on the comb tones (turned off in the SRR computation)
+        for comb_source in self.comb_sources[1:]:
+            comb_source.turn_output_on()
 
-        # plot last frequency
-        plt.pause(self.settings.pause_time) 
+        sweep = FrequencySweep(self.fpga, self.comb_sources, self.settings.spec_info, plt.pause)
+        sweep.run(self.cal_comb.get_points(rf_freqs), self.read_cal_data, 
+            lambda i, data: self.reduce_cal_point(i, data, 'usb'), self.cal_comb.points_channels,
+            self.load_cal_data('usb'))
 
         # compute interpolations
-        sb_ratios = np.interp(range(self.nchannels), self.cal_channels, sb_ratios)
+        sb_ratios = self.interp_sb_ratios()
 
         return sb_ratios
 
@@ -263,46 +337,102 @@ class DssCalibrator(Experiment):
         :param lo_datadir: diretory for the data of the current LO frequency combination.
         :return: USB sideband ratios
         """
-        sb_ratios = []
+        self.sb_ratios = np.nan * np.ones(len(self.cal_channels), dtype=np.complex128)
         rf_freqs = lo_comb[0] - sum(lo_comb[1:]) - self.freqs
 
-        cal_datadir = lo_datadir + '/cal_rawdata'
+        sweep = FrequencySweep(self.fpga, self.comb_sources, self.settings.spec_info, plt.pause)
+        sweep.run(self.cal_comb.get_points(rf_freqs), self.read_cal_data, 
+            lambda i, data: self.reduce_cal_point(i, data, 'lsb'), self.cal_comb.points_channels,
+            self.load_cal_data('lsb'))
+
+        # compute interpolations
+        sb_ratios = self.interp_sb_ratios()
+
+        return sb_ratios
+
+    def interp_sb_ratios(self):
+        """
+        Interpolate the sideband ratios of the channels not measured in the
+        calibration sweep, and print an estimation of the interpolation
+        error using held-out channels.
+        :return: sideband ratios for all the channels.
+        """
+        errors = holdout_error(self.cal_channels, self.sb_ratios, **self.cal_interp)
+        if len(errors) > 0:
+            print "\tInterpolation error estimate: max " + str(100*np.max(errors)) + \
+                "%, rms " + str(100*np.sqrt(np.mean(errors**2))) + "%"
+
+        return interp_complex(range(self.nchannels), self.cal_channels, self.sb_ratios, 
+            **self.cal_interp)
 
-        for i, chnl in enumerate(self.cal_channels):
-            # set generator frequency
-            self.rf_source.set_freq_mhz(rf_freqs[chnl])    
-            # plot while the generator is changing to frequency to give the system time to update
-            plt.pause(self.settings.pause_time) 
+    def read_cal_data(self):
+        """
+        Read the power and crosspower data of the current calibration sweep point.
+        :return: list with the power data of both inputs, and the real and
+            imaginary part of the crosspower data.
+        """
+        cal_a2, cal_b2 = self.fpga.get_bram_data(self.settings.spec_info)
+        cal_ab_re, cal_ab_im = self.fpga.get_bram_data(self.settings.crosspow_info)
+
+        return [cal_a2, cal_b2, cal_ab_re, cal_ab_im]
 
-            # get power-crosspower data
-            cal_a2, cal_b2 = self.fpga.get_bram_data(self.settings.spec_info)
-            cal_ab_re, cal_ab_im = self.fpga.get_bram_data(self.settings.crosspow_info)
+    def load_cal_data(self, sideband):
+        """
+        Load the raw data of the calibration points completed in a 
+        previous run of the test, as recorded in the journal.
+        :param sideband: sideband of the test tone ('usb' or 'lsb').
+        :return: list with the calibration data of the completed points.
+        """
+        data = []
+        npoints = self.journal.get_points('cal_' + sideband)
+        for rawdata in self.rawdata.read('cal_' + sideband, npoints):
+            data.append([rawdata['cal_a2'], rawdata['cal_b2'], 
+                rawdata['cal_ab_re'], rawdata['cal_ab_im']])
 
-            # save cal rawdata
-            np.savez(cal_datadir + '/lsb_chnl_' + str(chnl), 
-                cal_a2=cal_a2, cal_b2=cal_b2, cal_ab_re=cal_ab_re, cal_ab_im=cal_ab_im)
+        return data
 
-            # compute constant
+    def reduce_cal_point(self, i, data, sideband):
+        """
+        Save the raw data of a calibration sweep point, compute the 
+        sideband ratios of its channels (one for each comb tone) and 
+        plot the results.
+        :param i: index of the point in the calibration sweep.
+        :param data: calibration data read with read_cal_data().
+        :param sideband: sideband of the test tone ('usb' or 'lsb').
+        """
+        cal_a2, cal_b2, cal_ab_re, cal_ab_im = data
+        chnls = self.cal_comb.points_channels[i]
+
+        # save cal rawdata (the channels are padded with -1 to the number 
+        # of comb tones, as the last points of the comb can have less tones)
+        self.rawdata.append('cal_' + sideband, i, 
+            chnls=chnls + [-1]*(self.cal_comb.ntones-len(chnls)),
+            cal_a2=cal_a2, cal_b2=cal_b2, cal_ab_re=cal_ab_re, cal_ab_im=cal_ab_im)
+
+        # compute constants
+        for j, chnl in zip(self.cal_comb.points_indices[i], chnls):
             ab = cal_ab_re[chnl] + 1j*cal_ab_im[chnl]
-            sb_ratios.append(ab / cal_b2[chnl]) # ab* / bb* = a/b = USB/LSB.
+            if sideband == 'usb':
+                self.sb_ratios[j] = np.conj(ab) / cal_a2[chnl] # (ab*)* / aa* = a*b / aa* = b/a = LSB/USB
+            else: # sideband == 'lsb'
+                self.sb_ratios[j] = ab / cal_b2[chnl] # ab* / bb* = a/b = USB/LSB.
 
-            # plot spec data
-            [cal_a2_plot, cal_b2_plot] = \
-                self.scale_dbfs_spec_data([cal_a2, cal_b2], self.settings.spec_info)
-            self.calfigure_lsb.axes[0].plot(cal_a2_plot)
-            self.calfigure_lsb.axes[1].plot(cal_b2_plot)
-            
-            # plot the magnitude ratio and phase difference
-            self.calfigure_lsb.axes[2].plotxy(self.cal_freqs[:i+1], [np.abs(sb_ratios)])
-            self.calfigure_lsb.axes[3].plotxy(self.cal_freqs[:i+1], [np.angle(sb_ratios, deg=True)])
+        if sideband == 'usb':
+            calfigure = self.calfigure_usb
+        else: # sideband == 'lsb'
+            calfigure = self.calfigure_lsb
 
-        # plot last frequency
-        plt.pause(self.settings.pause_time) 
+        # plot spec data
+        [cal_a2_plot, cal_b2_plot] = \
+            self.scale_dbfs_spec_data([cal_a2, cal_b2], self.settings.spec_info)
+        calfigure.axes[0].plot(cal_a2_plot)
+        calfigure.axes[1].plot(cal_b2_plot)
 
-        # compute interpolations
-        sb_ratios = np.interp(range(self.nchannels), self.cal_channels, sb_ratios)
+        # plot the magnitude ratio and phase difference (unmeasured channels are nan)
+        calfigure.axes[2].plotxy(self.cal_freqs, [np.abs(self.sb_ratios)])
+        calfigure.axes[3].plotxy(self.cal_freqs, [np.angle(self.sb_ratios, deg=True)])
 
-        return sb_ratios
+        self.journal.set_points('cal_' + sideband, i+1)
 
     def compute_srr(self, M_DSB, lo_comb, lo_datadir):
         """
@@ -315,88 +445,113 @@ class DssCalibrator(Experiment):
             the RF test input.
         :param lo_datadir: diretory for the data of the current LO frequency combination.
         """
-        srr_usb = []
-        srr_lsb = []
+        self.srr_usb = []
+        self.srr_lsb = []
+        self.M_DSB = M_DSB
+
+        # the SRR is measured with a single tone
+        turn_off_sources(self.comb_sources[1:])
         rf_freqs_usb = lo_comb[0] + sum(lo_comb[1:]) + self.freqs
         rf_freqs_lsb = lo_comb[0] - sum(lo_comb[1:]) - self.freqs
 
-        syn_datadir = lo_datadir + '/srr_rawdata'
-        os.mkdir(syn_datadir)
+        # for every channel, set the tone first in the USB and then in the LSB
+        rf_freqs = np.ravel(np.transpose([rf_freqs_usb[self.srr_channels], rf_freqs_lsb[self.srr_channels]]))
  
-        for i, chnl in enumerate(self.srr_channels):
-            # set generator at USB frequency
-            self.rf_source.set_freq_mhz(rf_freqs_usb[chnl])
-            # plot while the generator is changing to frequency to give the system time to update
-            plt.pause(self.settings.pause_time) 
-            
-            # get USB and LSB power data
-            a2_tone_usb, b2_tone_usb = self.fpga.get_bram_data(self.settings.synth_info)
-
-            # plot spec data
-            [a2_tone_usb_plot, b2_tone_usb_plot] = \
-                self.scale_dbfs_spec_data([a2_tone_usb, b2_tone_usb], self.settings.synth_info)
-            self.srrfigure.axes[0].plot(a2_tone_usb_plot)
-            self.srrfigure.axes[1].plot(b2_tone_usb_plot)
-
-            # set generator at LSB frequency
-            self.rf_source.set_freq_mhz(rf_freqs_lsb[chnl])
-            # plot while the generator is changing to frequency to give the system time to update
-            plt.pause(self.settings.pause_time) 
-            
-            # get USB and LSB power data
-            a2_tone_lsb, b2_tone_lsb = self.fpga.get_bram_data(self.settings.synth_info)
-
-            # save syn rawdata
-            np.savez(syn_datadir+'/chnl_'+str(chnl), a2_tone_usb=a2_tone_usb, b2_tone_usb=b2_tone_usb, 
-                a2_tone_lsb=a2_tone_lsb, b2_tone_lsb=b2_tone_lsb)
-
-            # plot spec data
-            [a2_tone_lsb_plot, b2_tone_lsb_plot] = \
-                self.scale_dbfs_spec_data([a2_tone_lsb, b2_tone_lsb], self.settings.synth_info)
-            self.srrfigure.axes[0].plot(a2_tone_lsb_plot)
-            self.srrfigure.axes[1].plot(b2_tone_lsb_plot)
-
-            # Compute sideband ratios
-            ratio_usb = np.divide(a2_tone_usb[chnl], b2_tone_usb[chnl], dtype=np.float64)
-            ratio_lsb = np.divide(b2_tone_lsb[chnl], a2_tone_lsb[chnl], dtype=np.float64)
-            
-            # Compute SRR as per Kerr calibration if set in config file
-            if self.settings.kerr_correction:
-                new_srr_usb = ratio_usb * (ratio_lsb*M_DSB[chnl] - 1) / (ratio_usb - M_DSB[chnl])
-                new_srr_lsb = ratio_lsb * (ratio_usb - M_DSB[chnl]) / (ratio_lsb*M_DSB[chnl] - 1)
-            else: # compute SRR as sideband ratio
-                new_srr_usb = ratio_usb
-                new_srr_lsb = ratio_lsb
-
-            srr_usb.append(10*np.log10(new_srr_usb))
-            srr_lsb.append(10*np.log10(new_srr_lsb))
-
-            # plot SRR
-            self.srrfigure.axes[2].plotxy(self.srr_freqs[:i+1], srr_usb)
-            self.srrfigure.axes[3].plotxy(self.srr_freqs[:i+1], srr_lsb)
-        
-        # plot last frequency
-        plt.pause(self.settings.pause_time)
+        sweep = FrequencySweep(self.fpga, self.rf_source, self.settings.synth_info, plt.pause)
+        sweep.run(rf_freqs, self.read_syn_data, self.reduce_srr_point, 
+            np.repeat(self.srr_channels, 2), self.load_syn_data())
 
         # save srr data
-        np.savez(lo_datadir+"/srr", srr_usb=srr_usb, srr_lsb=srr_lsb)
+        np.savez(lo_datadir+"/srr", srr_usb=self.srr_usb, srr_lsb=self.srr_lsb)
+        self.journal.set_result('srr_usb', self.srr_usb)
+        self.journal.set_result('srr_lsb', self.srr_lsb)
+
+    def read_syn_data(self):
+        """
+        Read the USB and LSB power data of the current SRR sweep point.
+        :return: list with the USB and LSB power data.
+        """
+        return self.fpga.get_bram_data(self.settings.synth_info)
+
+    def load_syn_data(self):
+        """
+        Load the raw data of the SRR points completed in a previous run
+        of the test, as recorded in the journal.
+        :return: list with the USB and LSB power data of the completed
+            points (two points per channel).
+        """
+        data = []
+        for rawdata in self.rawdata.read('srr', self.journal.get_points('srr')//2):
+            data.append([rawdata['a2_tone_usb'], rawdata['b2_tone_usb']])
+            data.append([rawdata['a2_tone_lsb'], rawdata['b2_tone_lsb']])
+
+        return data
+
+    def reduce_srr_point(self, i, data):
+        """
+        Process a point of the SRR sweep. Even points have the tone in
+        the USB, odd points in the LSB. After the LSB point of a channel,
+        the raw data is saved and the SRR of the channel is computed
+        and plotted.
+        :param i: index of the point in the SRR sweep.
+        :param data: USB and LSB power data read with read_syn_data().
+        """
+        a2_tone, b2_tone = data
+        chnl = self.srr_channels[i//2]
+
+        # plot spec data
+        [a2_tone_plot, b2_tone_plot] = \
+            self.scale_dbfs_spec_data([a2_tone, b2_tone], self.settings.synth_info)
+        self.srrfigure.axes[0].plot(a2_tone_plot)
+        self.srrfigure.axes[1].plot(b2_tone_plot)
+
+        if i % 2 == 0: # tone in USB, wait for the LSB data
+            self.tone_usb_data = data
+            return
+
+        a2_tone_usb, b2_tone_usb = self.tone_usb_data
+        a2_tone_lsb, b2_tone_lsb = data
+
+        # save syn rawdata
+        self.rawdata.append('srr', i//2, chnl=chnl, a2_tone_usb=a2_tone_usb, b2_tone_usb=b2_tone_usb, 
+            a2_tone_lsb=a2_tone_lsb, b2_tone_lsb=b2_tone_lsb)
+
+        # Compute sideband ratios
+        ratio_usb = np.divide(a2_tone_usb[chnl], b2_tone_usb[chnl], dtype=np.float64)
+        ratio_lsb = np.divide(b2_tone_lsb[chnl], a2_tone_lsb[chnl], dtype=np.float64)
+        
+        # Compute SRR as per Kerr calibration if set in config file
+        if self.settings.kerr_correction:
+            M_DSB = self.M_DSB
+            new_srr_usb = ratio_usb * (ratio_lsb*M_DSB[chnl] - 1) / (ratio_usb - M_DSB[chnl])
+            new_srr_lsb = ratio_lsb * (ratio_usb - M_DSB[chnl]) / (ratio_lsb*M_DSB[chnl] - 1)
+        else: # compute SRR as sideband ratio
+            new_srr_usb = ratio_usb
+            new_srr_lsb = ratio_lsb
+
+        self.srr_usb.append(10*np.log10(new_srr_usb))
+        self.srr_lsb.append(10*np.log10(new_srr_lsb))
+
+        # plot SRR
+        self.srrfigure.axes[2].plotxy(self.srr_freqs[:i//2+1], self.srr_usb)
+        self.srrfigure.axes[3].plotxy(self.srr_freqs[:i//2+1], self.srr_lsb)
+
+        self.journal.set_points('srr', i+1)
 
     def print_srr_plot(self):
         """
-        Print SRR plot using the data saved from the test.
+        Print SRR plot using the SRR results saved in the journals of the test.
         """
         fig = plt.figure()
         for lo_comb in self.lo_combinations:
-            lo_label = '_'.join(['LO'+str(i+1)+'_'+str(lo/1e3)+'GHZ' for i,lo in enumerate(lo_comb)]) 
-            datadir = self.datadir + '/' + lo_label
-
-            srrdata = np.load(datadir + '/srr.npz')
+            lo_label = get_lo_label(lo_comb)
+            journal = RunJournal(self.datadir + '/' + lo_label)
             
-            usb_freqs = lo_comb[0]/1.0e3 + sum(lo_comb[1:])/1.0e3 + self.srr_freqs
-            lsb_freqs = lo_comb[0]/1.0e3 - sum(lo_comb[1:])/1.0e3 - self.srr_freqs
+            usb_freqs = lo_comb[0]/1.0e3 + sum(lo_comb[1:])/1.0e3 + self.srr_freqs/1.0e3
+            lsb_freqs = lo_comb[0]/1.0e3 - sum(lo_comb[1:])/1.0e3 - self.srr_freqs/1.0e3
             
-            plt.plot(usb_freqs, srrdata['srr_usb'], '-r')
-            plt.plot(lsb_freqs, srrdata['srr_lsb'], '-b')
+            plt.plot(usb_freqs, journal.get_result('srr_usb'), '-r')
+            plt.plot(lsb_freqs, journal.get_result('srr_lsb'), '-b')
             plt.grid()
             plt.xlabel('Frequency [GHz]')
             plt.ylabel('SRR [dB]')
@@ -414,46 +569,11 @@ def get_lo_combinations(lo_sources):
     lo_freqs_arr = [lo_source['lo_freqs'] for lo_source in lo_sources]
     return list(itertools.product(*lo_freqs_arr))
 
-def float2fixed(nbits, bin_pt, data):
-    """
-    Convert a numpy array with float point numbers into big-endian 
-    (ROACH compatible) fixed point numbers. An overflow check is done 
-    and a warning is printed if the float number can't be represented
-    with the fixed point parameters (round is allowed).
-    :param nbits: bitwidth of the fixed point representation.
-    :param bin_pt: binary point of the fixed point representation.
-    :param data: data array to convert.
-    :return: converted data array.
+def get_lo_label(lo_comb):
     """
-    check_overflow(nbits, bin_pt, data)
-    fixedpoint_data = (2**bin_pt * data).astype('>i'+str(nbits/8))
-    return fixedpoint_data
-
-def check_overflow(nbits, bin_pt, data):
+    Get the label of an LO combination, used as the name of its data 
+    directory.
+    :param lo_comb: LO frequency combination (in MHz).
+    :return: LO combination label.
     """
-    Given a signed fixed point representation of bitwidth nbits and 
-    binary point bin_pt, check if the data list contains values that
-    will produce overflow if it would be cast. If overflow is detected,
-    a warning signal is printed.
-    :param nbits: bitwidth of the signed fixed point representation.
-    :param bin_pt: binary point of the signed fixed point representation.
-    :param data: number or data list to check.
-    """
-    
-    if isinstance(data, float) or isinstance(data, int): # case single value
-        max_val = (2.0**(nbits-1)-1) / (2**bin_pt)
-        min_val = (-2.0**(nbits-1))  / (2**bin_pt)
-        
-        if data > max_val: 
-            print "WARNING! Maximum value exceeded in overflow check."
-            print "Max allowed value: " + str(max_val)
-            print "Data value: " + str(data)
-
-        if data < min_val:
-            print "WARNING! Minimum value exceeded in overflow check."
-            print "Min allowed value: " + str(min_val)
-            print "Data value: " + str(data)    
-
-    else: # case list or array of data
-        for data_el in data:
-            check_overflow(nbits, bin_pt, data_el)
+    return '_'.join(['LO'+str(i+1)+'_'+str(lo/1e3)+'GHZ' for i,lo in enumerate(lo_comb)])
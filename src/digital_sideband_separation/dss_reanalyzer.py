@@ -0,0 +1,253 @@
+import re, io, json, gzip, tarfile, tempfile, shutil, multiprocessing
+import numpy as np
+import h5py
+from ..complex_interpolation import interp_complex, holdout_error
+
+class DssReanalyzer():
+    """
+    Offline re-analysis of the raw data archive of a DSS test. Recomputes
+    the sideband ratios, calibration constants and SRR of all the LO
+    combinations from the saved raw data, without re-measuring. It can use
+    a different interpolation of the unmeasured channels, or enable/disable
+    the Kerr correction of the SRR.
+    The archive is streamed once, member by member. When all the raw data
+    of an LO combination is read, its analysis is sent to a process pool,
+    and it is computed with numpy array operations over all the channels.
+    Both the raw data store (rawdata.h5) and the older per-channel npz
+    files (cal_rawdata/, srr_rawdata/) are supported.
+    """
+    def __init__(self, datafile, cal_interp=None, kerr_correction=True, nworkers=None):
+        """
+        :param datafile: DSS test archive (.tar or .tar.gz).
+        :param cal_interp: dictionary with the interpolation of the channels
+            not measured in the calibration ('method' and 'smoothing' keys,
+            see complex_interpolation.interp_complex()). If None, linear
+            interpolation is used.
+        :param kerr_correction: apply the Kerr correction to the SRR if the
+            hotcold data is available.
+        :param nworkers: number of analysis processes (default: number of CPUs).
+        """
+        self.datafile = datafile
+        self.cal_interp = cal_interp
+        self.kerr_correction = kerr_correction
+        self.nworkers = nworkers
+
+    def run(self, outfile):
+        """
+        Run the re-analysis and save the results in a compressed npz file
+        with arrays indexed by LO combination: sideband ratios and constants
+        for all the channels, masks of the channels measured in the
+        calibration, SRR for all the channels (NaN in the channels not 
+        measured), and the interpolation error estimates. The results
+        missing in an LO combination (e.g. no raw data) are NaN, or False
+        for the masks.
+        :param outfile: name of the results file.
+        :return: dictionary with the results.
+        """
+        pool = multiprocessing.Pool(self.nworkers)
+        jobs = {}
+        testinfo = None
+        lo_label = None
+        lo_data = None
+
+        # the archive can be made of several gzip members (see DataPacker),
+        # not supported by the tarfile stream mode decompression
+        with open(self.datafile, 'rb') as datafile:
+            gzipped = datafile.read(2) == '\x1f\x8b'
+        if gzipped:
+            fileobj = gzip.open(self.datafile, 'rb')
+        else:
+            fileobj = open(self.datafile, 'rb')
+
+        tar = tarfile.open(fileobj=fileobj, mode='r|')
+        for member in tar:
+            if not member.isfile():
+                continue
+            if member.name == 'testinfo.json':
+                testinfo = json.load(tar.extractfile(member))
+                continue
+            if '/' not in member.name:
+                continue
+
+            # when the LO combination changes, the previous one is complete
+            member_label, member_name = member.name.split('/', 1)
+            if member_label != lo_label:
+                if lo_label is not None:
+                    jobs[lo_label] = pool.apply_async(analyze_lo_data,
+                        (lo_data, self.cal_interp, self.kerr_correction))
+                lo_label = member_label
+                lo_data = {'cal_usb' : [], 'cal_lsb' : [], 'srr' : [], 'M_DSB' : None}
+
+            read_member(tar, member, member_name, lo_data)
+
+        if lo_label is not None:
+            jobs[lo_label] = pool.apply_async(analyze_lo_data,
+                (lo_data, self.cal_interp, self.kerr_correction))
+        tar.close()
+        fileobj.close()
+        pool.close()
+
+        if testinfo is None:
+            print "Error: No testinfo.json in " + self.datafile
+            pool.terminate()
+            exit()
+
+        # collect the results in the LO combinations order
+        lo_results = []
+        for lo_comb in testinfo['lo_combinations']:
+            lo_label = '_'.join(['LO'+str(i+1)+'_'+str(lo/1e3)+'GHZ' for i,lo in enumerate(lo_comb)])
+            if lo_label not in jobs:
+                print "Warning: No raw data for LO combination " + lo_label
+                lo_results.append({})
+                continue
+            lo_results.append(jobs[lo_label].get())
+        pool.join()
+
+        # one entry per LO combination for every result, with the results
+        # missing in an LO combination filled with NaN (False for masks)
+        results = {'lo_combinations' : np.array(testinfo['lo_combinations'])}
+        for key in set().union(*lo_results):
+            template = [lo_result[key] for lo_result in lo_results if key in lo_result][0]
+            results[key] = np.array([lo_result.get(key, missing_result(template)) 
+                for lo_result in lo_results])
+
+        np.savez_compressed(outfile, **results)
+        return results
+
+def read_member(tar, member, name, lo_data):
+    """
+    Read the raw data of an archive member of an LO combination.
+    :param tar: archive tarfile object.
+    :param member: member to read.
+    :param name: name of the member inside the LO combination directory.
+    :param lo_data: dictionary where the raw data is appended: 'cal_usb'
+        and 'cal_lsb' lists with (channels, a2, b2, ab_re, ab_im) tuples,
+        'srr' list with (channel, a2_usb, b2_usb, a2_lsb, b2_lsb) tuples,
+        and 'M_DSB' Kerr parameter.
+    """
+    memberfile = tar.extractfile(member)
+    if name.endswith('.npz'):
+        # the archive is streamed, and npz files need a seekable file
+        memberfile = io.BytesIO(memberfile.read())
+
+    if name == 'rawdata.h5':
+        # h5py needs a seekable file, extract it to a temporary file
+        with tempfile.NamedTemporaryFile(suffix='.h5') as tmpfile:
+            shutil.copyfileobj(memberfile, tmpfile)
+            tmpfile.flush()
+            with h5py.File(tmpfile.name, 'r') as h5file:
+                for sideband in ['usb', 'lsb']:
+                    if 'cal_' + sideband in h5file:
+                        group = h5file['cal_' + sideband]
+                        n = group.attrs['npoints']
+                        lo_data['cal_' + sideband].extend(zip(group['chnls'][:n],
+                            group['cal_a2'][:n], group['cal_b2'][:n],
+                            group['cal_ab_re'][:n], group['cal_ab_im'][:n]))
+                if 'srr' in h5file:
+                    group = h5file['srr']
+                    n = group.attrs['npoints']
+                    lo_data['srr'].extend(zip(group['chnl'][:n],
+                        group['a2_tone_usb'][:n], group['b2_tone_usb'][:n],
+                        group['a2_tone_lsb'][:n], group['b2_tone_lsb'][:n]))
+
+    elif name == 'hotcold.npz':
+        lo_data['M_DSB'] = np.load(memberfile)['M_DSB']
+
+    elif name.startswith('cal_rawdata/'): # per-channel npz files
+        sideband, chnl = re.match(r'cal_rawdata/(usb|lsb)_chnl_(\d+)\.npz', name).groups()
+        rawdata = np.load(memberfile)
+        chnls = rawdata['chnls'] if 'chnls' in rawdata.files else [int(chnl)]
+        lo_data['cal_' + sideband].append((chnls, rawdata['cal_a2'],
+            rawdata['cal_b2'], rawdata['cal_ab_re'], rawdata['cal_ab_im']))
+
+    elif name.startswith('srr_rawdata/'): # per-channel npz files
+        chnl = int(re.match(r'srr_rawdata/chnl_(\d+)\.npz', name).group(1))
+        rawdata = np.load(memberfile)
+        lo_data['srr'].append((chnl, rawdata['a2_tone_usb'], rawdata['b2_tone_usb'],
+            rawdata['a2_tone_lsb'], rawdata['b2_tone_lsb']))
+
+def analyze_lo_data(lo_data, cal_interp, kerr_correction):
+    """
+    Compute the sideband ratios, constants and SRR of an LO combination.
+    :param lo_data: dictionary with the raw data of the LO combination
+        (see read_member()).
+    :param cal_interp: interpolation of the unmeasured channels.
+    :param kerr_correction: apply the Kerr correction to the SRR if the
+        hotcold data is available.
+    :return: dictionary with the results.
+    """
+    if cal_interp is None:
+        cal_interp = {'method' : 'linear', 'smoothing' : 0}
+    results = {}
+
+    # sideband ratios
+    for sideband in ['usb', 'lsb']:
+        cal_data = lo_data['cal_' + sideband]
+        if not cal_data:
+            continue
+        chnls, a2, b2, ab_re, ab_im = zip(*cal_data)
+        a2, b2, ab_re, ab_im = np.array(a2), np.array(b2), np.array(ab_re), np.array(ab_im)
+        ntones = max([len(point_chnls) for point_chnls in chnls])
+        chnls = np.array([list(point_chnls) + [-1]*(ntones-len(point_chnls)) 
+            for point_chnls in chnls])
+        nchannels = a2.shape[1]
+
+        # (point, channel) indices of the comb tones (negative channels are padding)
+        points, tones = np.nonzero(chnls >= 0)
+        chnls = chnls[points, tones]
+        ab = ab_re[points, chnls] + 1j*ab_im[points, chnls]
+        if sideband == 'usb':
+            sb_ratios = np.conj(ab) / a2[points, chnls] # b/a = LSB/USB
+        else: # sideband == 'lsb'
+            sb_ratios = ab / b2[points, chnls] # a/b = USB/LSB
+
+        # remove repeated channels and sort
+        chnls, indices = np.unique(chnls, return_index=True)
+        sb_ratios = sb_ratios[indices]
+
+        errors = holdout_error(chnls, sb_ratios, **cal_interp)
+        results['interp_error_' + sideband] = np.max(errors) if len(errors) > 0 else np.nan
+        results['cal_measured_' + sideband] = np.zeros(nchannels, dtype=bool)
+        results['cal_measured_' + sideband][chnls] = True
+        results['sb_ratios_' + sideband] = interp_complex(range(nchannels), chnls, sb_ratios,
+            **cal_interp)
+        results['consts_' + sideband] = -1.0 * results['sb_ratios_' + sideband]
+
+    # SRR
+    if lo_data['srr']:
+        chnls, a2_usb, b2_usb, a2_lsb, b2_lsb = [np.array(arr) for arr in zip(*lo_data['srr'])]
+        order = np.argsort(chnls)
+        points = np.arange(len(chnls))[order]
+        chnls = chnls[order]
+
+        ratio_usb = np.divide(a2_usb[points, chnls], b2_usb[points, chnls], dtype=np.float64)
+        ratio_lsb = np.divide(b2_lsb[points, chnls], a2_lsb[points, chnls], dtype=np.float64)
+        M_DSB = lo_data['M_DSB']
+        if kerr_correction and M_DSB is not None:
+            M_DSB = M_DSB[chnls]
+            srr_usb = ratio_usb * (ratio_lsb*M_DSB - 1) / (ratio_usb - M_DSB)
+            srr_lsb = ratio_lsb * (ratio_usb - M_DSB) / (ratio_lsb*M_DSB - 1)
+        else: # SRR as sideband ratio
+            srr_usb = ratio_usb
+            srr_lsb = ratio_lsb
+
+        # SRR in all the channels, NaN in the channels not measured
+        nchannels = a2_usb.shape[1]
+        results['srr_usb'] = np.full(nchannels, np.nan)
+        results['srr_lsb'] = np.full(nchannels, np.nan)
+        results['srr_usb'][chnls] = 10*np.log10(srr_usb)
+        results['srr_lsb'][chnls] = 10*np.log10(srr_lsb)
+
+    return results
+
+def missing_result(value):
+    """
+    Get the value used for a result missing in an LO combination.
+    :param value: the same result from another LO combination.
+    :return: array with the shape of value, filled with NaN (or with False
+        for boolean masks).
+    """
+    value = np.asarray(value)
+    if value.dtype == bool:
+        return np.zeros(value.shape, dtype=bool)
+    return np.full(value.shape, np.nan, dtype=np.result_type(value.dtype, np.float64))
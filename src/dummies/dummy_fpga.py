@@ -1,6 +1,8 @@
+import time
 import numpy as np
 from itertools import chain
 from dummy_generator import DummyGenerator
+from instrument_simulator import InstrumentSimulator
 
 class DummyFpga():
     """
@@ -10,8 +12,30 @@ class DummyFpga():
     def __init__(self, settings):
         self.settings = settings
         self.generator = DummyGenerator(1.0/(2*self.settings.bw*1e6))
+        self.generators = [self.generator]
         self.regs = []
 
+        # start the instrument simulators from config file. Their tones 
+        # replace the default generator in the simulated signals. 
+        # Format: sim_instruments = [{'type' : 'scpi', 'port' : 5025, 
+        #   'latency' : 0.01, 'settle_time' : 0.05}, ...]
+        self.simulators = []
+        if hasattr(self.settings, 'sim_instruments'):
+            for sim_info in self.settings.sim_instruments:
+                simulator = InstrumentSimulator(DummyGenerator(self.generator.Ts), 
+                    sim_info['port'], sim_info['type'], sim_info.get('latency', 0), 
+                    sim_info.get('settle_time', 0))
+                simulator.start()
+                self.simulators.append(simulator)
+            self.generators = [simulator.generator for simulator in self.simulators]
+
+        # accumulation counter register, increased every sim_acc_time seconds
+        self.acc_count_reg = self.settings.spec_info.get('acc_count_reg')
+        self.acc_time = 0.01
+        if hasattr(self.settings, 'sim_acc_time'):
+            self.acc_time = self.settings.sim_acc_time
+        self.start_time = time.time()
+
         # add registers from config file
         for reg in settings.set_regs:
             self.regs.append({'name' : reg['name'], 'val' : 0})
@@ -24,6 +48,9 @@ class DummyFpga():
         except:
             pass
 
+        # written brams (bram name -> byte array)
+        self.brams = {}
+
         # add spectrometers brams
         if isinstance(self.settings.spec_info['bram_names'], str):
             self.spec_brams = self.settings.spec_info['bram_names']
@@ -56,7 +83,7 @@ class DummyFpga():
         """
         return 2*self.settings.bw
 
-    def write_int(self, reg_name, val):
+    def write_int(self, reg_name, val, blindwrite=False):
         """
         Writes an int value into the Dummy ROACH.
         """
@@ -82,6 +109,8 @@ class DummyFpga():
         """
         Reads the int value from the Dummy ROACH.
         """
+        if reg_name == self.acc_count_reg:
+            return int((time.time() - self.start_time) / self.acc_time) % 2**32
         try:
             return [reg['val'] for reg in self.regs if reg['name'] == reg_name][0]
         except:
@@ -89,13 +118,15 @@ class DummyFpga():
     
     def get_generator_signal(self, nsamples, delay=None):
         """
-        Get the generator signal, clipped to simulate ADC saturation, and casted to the
-        corresponding type to simulate ADC bitwidth.
+        Get the generator signal (sum of all the generators), clipped to simulate 
+        ADC saturation, and casted to the corresponding type to simulate ADC bitwidth.
         """
         if delay is None:
-            signal = np.clip(self.generator.get_signal(nsamples), -128, 127)
+            signal = sum([generator.get_signal(nsamples) for generator in self.generators])
+            signal = np.clip(signal, -128, 127)
         else:
-            signal = np.clip(self.generator.get_signal(nsamples, phase=0), -128, 127)
+            signal = sum([generator.get_signal(nsamples, phase=0) for generator in self.generators])
+            signal = np.clip(signal, -128, 127)
             signal = np.roll(signal, delay)
         return signal.astype('>i1')
 
@@ -116,8 +147,11 @@ class DummyFpga():
         """
         if bram in self.spec_brams:
             # Returns spectra of generator signal accumulated acc_len times.
+            # The full bram spectrum is computed, and the requested bytes returned.
             acc_len = self.read_uint('acc_len')
-            spec_len = get_ndata(nbytes, self.settings.spec_info['data_type'])
+            spec_info = self.settings.spec_info
+            bram_bytes = 2**spec_info['addr_width'] * spec_info['word_width'] / 8
+            spec_len = get_ndata(max(bram_bytes, offset+nbytes), spec_info['data_type'])
             spec_dtype = self.settings.spec_info['data_type']
             spec = np.zeros(spec_len, dtype=spec_dtype)
 
@@ -125,12 +159,22 @@ class DummyFpga():
                 signal = self.get_generator_signal(2*spec_len)
                 spec += np.square(np.abs(np.fft.rfft(signal)[:spec_len])).astype(spec_dtype)
 
-            return spec.tobytes()
+            return spec.tobytes()[offset:offset+nbytes]
 
         # Raise exception if the bram is not declared in the config file
         else: 
             raise Exception("BRAM " + bram + " not defined in config file.")
 
+    def write(self, bram, data, offset=0):
+        """
+        Writes data into a simulated bram.
+        """
+        if bram not in self.brams or len(self.brams[bram]) < offset + len(data):
+            bram_data = bytearray(max(offset + len(data), len(self.brams.get(bram, ''))))
+            bram_data[:len(self.brams.get(bram, ''))] = self.brams.get(bram, '')
+            self.brams[bram] = bram_data
+        self.brams[bram][offset:offset+len(data)] = data
+
 def get_ndata(nbytes, data_type):
     """
     Computes the number of data values given the total number of
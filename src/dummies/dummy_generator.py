@@ -15,14 +15,14 @@ class DummyGenerator():
         """
         Turn on the output of the generator.
         """
-        self.on = True
+        self.output_on = True
         print "Generator output on"
 
     def turn_output_off(self):
         """
         Turn off the output of the generator.
         """
-        self.on = False
+        self.output_on = False
         print "Generator output off"
 
     def set_freq_hz(self, freq):
@@ -0,0 +1,196 @@
+import time, threading, SocketServer
+
+class InstrumentSimulator():
+    """
+    Emulates a signal generator instrument over TCP, to test and benchmark
+    experiments without real instruments. It accepts the SCPI and Anritsu
+    command sets used by the Generator classes, with newline terminated
+    commands (connect with 'TCPSOCKET::localhost::port'). Every command
+    takes a configurable latency, and after a change of frequency, power
+    or output, the generator output is muted during a configurable settle
+    time. The commanded tone is fed into a DummyGenerator, so it reaches
+    the simulated spectra of DummyFpga.
+    """
+    def __init__(self, generator, port, instr_type='scpi', latency=0, settle_time=0, host='localhost'):
+        """
+        :param generator: DummyGenerator object to feed with the commanded tone.
+        :param port: TCP port to listen.
+        :param instr_type: command set of the instrument ('scpi' or 'anritsu').
+        :param latency: time (in seconds) taken by every command.
+        :param settle_time: time (in seconds) that the output takes to
+            settle after a change.
+        :param host: host address to listen.
+        """
+        self.generator = generator
+        self.instr_type = instr_type
+        self.latency = latency
+        self.settle_time = settle_time
+        self.lock = threading.Lock()
+        self.timer = None
+        self.settle_end = 0
+
+        # instrument state
+        self.output_on = False
+        self.freq = generator.freq
+        self.power = generator.power
+        self.freq_mult = 1
+        self.list_freqs = []
+        self.list_index = 0
+        self.list_mode = False
+        self.apply_state()
+
+        SocketServer.ThreadingTCPServer.allow_reuse_address = True
+        self.server = SocketServer.ThreadingTCPServer((host, port), SimulatorHandler)
+        self.server.daemon_threads = True
+        self.server.simulator = self
+
+    def start(self):
+        """
+        Start serving the instrument connections in a background thread.
+        """
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        """
+        Stop the simulator.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+
+    def process(self, command):
+        """
+        Process a command sent to the instrument.
+        :param command: command string.
+        :return: response string for queries, None for the rest.
+        """
+        time.sleep(self.latency)
+        if command.strip().upper() == '*OPC?':
+            # the operation is complete when the output is settled
+            time.sleep(max(0, self.settle_end - time.time()))
+            timer = self.timer
+            if timer is not None:
+                timer.join()
+            return '1'
+
+        with self.lock:
+            if self.instr_type == 'anritsu':
+                return self.process_anritsu(command)
+            return self.process_scpi(command)
+
+    def process_scpi(self, command):
+        """
+        Process a SCPI command.
+        :param command: command string.
+        :return: response string for queries, None for the rest.
+        """
+        tokens = command.strip().split(None, 1)
+        if not tokens:
+            return None
+        head = tokens[0].lower()
+        arg = tokens[1].strip() if len(tokens) > 1 else ''
+
+        if head == '*idn?':
+            return 'roach_tools,InstrumentSimulator,0,0'
+        elif head in ['outp', 'output']:
+            self.output_on = arg.lower() in ['on', '1']
+            self.change_output()
+        elif head in ['outp?', 'output?']:
+            return '1' if self.output_on else '0'
+        elif head in ['freq', 'frequency']:
+            self.freq = float(arg)
+            self.change_output()
+        elif head in ['freq?', 'frequency?']:
+            return repr(self.freq)
+        elif head in ['power', 'pow']:
+            self.power = float(arg)
+            self.change_output()
+        elif head in ['power?', 'pow?']:
+            return repr(self.power)
+        elif head == 'freq:mult':
+            self.freq_mult = float(arg)
+            self.change_output()
+        elif head == 'freq:mult?':
+            return repr(self.freq_mult)
+        elif head == 'list:freq':
+            self.list_freqs = [float(freq) for freq in arg.split(',')]
+        elif head == 'freq:mode':
+            self.list_mode = arg.lower() == 'list'
+        elif head == 'init' and self.list_mode:
+            self.list_index = 0
+            self.freq = self.list_freqs[0]
+            self.change_output()
+        elif head == '*trg' and self.list_mode:
+            self.list_index = min(self.list_index+1, len(self.list_freqs)-1)
+            self.freq = self.list_freqs[self.list_index]
+            self.change_output()
+        elif head not in ['list:type', 'list:trig:sour', 'init', '*trg', '*rst', '*cls']:
+            print "Instrument simulator: unknown SCPI command '" + command + "'"
+        return None
+
+    def process_anritsu(self, command):
+        """
+        Process an Anritsu (native) command.
+        :param command: command string.
+        :return: response string for queries, None for the rest.
+        """
+        units = {'H' : 1, 'KH' : 1e3, 'MH' : 1e6, 'GH' : 1e9}
+        tokens = command.strip().upper().split()
+        if not tokens:
+            return None
+
+        if tokens[0] == 'RF1':
+            self.output_on = True
+            self.change_output()
+        elif tokens[0] == 'RF0':
+            self.output_on = False
+            self.change_output()
+        elif tokens[0] == 'F1' and len(tokens) == 3 and tokens[2] in units:
+            self.freq = float(tokens[1]) * units[tokens[2]]
+            self.change_output()
+        elif tokens[0] == 'L1' and len(tokens) == 3:
+            self.power = float(tokens[1])
+            self.change_output()
+        else:
+            print "Instrument simulator: unknown Anritsu command '" + command + "'"
+        return None
+
+    def change_output(self):
+        """
+        Mute the generator output during the settle time, and then apply
+        the new instrument state to the DummyGenerator.
+        """
+        if self.timer is not None:
+            self.timer.cancel()
+        self.settle_end = time.time() + self.settle_time
+        if self.settle_time > 0:
+            self.generator.output_on = False
+            self.timer = threading.Timer(self.settle_time, self.apply_state)
+            self.timer.daemon = True
+            self.timer.start()
+        else:
+            self.apply_state()
+
+    def apply_state(self):
+        """
+        Apply the instrument state to the DummyGenerator.
+        """
+        self.generator.freq = self.freq / self.freq_mult
+        self.generator.power = self.power
+        self.generator.output_on = self.output_on
+
+class SimulatorHandler(SocketServer.StreamRequestHandler):
+    """
+    Handles a connection to the instrument simulator.
+    """
+    def handle(self):
+        simulator = self.server.simulator
+        while True:
+            command = self.rfile.readline()
+            if not command:
+                break
+            response = simulator.process(command.rstrip('\r\n'))
+            if response is not None:
+                self.wfile.write(response + '\n')
+                self.wfile.flush()
@@ -1,6 +1,6 @@
 import numpy as np
 from itertools import chain
-from instruments.generator import Generator
+from instruments.generator import Generator, run_parallel
 
 class Experiment():
     """
@@ -124,7 +124,8 @@ def get_spec_time_arr(bw, n_specs, bram_info):
 def init_sources(sources):
     """
     Initalizise a source or (list of sources) instrument, that is, set the 
-    default frequency, power and turn on the RF output.
+    default frequency, power and turn on the RF output. A list of sources
+    is initialized in parallel.
     :param sources: source object, or list of objects, defined as in
         instruments/generator.py
     """
@@ -134,8 +135,7 @@ def init_sources(sources):
         sources.turn_output_on()
     
     else: # is list
-        for source in sources:
-            init_sources(source)
+        run_parallel([(init_sources, (source,)) for source in sources])
         
 def turn_off_sources(sources):
     """
@@ -148,6 +148,20 @@ def turn_off_sources(sources):
         sources.turn_output_off()
     
     else: # is list
-        for source in sources:
-            turn_off_sources(source)
+        run_parallel([(turn_off_sources, (source,)) for source in sources])
+
+def set_sources_freq_mhz(sources, freqs):
+    """
+    Set the frequency of a source, or list of sources. A list of sources
+    is retuned in parallel.
+    :param sources: source object, or list of objects, defined as in
+        instruments/generator.py
+    :param freqs: frequency to set in MHz, or list of frequencies
+        (one for each source).
+    """
+    if isinstance(sources, Generator):
+        sources.set_freq_mhz(freqs)
+
+    else: # is list
+        run_parallel([(source.set_freq_mhz, (freq,)) for source, freq in zip(sources, freqs)])
      
@@ -0,0 +1,133 @@
+import numpy as np
+
+def get_fixed_limits(nbits, bin_pt):
+    """
+    Get the maximum and minimum values representable by a signed fixed
+    point representation.
+    :param nbits: bitwidth of the signed fixed point representation.
+    :param bin_pt: binary point of the signed fixed point representation.
+    :return: tuple (max value, min value).
+    """
+    max_val = (2.0**(nbits-1)-1) / (2**bin_pt)
+    min_val = (-2.0**(nbits-1))  / (2**bin_pt)
+    return max_val, min_val
+
+def quantize(nbits, bin_pt, data, rounding='truncate', overflow='saturate'):
+    """
+    Convert an array of float point numbers into big-endian (ROACH
+    compatible) signed fixed point numbers, with all the array processed
+    at once.
+    :param nbits: bitwidth of the fixed point representation.
+    :param bin_pt: binary point of the fixed point representation.
+    :param data: number or data array to convert.
+    :param rounding: 'truncate' (towards zero) or 'round' (to nearest).
+    :param overflow: 'saturate' (clip to the representable range) or 'wrap'
+        (two's complement wrap around, as a plain cast in the FPGA).
+    :return: tuple (converted data array, boolean array with the values
+        that overflowed). The data type is the smallest integer type that
+        fits nbits.
+    """
+    scaled = 2.0**bin_pt * np.asarray(data, dtype=np.float64)
+    if rounding == 'truncate':
+        scaled = np.trunc(scaled)
+    elif rounding == 'round':
+        scaled = np.round(scaled)
+    else:
+        print "Error: Unknown rounding mode '" + str(rounding) + "'."
+        exit()
+
+    max_int = 2**(nbits-1) - 1
+    min_int = -2**(nbits-1)
+    overflow_mask = (scaled > max_int) | (scaled < min_int)
+    if overflow == 'saturate':
+        scaled = np.clip(scaled, min_int, max_int)
+    elif overflow == 'wrap':
+        scaled = np.mod(scaled - min_int, 2**nbits) + min_int
+    else:
+        print "Error: Unknown overflow mode '" + str(overflow) + "'."
+        exit()
+
+    nbytes = [nb for nb in [1, 2, 4, 8] if 8*nb >= nbits][0]
+    return scaled.astype('>i'+str(nbytes)), overflow_mask
+
+def check_overflow(nbits, bin_pt, data):
+    """
+    Given a signed fixed point representation of bitwidth nbits and
+    binary point bin_pt, check if the data array contains values that
+    will produce overflow if it would be cast. If overflow is detected,
+    a single warning with a summary is printed.
+    :param nbits: bitwidth of the signed fixed point representation.
+    :param bin_pt: binary point of the signed fixed point representation.
+    :param data: number or data array to check.
+    :return: boolean array with the values that overflow.
+    """
+    max_val, min_val = get_fixed_limits(nbits, bin_pt)
+    data = np.asarray(data, dtype=np.float64)
+    overflow_mask = (data > max_val) | (data < min_val)
+    print_overflow_summary(nbits, bin_pt, data, overflow_mask)
+    return overflow_mask
+
+def print_overflow_summary(nbits, bin_pt, data, overflow_mask):
+    """
+    Print a warning with the number of values that overflow a fixed point
+    representation, if any.
+    :param nbits: bitwidth of the signed fixed point representation.
+    :param bin_pt: binary point of the signed fixed point representation.
+    :param data: checked data array.
+    :param overflow_mask: boolean array with the values that overflow.
+    """
+    noverflow = np.count_nonzero(overflow_mask)
+    if noverflow == 0:
+        return
+    max_val, min_val = get_fixed_limits(nbits, bin_pt)
+    data = np.asarray(data, dtype=np.float64)
+    print "WARNING! " + str(noverflow) + " of " + str(data.size) + " values exceeded " + \
+        "the fixed point range [" + str(min_val) + ", " + str(max_val) + "] in overflow check."
+    print "Data range: [" + str(np.min(data)) + ", " + str(np.max(data)) + "]"
+
+def float2fixed(nbits, bin_pt, data, rounding='truncate', overflow='saturate'):
+    """
+    Convert a numpy array with float point numbers into big-endian
+    (ROACH compatible) fixed point numbers. An overflow check is done
+    and a warning is printed if the float numbers can't be represented
+    with the fixed point parameters (see quantize()).
+    :param nbits: bitwidth of the fixed point representation.
+    :param bin_pt: binary point of the fixed point representation.
+    :param data: data array to convert.
+    :param rounding: 'truncate' or 'round'.
+    :param overflow: 'saturate' or 'wrap'.
+    :return: converted data array.
+    """
+    fixedpoint_data, overflow_mask = quantize(nbits, bin_pt, data, rounding, overflow)
+    print_overflow_summary(nbits, bin_pt, data, overflow_mask)
+    return fixedpoint_data
+
+def saturate_fixed_comp(nbits, bin_pt, data):
+    """
+    Receives complex numbers and saturates their real
+    and imaginary part, in order that naither of them
+    surpass the upper and lower limits given by a fixed
+    representation of nbits bits and binary point bin_pt.
+    In case of saturation both the real and imaginary part
+    are scaled in order to conserve the angle of the
+    original data.
+    :param nbits: bitwidth of the signed fixed point representation.
+    :param bin_pt: binary point of the signed fixed point representation.
+    :param data: complex number or data array to check.
+    :return: number or array with the saturated data.
+    """
+    max_val, min_val = get_fixed_limits(nbits, bin_pt)
+    data = np.asarray(data, dtype=np.complex128)
+    data_real = np.real(data)
+    data_imag = np.imag(data)
+
+    # case upper saturation
+    upper = (data_real > max_val) | (data_imag > max_val)
+    data = np.where(upper, data / ((np.maximum(data_real, data_imag) / max_val) + 0.0001), data)
+    # case lower saturation
+    lower = (data_real < min_val) | (data_imag < min_val)
+    data = np.where(lower, data / ((np.minimum(data_real, data_imag) / min_val) + 0.001), data)
+
+    if data.ndim == 0: # case single data
+        return complex(data)
+    return data
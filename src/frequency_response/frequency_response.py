@@ -5,6 +5,7 @@ from ..experiment import Experiment, get_nchannels, init_sources, turn_off_sourc
 from ..calanfigure import CalanFigure
 from ..instruments.generator import create_generator
 from ..axes.spectrum_axis import SpectrumAxis
+from ..frequency_sweep import FrequencySweep
 
 class FrequencyResponse(Experiment):
     """
@@ -48,31 +49,13 @@ class FrequencyResponse(Experiment):
         Performs a frequency response test. Sweeps tone in the inputs 
         and computes the power at the outputs.
         """
-        freq_resp = [[] for i in range(self.n_inputs)]
+        self.freq_resp = [[] for i in range(self.n_inputs)]
         init_sources(self.rf_source)
         
         print "Computing frequency response..."
-        for i, chnl in enumerate(self.test_channels):
-            # set generator frequency
-            self.rf_source.set_freq_mhz(self.freqs[chnl])
-            time.sleep(self.settings.pause_time)
-
-            # get spectrum data
-            spec_data = self.fpga.get_bram_data(self.settings.spec_info)
-
-            # scale spectrum data and convert it into dBFS
-            spec_data_dbfs = self.scale_dbfs_spec_data(spec_data, self.settings.spec_info)
-
-            partial_freqs = self.freqs[self.test_channels[:i+1]]
-            for j, spec in enumerate(spec_data_dbfs):
-                # update frequency response
-                freq_resp[j].append(spec[chnl])
-
-                # plot spectrum and frequency response
-                self.figure.axes[j].plot(spec)
-                self.figure.axes[j+self.n_inputs].plotxy(partial_freqs, freq_resp[j])
-            
-            plt.pause(self.settings.pause_time)
+        sweep = FrequencySweep(self.fpga, self.rf_source, self.settings.spec_info, plt.pause)
+        sweep.run(self.freqs[self.test_channels], self.read_spec_data, self.reduce_freq_resp_point, 
+            self.test_channels)
 
         self.rf_source.turn_output_off()
         print "done"
@@ -85,7 +68,35 @@ class FrequencyResponse(Experiment):
 
         # save data
         print "Saving data..."
-        self.testinfo['frequency_response'] = freq_resp
+        self.testinfo['frequency_response'] = self.freq_resp
         with open(self.datadir+'.json', 'w') as jsonfile:
             json.dump(self.testinfo, jsonfile, indent=4)
         print "done"
+
+    def read_spec_data(self):
+        """
+        Read the spectrum data of the current sweep point.
+        :return: spectrum data.
+        """
+        return self.fpga.get_bram_data(self.settings.spec_info)
+
+    def reduce_freq_resp_point(self, i, spec_data):
+        """
+        Update the frequency response with the data of a sweep point
+        and plot the results.
+        :param i: index of the point in the sweep.
+        :param spec_data: spectrum data read with read_spec_data().
+        """
+        chnl = self.test_channels[i]
+
+        # scale spectrum data and convert it into dBFS
+        spec_data_dbfs = self.scale_dbfs_spec_data(spec_data, self.settings.spec_info)
+
+        partial_freqs = self.freqs[self.test_channels[:i+1]]
+        for j, spec in enumerate(spec_data_dbfs):
+            # update frequency response
+            self.freq_resp[j].append(spec[chnl])
+
+            # plot spectrum and frequency response
+            self.figure.axes[j].plot(spec)
+            self.figure.axes[j+self.n_inputs].plotxy(partial_freqs, self.freq_resp[j])
@@ -0,0 +1,155 @@
+import time
+import numpy as np
+from instruments.generator import Generator, CommandThread
+from experiment import set_sources_freq_mhz
+from settle_detector import SettleDetector
+
+class FrequencySweep():
+    """
+    Pipelined tone sweep engine. Sweeps the RF source(s) through a list of
+    frequency points, and for every point reads the FPGA data and reduces it
+    with an experiment specific function (compute and plot). The generator
+    retuning for point N+1 is done in a background thread while the data of
+    point N is being read and reduced, so most of the dead time of the
+    sweep is removed.
+    The data of every point is read once a SettleDetector declares it valid.
+    If the spectrometer bram_info has an accumulation counter register
+    ('acc_count_reg' key) it is also used to discard spectra accumulated
+    while the generator was being retuned. If not, the sweep waits
+    settings.pause_time after every retune, as the serial sweeps did.
+    If the source is a single generator (or a list with a single generator)
+    with list sweep enabled ('list_sweep' key in its instr_info), the whole frequency list is 
+    uploaded to the generator at the start of the sweep, and the generator 
+    is stepped to the next point with a trigger as soon as the data of the 
+    current point is read.
+    """
+    def __init__(self, calanfpga, sources, bram_info, pause_func=time.sleep):
+        """
+        :param calanfpga: CalanFpga object.
+        :param sources: generator object, or list of generator objects, to
+            sweep. If a list is given every sweep point must be a list of
+            frequencies, one for each source.
+        :param bram_info: bram_info dictionary of the spectrometer used in
+            the sweep. Used to get the accumulation counter register.
+        :param pause_func: function used to wait for the generator when no
+            accumulation counter is available, and to update the plots.
+            Use plt.pause for experiments with live plots.
+        """
+        self.fpga = calanfpga
+        self.settings = self.fpga.settings
+        # a list with a single source is swept as the source itself
+        # (its points are lists with a single frequency), so it can use
+        # the list sweep of the generator
+        self.unwrap_points = isinstance(sources, list) and len(sources) == 1
+        self.sources = sources[0] if self.unwrap_points else sources
+        self.pause_func = pause_func
+        self.settle_detector = SettleDetector(self.fpga, bram_info, 
+            self.settings.pause_time, pause_func)
+        self.acc_count_reg = self.settle_detector.acc_count_reg
+        self.draw_time = 0.00001
+        self.list_sweep = isinstance(self.sources, Generator) and self.sources.list_sweep
+
+    def run(self, points, read_data, reduce_point, chnls=None, done_data=None):
+        """
+        Perform the sweep.
+        :param points: list of frequency points (in MHz) to set in the sources.
+        :param read_data: function without arguments that reads the FPGA data
+            for the current point.
+        :param reduce_point: function with arguments (i, data), with i the
+            index of the point in the sweep, and data the return value of
+            read_data. It computes the experiment result for the point and
+            plots it.
+        :param chnls: list with the channel of the test tone for every
+            point, monitored to detect when the data is settled. If None
+            the total power of the spectra is monitored.
+        :param done_data: list with the data of the first points of the
+            sweep, measured in a previous (interrupted) run. These points
+            are only reduced, the sweep continues with the next point.
+        :return: list with the return values of reduce_point for every point.
+        """
+        if self.unwrap_points:
+            points = [point[0] for point in points]
+        results = []
+        if done_data is None:
+            done_data = []
+        for i, data in enumerate(done_data):
+            results.append(reduce_point(i, data))
+        
+        start = len(done_data)
+        if start >= len(points):
+            return results
+        if self.list_sweep:
+            retune = CommandThread(self.start_list_sweep, points[start:])
+        else:
+            retune = CommandThread(set_sources_freq_mhz, self.sources, points[start])
+        retune.start()
+
+        for i in range(start, len(points)):
+            point = points[i]
+            chnl = None if chnls is None else chnls[i]
+            retune.finish()
+            acc_count = self.settle_detector.wait_settled(chnl)
+
+            # with accumulation counter start the next retune before the
+            # data read, and check later that no new accumulation landed
+            # in the brams during the read (not possible in list sweeps,
+            # as the list can't be stepped back)
+            next_retune = None
+            if acc_count is not None and not self.list_sweep and i+1 < len(points):
+                next_retune = CommandThread(set_sources_freq_mhz, self.sources, points[i+1])
+                next_retune.start()
+
+            data = read_data()
+
+            if next_retune is not None and self.read_acc_count() != acc_count:
+                # data could contain spectra of the next point,
+                # repeat the measurement without pipelining
+                next_retune.finish()
+                data = self.measure_point(point, read_data, chnl)
+                next_retune = CommandThread(set_sources_freq_mhz, self.sources, points[i+1])
+                next_retune.start()
+            elif next_retune is None and self.list_sweep and i+1 < len(points):
+                next_retune = CommandThread(self.sources.trigger_list_point)
+                next_retune.start()
+            elif next_retune is None and i+1 < len(points):
+                next_retune = CommandThread(set_sources_freq_mhz, self.sources, points[i+1])
+                next_retune.start()
+
+            # reduce data while the generator is retuning
+            results.append(reduce_point(i, data))
+            self.pause_func(self.draw_time)
+            retune = next_retune
+
+        if self.list_sweep:
+            self.sources.stop_list_sweep()
+
+        return results
+
+    def start_list_sweep(self, points):
+        """
+        Upload the frequency points to the list sweep memory of the
+        generator and start the list sweep in the first point.
+        :param points: list of frequency points (in MHz).
+        """
+        self.sources.load_freq_list_mhz(points)
+        self.sources.start_list_sweep()
+
+    def measure_point(self, point, read_data, chnl=None):
+        """
+        Set a single sweep point and read its data, without pipelining.
+        :param point: frequency point to set in the sources.
+        :param read_data: function that reads the FPGA data.
+        :param chnl: channel of the test tone, monitored to detect when
+            the data is settled.
+        :return: data read.
+        """
+        set_sources_freq_mhz(self.sources, point)
+        self.settle_detector.wait_settled(chnl)
+        return read_data()
+
+    def read_acc_count(self):
+        """
+        Read the accumulation counter register.
+        :return: accumulation counter value.
+        """
+        return self.fpga.read_reg(self.acc_count_reg)
@@ -1,4 +1,3 @@
-import time
 from generator import Generator
 
 class AnritsuGenerator(Generator):
@@ -12,15 +11,13 @@ class AnritsuGenerator(Generator):
         """
         Turn on the output of the generator.
         """
-        self.instr.write('RF1')
-        time.sleep(self.sleep_time)
+        self.write_state('output', True, 'RF1')
 
     def turn_output_off(self):
         """
         Turn off the output of the generator.
         """
-        self.instr.write('RF0')
-        time.sleep(self.sleep_time)
+        self.write_state('output', False, 'RF0')
 
     def set_freq_hz(self, freq=None):
         """
@@ -29,8 +26,7 @@ class AnritsuGenerator(Generator):
         """
         if freq is None:
             freq = 1000000 * self.def_freq
-        self.instr.write('F1 ' + str(freq) + ' H')
-        time.sleep(self.sleep_time)
+        self.write_state('freq', freq, 'F1 ' + str(freq) + ' H')
 
     def set_freq_mhz(self, freq=None):
         """
@@ -39,8 +35,7 @@ class AnritsuGenerator(Generator):
         """
         if freq is None:
             freq = self.def_freq
-            return
-        self.instr.write('F1 ' + str(freq) + ' MH')
+        self.write_state('freq', 1000000 * freq, 'F1 ' + str(freq) + ' MH')
 
     def set_power_dbm(self, power=None):
         """
@@ -49,5 +44,4 @@ class AnritsuGenerator(Generator):
         """
         if power is None:
             power = self.def_power
-        self.instr.write('L1 ' + str(power) + ' DM')
-        time.sleep(self.sleep_time)
+        self.write_state('power', power, 'L1 ' + str(power) + ' DM')
@@ -1,4 +1,4 @@
-import vxi11, socket
+import sys, time, threading, vxi11, socket
 
 class Generator():
     """
@@ -7,6 +7,18 @@ class Generator():
     def __init__(self, instr, instr_info): 
         self.instr = instr
         self.sleep_time = 0.1
+        try:
+            self.opc = instr_info['opc']
+        except KeyError:
+            self.opc = False
+        try:
+            self.list_sweep = instr_info['list_sweep']
+        except KeyError:
+            self.list_sweep = False
+        try:
+            self.verify_state = instr_info['verify_state']
+        except KeyError:
+            self.verify_state = False
         try:
             self.def_freq = instr_info['def_freq']
         except KeyError:
@@ -16,6 +28,9 @@ class Generator():
         except KeyError:
             self.def_power = -100
 
+        # last commanded state of the instrument (output, freq, power, etc.)
+        self.state = {}
+
         # set multiplier for the displayed frequency
         if 'freq_mult' in instr_info:
             freq_mult = instr_info['freq_mult']
@@ -25,9 +40,115 @@ class Generator():
         #self.set_freq_mhz()
         #self.set_power_dbm()
         
+    def write(self, command):
+        """
+        Send a command to the instrument and wait for its completion.
+        If the instrument supports it (instr_info 'opc' key set to True), 
+        the completion is confirmed with an *OPC? query, that returns as
+        soon as the instrument finished the command. If not, waits 
+        sleep_time.
+        :param command: command string.
+        """
+        self.instr.write(command)
+        if self.opc:
+            self.instr.ask('*OPC?')
+        else:
+            time.sleep(self.sleep_time)
+
+    def write_state(self, key, value, command, query=None):
+        """
+        Send a command that sets a state parameter of the instrument, 
+        unless the parameter was already commanded with the same value.
+        If verify_state is set (instr_info 'verify_state' key), a skipped
+        command is first verified with a query to the instrument, and 
+        sent anyway if the instrument state differs (e.g. it was changed
+        from the front panel).
+        :param key: name of the state parameter (e.g. 'freq').
+        :param value: value of the parameter set by the command.
+        :param command: command string.
+        :param query: query string that returns the value of the parameter,
+            or None if the instrument has no such query.
+        """
+        if key in self.state and self.state[key] == value:
+            if not self.verify_state or query is None:
+                return
+            if self.check_state(query, value):
+                return
+        self.write(command)
+        self.state[key] = value
+
+    def check_state(self, query, value):
+        """
+        Query a state parameter of the instrument and compare it with
+        the expected value.
+        :param query: query string.
+        :param value: expected value (number or boolean).
+        :return: True if the instrument value matches the expected value.
+        """
+        try:
+            instr_value = float(self.instr.ask(query))
+        except ValueError:
+            return False
+        return abs(instr_value - float(value)) <= 1e-6 * max(1, abs(float(value)))
+
+    def clear_state(self, key=None):
+        """
+        Forget the last commanded state of the instrument, so the next
+        commands are always sent.
+        :param key: state parameter to forget. If None all the state is
+            forgotten.
+        """
+        if key is None:
+            self.state = {}
+        else:
+            self.state.pop(key, None)
+
     def close_connection(self):
         self.instr.close()
 
+class CommandThread(threading.Thread):
+    """
+    Thread that runs an instrument command (or any function), so that
+    independent instruments can be commanded at the same time. Errors in 
+    the thread are raised again in the calling thread when calling finish().
+    """
+    def __init__(self, func, *args):
+        """
+        :param func: function to run.
+        :param args: arguments of the function.
+        """
+        threading.Thread.__init__(self)
+        self.func = func
+        self.args = args
+        self.exc_info = None
+
+    def run(self):
+        try:
+            self.func(*self.args)
+        except Exception:
+            self.exc_info = sys.exc_info()
+
+    def finish(self):
+        """
+        Wait for the thread to end and raise its error, if any.
+        """
+        self.join()
+        if self.exc_info is not None:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+
+def run_parallel(calls):
+    """
+    Run instrument commands in parallel, one thread per command, and wait
+    for all of them to finish. The commands must be for different 
+    instruments.
+    :param calls: list of tuples (function, arguments tuple).
+    """
+    threads = [CommandThread(func, *args) for func, args in calls]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.finish()
+
 def create_generator(instr_info):
     """
     Create the appropiate generator object given the instr_info
@@ -38,10 +159,18 @@ def create_generator(instr_info):
             command keywords.
          'connection' : type of connection in Visa format.
             See https://pyvisa.readthedocs.io/en/stable/names.html
+            VXI-11 ('TCPIP::...') and raw socket ('TCPSOCKET::host::port')
+            connections are supported.
          'def_freq'   : Default frequency to use when not specified 
             (in MHz).
          'def_power'  : Default power level to use when not specified
             (in dBm).
+         'opc'        : (optional) True: confirm the completion of every
+            command with an *OPC? query instead of waiting a fixed time.
+         'list_sweep' : (optional) True: use the hardware list sweep of
+            the generator in frequency sweeps (only SCPI generators).
+         'verify_state' : (optional) True: before skipping a command that
+            sets an already commanded state, verify the state with a query.
         }
     :param print_msgs: True: print command messages. False: do not.
     :return: Generator object.
@@ -52,13 +181,26 @@ def create_generator(instr_info):
     
     # create the proper generator object with the correct inctruction keywords
     if instr_info['type'] == 'scpi':
-        instr = vxi11.Instrument(instr_info['connection'])
+        instr = create_instrument(instr_info['connection'])
         return ScpiGenerator(instr, instr_info)
     elif instr_info['type'] == 'anritsu':
-        instr = vxi11.Instrument(instr_info['connection'])
+        instr = create_instrument(instr_info['connection'])
         return AnritsuGenerator(instr, instr_info)
     elif instr_info['type'] == 'sim':
         return SimGenerator(None, instr_info)
     else: 
         print("Error: Instrument type " + instr_info['type'] + "not recognized.")
         exit()
+
+def create_instrument(connection):
+    """
+    Create the instrument connection object given the connection string.
+    :param connection: connection string in Visa format. 'TCPSOCKET::' 
+        connections use a raw TCP socket (e.g. to connect with the local
+        instrument simulator), the rest use VXI-11.
+    :return: instrument object with write, ask and close methods.
+    """
+    if connection.upper().startswith('TCPSOCKET::'):
+        from socket_instrument import SocketInstrument
+        return SocketInstrument(connection)
+    return vxi11.Instrument(connection)
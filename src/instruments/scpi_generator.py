@@ -1,4 +1,3 @@
-import time
 from generator import Generator
 
 class ScpiGenerator(Generator):
@@ -12,15 +11,13 @@ class ScpiGenerator(Generator):
         """
         Turn on the output of the generator.
         """
-        self.instr.write('outp on')
-        time.sleep(self.sleep_time)
+        self.write_state('output', True, 'outp on', 'outp?')
 
     def turn_output_off(self):
         """
         Turn off the output of the generator.
         """
-        self.instr.write('outp off')
-        time.sleep(self.sleep_time)
+        self.write_state('output', False, 'outp off', 'outp?')
 
     def set_freq_hz(self, freq=None):
         """
@@ -29,8 +26,7 @@ class ScpiGenerator(Generator):
         """
         if freq is None:
             freq = 1000000 * self.def_freq
-        self.instr.write('freq ' + str(freq))
-        time.sleep(self.sleep_time)
+        self.write_state('freq', freq, 'freq ' + str(freq), 'freq?')
 
     def set_freq_mhz(self, freq=None):
         """
@@ -49,11 +45,43 @@ class ScpiGenerator(Generator):
         """
         if power is None:
             power = self.def_power
-        self.instr.write('power ' + str(power))
-        time.sleep(self.sleep_time)
+        self.write_state('power', power, 'power ' + str(power), 'power?')
 
     def set_freq_mult(self, freq_mult): 
         """
         Set frequency multiplier.
         """
-        self.instr.write('freq:mult ' + str(freq_mult))
+        self.write_state('freq_mult', freq_mult, 'freq:mult ' + str(freq_mult), 'freq:mult?')
+
+    def load_freq_list_mhz(self, freqs):
+        """
+        Upload a list of frequencies to the list sweep memory of the 
+        generator. The list is stepped with bus triggers (*TRG).
+        :param freqs: list of frequencies in MHz.
+        """
+        self.write('list:type list')
+        self.write('list:freq ' + ','.join([str(1000000 * freq) for freq in freqs]))
+        self.write('list:trig:sour bus')
+
+    def start_list_sweep(self):
+        """
+        Start the list sweep. The generator output is set to the first 
+        frequency of the list.
+        """
+        self.clear_state('freq')
+        self.write('freq:mode list')
+        self.write('init')
+
+    def trigger_list_point(self):
+        """
+        Step the list sweep to the next frequency of the list.
+        """
+        self.clear_state('freq')
+        self.write('*TRG')
+
+    def stop_list_sweep(self):
+        """
+        Stop the list sweep and return to fixed frequency mode.
+        """
+        self.clear_state('freq')
+        self.write('freq:mode cw')
@@ -0,0 +1,50 @@
+import socket
+
+class SocketInstrument():
+    """
+    Minimal instrument connection over a raw TCP socket, with newline
+    terminated commands (VISA TCPSOCKET resource, port 5025 in most SCPI
+    instruments). It has the same write/ask/close interface as
+    vxi11.Instrument, so it can be used by the Generator classes. It is
+    also the connection used with the local instrument simulator
+    (dummies/instrument_simulator.py).
+    """
+    def __init__(self, connection, timeout=10):
+        """
+        :param connection: connection string in Visa format:
+            'TCPSOCKET::host::port'.
+        :param timeout: socket timeout in seconds.
+        """
+        host, port = connection.split('::')[1:3]
+        self.sock = socket.create_connection((host, int(port)), timeout)
+        self.sockfile = self.sock.makefile('r')
+
+    def write(self, command):
+        """
+        Send a command to the instrument.
+        :param command: command string.
+        """
+        self.sock.sendall(command + '\n')
+
+    def read(self):
+        """
+        Read a response line from the instrument.
+        :return: response string without the line termination.
+        """
+        return self.sockfile.readline().rstrip('\r\n')
+
+    def ask(self, command):
+        """
+        Send a query to the instrument and read the response.
+        :param command: query string.
+        :return: response string.
+        """
+        self.write(command)
+        return self.read()
+
+    def close(self):
+        """
+        Close the connection.
+        """
+        self.sockfile.close()
+        self.sock.close()
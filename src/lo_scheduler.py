@@ -0,0 +1,135 @@
+import traceback, multiprocessing, Queue
+import matplotlib.pyplot as plt
+from calanfpga import CalanFpga
+from experiment import init_sources, turn_off_sources
+
+class LoScheduler():
+    """
+    Spread the LO combinations of a multi-LO experiment (e.g. DSS test)
+    across several ROACH boards, each one with its own sources, running
+    in separated processes. The boards are configured with the config
+    file parameter 'boards', a list of dictionaries with the parameters
+    that are different for each board, for example:
+    boards = [{'roach_ip' : '192.168.1.12', 'rf_source' : {...}, 'lo_sources' : [...]},
+              {'roach_ip' : '192.168.1.13', 'rf_source' : {...}, 'lo_sources' : [...]}]
+    Every board process creates its own experiment object over the data
+    directory of the main experiment (as if resuming the test), so the
+    results of each LO combination are saved in the same directory layout
+    and journals as a serial run.
+    """
+    def __init__(self, experiment_class, datadir, boards):
+        """
+        :param experiment_class: class of the experiment to run. It must
+            implement run_lo_comb(lo_comb), and have a sources attribute.
+        :param datadir: data directory of the main experiment.
+        :param boards: list of dictionaries with the config parameters
+            of every board.
+        """
+        self.experiment_class = experiment_class
+        self.datadir = datadir
+        self.boards = boards
+
+    def run(self, lo_combinations, finished_func=None):
+        """
+        Run the LO combinations in the boards. Every board takes the next
+        pending LO combination when it finishes the previous one.
+        :param lo_combinations: list of LO combinations to run.
+        :param finished_func: function called with every LO combination
+            finished successfully (e.g. to compress its data).
+        :return: list of LO combinations that failed, including the ones
+            not reported by any board (e.g. if all the boards died).
+        """
+        lo_queue = multiprocessing.Queue()
+        result_queue = multiprocessing.Queue()
+        for lo_comb in lo_combinations:
+            lo_queue.put(lo_comb)
+
+        processes = []
+        for board in self.boards:
+            process = multiprocessing.Process(target=run_board, args=(self.experiment_class,
+                board, self.datadir, lo_queue, result_queue))
+            process.start()
+            processes.append(process)
+
+        # collect results while the boards are running
+        failed = []
+        reported = []
+        while len(reported) < len(lo_combinations):
+            # check the boards before waiting, so the results of boards
+            # that exit during the wait are still collected
+            boards_alive = any([process.is_alive() for process in processes])
+            try:
+                board_ip, lo_comb, error = result_queue.get(True, 1)
+            except Queue.Empty:
+                if not boards_alive:
+                    break
+                continue
+
+            if lo_comb is None: # board setup error
+                print "Board " + board_ip + " failed to start:"
+                print error
+                continue
+
+            reported.append(lo_comb)
+            if error is None:
+                print "Board " + board_ip + " finished LO combination " + str(lo_comb)
+                if finished_func is not None:
+                    finished_func(lo_comb)
+            else:
+                print "Board " + board_ip + " failed in LO combination " + str(lo_comb) + ":"
+                print error
+                failed.append(lo_comb)
+
+        # LO combinations not reported (all the boards died before 
+        # running them, or while running them)
+        unreported = [lo_comb for lo_comb in lo_combinations if lo_comb not in reported]
+        if unreported:
+            print "LO combinations not reported by any board: " + str(unreported)
+        failed += unreported
+
+        for process in processes:
+            process.join()
+
+        return failed
+
+def run_board(experiment_class, board, datadir, lo_queue, result_queue):
+    """
+    Process function of a board. Creates the experiment with the board
+    parameters and runs LO combinations from the queue until it is empty.
+    :param experiment_class: class of the experiment to run.
+    :param board: dictionary with the config parameters of the board.
+    :param datadir: data directory of the main experiment.
+    :param lo_queue: queue with the pending LO combinations.
+    :param result_queue: queue to report the finished LO combinations,
+        as tuples (board ip, LO combination, error traceback or None).
+        Errors in the board setup are reported with LO combination None.
+    """
+    # no live plots in the board processes
+    plt.switch_backend('agg')
+
+    board = dict(board)
+    board['resume_dir'] = datadir
+    board_ip = str(board.get('roach_ip'))
+    try:
+        fpga = CalanFpga(board)
+        board_ip = fpga.settings.roach_ip
+        fpga.initialize()
+        experiment = experiment_class(fpga)
+        init_sources(experiment.sources)
+    except Exception:
+        result_queue.put((board_ip, None, traceback.format_exc()))
+        return
+
+    while True:
+        try:
+            lo_comb = lo_queue.get(True, 1)
+        except Queue.Empty:
+            break
+
+        try:
+            experiment.run_lo_comb(lo_comb)
+            result_queue.put((board_ip, lo_comb, None))
+        except Exception:
+            result_queue.put((board_ip, lo_comb, traceback.format_exc()))
+
+    turn_off_sources(experiment.sources)
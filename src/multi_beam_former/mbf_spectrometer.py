@@ -1,6 +1,7 @@
+import time
 import numpy as np
 from ..spectra_animator import SpectraAnimator
-from ..digital_sideband_separation.dss_calibrator import float2fixed
+from ..fixed_point import quantize, print_overflow_summary
 
 class MBFSpectrometer(SpectraAnimator):
     """
@@ -49,10 +50,11 @@ def write_phasor_reg(fpga, phasor, addrs, phase_bank_info, verbose=True):
     # 1. write phasor registers
     nbits = phase_bank_info['const_nbits']
     bin_pt = phase_bank_info['const_bin_pt']
-    phasor_re = float2fixed(nbits, bin_pt, np.real([phasor])) # Assuming 32-bit registers
-    phasor_im = float2fixed(nbits, bin_pt, np.imag([phasor])) # Assuming 32-bit registers
-    fpga.set_reg(phase_bank_info['phasor_regs'][0], phasor_re, verbose)
-    fpga.set_reg(phase_bank_info['phasor_regs'][1], phasor_im, verbose)
+    phasor_data = [np.real(phasor), np.imag(phasor)]
+    [phasor_re, phasor_im], overflow_mask = quantize(nbits, bin_pt, phasor_data) # Assuming 32-bit registers
+    print_overflow_summary(nbits, bin_pt, phasor_data, overflow_mask)
+    fpga.set_reg(phase_bank_info['phasor_regs'][0], int(phasor_re), verbose)
+    fpga.set_reg(phase_bank_info['phasor_regs'][1], int(phasor_im), verbose)
 
     # 2. write address register(s)
     if isinstance(phase_bank_info['addr_regs'], str): # case one register
@@ -67,17 +69,95 @@ def write_phasor_reg(fpga, phasor, addrs, phase_bank_info, verbose=True):
 
 def write_phasor_reg_list(fpga, phasor_list, addr_list, phase_bank_info, verbose=False):
     """
-    Write multiple phasors in a register bank using write_phasor_reg().
+    Write multiple phasors in a register bank using write_phasor_bank().
     :param fpga: CalanFpga object.
     :param phasor_list: list of phasors to write.
     :param addr_list: list of addresses to write into.
     :param phase_bank_info: dictionary with the info of the phase bank.
-        The dictionary format is the same as for write_phasor_reg_list.
+        The dictionary format is the same as for write_phasor_bank.
     :param verbose: True: be verbose when start wirting phasors.
     """
     if verbose:
         print("Writing phasor registers...")
-    for phasor, addr in zip(phasor_list, addr_list):
-        write_phasor_reg(fpga, phasor, addr, phase_bank_info, verbose=verbose)
+    write_phasor_bank(fpga, phasor_list, addr_list, phase_bank_info, verbose=False)
     if verbose:
         print("done")
+
+def write_phasor_bank(fpga, phasors, addr_list, phase_bank_info, verbose=True, phasors_fixed=None):
+    """
+    Write a whole array of phasors into a phase bank with the fewest
+    possible transactions. All the phasors are converted to fixed point at
+    once, unless they are given already converted (e.g. loaded from the 
+    phasor cache). If the phase bank info has the 'phasor_brams' key (the
+    model has a bram backed bank), the phasors are written directly in the
+    brams, over the data last written in them (the rest of the bank is
+    zero in the first write after programming the FPGA). Otherwise the
+    register bank protocol of write_phasor_reg() is used, but only the
+    registers that change from the previous phasor are written, and
+    without reading them back.
+    :param fpga: CalanFpga object.
+    :param phasors: array of phasors to write (of any shape, e.g. the 
+        (n_el, n_az, n_ports) steering phasors). The phasors are taken in 
+        row-major order.
+    :param addr_list: list of addresses of the phasors, in the same order.
+        Every address has the format of write_phasor_reg().
+    :param phase_bank_info: dictionary with the info of the phase bank.
+        The dictionary format is the same as for write_phasor_reg(), and
+        optionally for bram backed banks:
+        {'phasor_brams' : bram_info of the [real, imag] brams of the bank.
+         'bank_shape'   : number of addresses of every address register. The
+                          phasor with address (a0, a1, ...) is in the bram 
+                          word with row-major index of the address in bank_shape.
+        }
+    :param verbose: True: print the upload throughput.
+    :param phasors_fixed: list [real part, imaginary part] of the phasors
+        already converted to fixed point in the phase bank format (see
+        PhasorCache.save()), with the same shape as phasors. If None, the
+        phasors are converted here.
+    :return: upload throughput in phasors per second.
+    """
+    start_time = time.time()
+    
+    # convert all the phasors to fixed point
+    phasors = np.ravel(phasors)
+    if phasors_fixed is None:
+        nbits = phase_bank_info['const_nbits']
+        bin_pt = phase_bank_info['const_bin_pt']
+        phasor_data = [np.real(phasors), np.imag(phasors)]
+        [phasors_re, phasors_im], overflow_mask = quantize(nbits, bin_pt, phasor_data)
+        print_overflow_summary(nbits, bin_pt, phasor_data, overflow_mask)
+    else:
+        phasors_re, phasors_im = [np.ravel(phasor_data) for phasor_data in phasors_fixed]
+
+    # one address tuple per phasor (banks with a single address register
+    # get a flat list of addresses)
+    if np.ndim(addr_list) == 1:
+        addr_list = [[addrs] for addrs in addr_list]
+
+    if 'phasor_brams' in phase_bank_info: # bram backed bank
+        bram_info = phase_bank_info['phasor_brams']
+        indices = np.ravel_multi_index(np.transpose(addr_list), phase_bank_info['bank_shape'])
+        bank_re, bank_im = fpga.get_bram_image_raw(bram_info)
+        bank_re[indices] = phasors_re
+        bank_im[indices] = phasors_im
+        fpga.write_bram_data_raw(bram_info, np.array([bank_re, bank_im]))
+
+    else: # register bank
+        addr_regs = phase_bank_info['addr_regs']
+        if isinstance(addr_regs, str): # case one register
+            addr_regs = [addr_regs]
+        
+        reg_vals = {} # last value written in every register
+        for phasor_re, phasor_im, addrs in zip(phasors_re, phasors_im, addr_list):
+            regs = list(phase_bank_info['phasor_regs']) + list(addr_regs)
+            vals = [int(phasor_re), int(phasor_im)] + list(addrs)
+            for reg, val in zip(regs, vals):
+                if reg_vals.get(reg) != val:
+                    fpga.set_reg(reg, val, verbose=False, blindwrite=True)
+                    reg_vals[reg] = val
+            fpga.reset_reg(phase_bank_info['we_reg'], verbose=False, blindwrite=True)
+
+    throughput = len(phasors) / max(time.time() - start_time, 1e-9)
+    if verbose:
+        print "Wrote " + str(len(phasors)) + " phasors (" + str(int(throughput)) + " phasors/s)."
+    return throughput
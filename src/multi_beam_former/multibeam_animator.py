@@ -1,11 +1,12 @@
 import time
 import numpy as np
-from  itertools import chain
+from  itertools import chain, product
 from ..animator import Animator
 from ..calanfigure import CalanFigure
 from beamscan_axis import BeamscanAxis
 from single_beamscan import SingleBeamscan
-from mbf_spectrometer import write_phasor_reg_list
+from phasor_cache import PhasorCache
+from mbf_spectrometer import write_phasor_reg_list, write_phasor_bank
 
 class MultibeamAnimator(Animator, SingleBeamscan):
     """
@@ -37,6 +38,10 @@ class MultibeamAnimator(Animator, SingleBeamscan):
         self.figure.create_axis(0, BeamscanAxis, (self.az_angs[0], self.az_angs[-1]), 
             (self.el_angs[0], self.el_angs[-1]), azr[2], elr[2], self.figure.fig, self.settings.interpolation)
         
+        self.phasor_cache = None
+        if hasattr(self.settings, 'phasor_cache'):
+            self.phasor_cache = PhasorCache(**self.settings.phasor_cache)
+
         if self.settings.steer_beams:
             self.steer_beams()
         
@@ -45,30 +50,31 @@ class MultibeamAnimator(Animator, SingleBeamscan):
         Steer beams to appropate locations to create image.
         """
         print "Steering the beams for every beamformer..."
-        for i, el in enumerate(self.el_angs):
-            for j, az in enumerate(self.az_angs):
-                addrs = [[i,j,port] for port in range(self.nports)]
-                SingleBeamscan.steer_beam(self, addrs, az, el)
+        phasors, phasors_fixed = self.get_steering_phasors()
+        addrs = list(product(range(len(self.el_angs)), range(len(self.az_angs)), range(self.nports)))
+        write_phasor_bank(self.fpga, phasors, addrs, self.bf_phase_info, 
+            phasors_fixed=phasors_fixed)
         print "done"
     
     def get_data(self):
         """
-        Get the power data from all the beamformers.
+        Get the power data from all the beamformers. Only the freq_chnl
+        channel of every beamformer is read from the brams.
         """
         #checkpoint_time = time.time()
         #print "draw time: " + str(checkpoint_time - self.start_draw_time)
 
         #checkpoint_time = time.time()
-        spec_data = self.fpga.get_bram_data(self.bf_spec_info)
+        chnl_data = self.fpga.get_bram_channel_data(self.bf_spec_info, self.freq_chnl)
         #print "get_data time: " + str(time.time() - checkpoint_time)
         
         #checkpoint_time = time.time()
         if self.settings.plot_db:    
-            spec_data = self.scale_dbfs_spec_data(spec_data, self.bf_spec_info)
+            chnl_data = self.scale_dbfs_spec_data(chnl_data, self.bf_spec_info)
         #print "scale_dbfs time: " + str(time.time() - checkpoint_time)
 
         #checkpoint_time = time.time()
-        mbf_data = np.reshape(np.array(spec_data)[:, self.freq_chnl], (len(self.az_angs), len(self.el_angs)))
+        mbf_data = np.reshape(chnl_data, (len(self.az_angs), len(self.el_angs)))
         #print "reshape time: " + str(time.time() - checkpoint_time)
 
         #self.start_draw_time = time.time()
@@ -2,6 +2,7 @@ import time
 import numpy as np
 from itertools import product
 from multibeam_animator import MultibeamAnimator
+from mbf_spectrometer import write_phasor_bank
 
 class MultibeamAnimator64(MultibeamAnimator):
     """
@@ -13,13 +14,16 @@ class MultibeamAnimator64(MultibeamAnimator):
         """
         Steer beams to appropate locations to create image.
         """
-        angles_comb = product(self.el_angs, self.az_angs)
+        # phasors of every (el, az) combination, in product order
+        phasors, phasors_fixed = self.get_steering_phasors()
+        phasors = np.reshape(phasors, (-1, self.nports))
 
         print "Steering the beams for every beamformer..."
-        for i in range(4):
-            for j in range(4):
-                for t in range(4):
-                    addrs = [[i,j,t,port] for port in range(self.nports)]
-                    el, az = angles_comb.next()
-                    self.steer_beam(addrs, az, el)
+        addrs = list(product(range(4), range(4), range(4), range(self.nports)))
+        nbeams = len(addrs)/self.nports
+        if phasors_fixed is not None:
+            phasors_fixed = [np.reshape(phasor_data, (-1, self.nports))[:nbeams] 
+                for phasor_data in phasors_fixed]
+        write_phasor_bank(self.fpga, phasors[:nbeams], addrs, self.bf_phase_info, 
+            phasors_fixed=phasors_fixed)
         print "done"
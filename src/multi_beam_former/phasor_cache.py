@@ -0,0 +1,111 @@
+import os, json, glob, hashlib, tempfile
+import numpy as np
+from ..fixed_point import quantize
+
+class PhasorCache():
+    """
+    On-disk cache of the steering phasor tables of a phase array (see
+    steering_phasors()). Every table is saved in a npz file named by a
+    hash of the array geometry and frequency (array_info), the angle grid
+    and the fixed point format of the phase bank, so beam scans at known
+    configurations load the table instead of computing it (see
+    SingleBeamscan.get_steering_phasors()). The file times are updated on
+    every hit, and when the cache has more than maxentries tables the least
+    recently used ones are removed.
+    """
+    version = 1 # change when the table format changes
+
+    def __init__(self, cachedir, maxentries=32):
+        """
+        :param cachedir: directory where the tables are saved. It is
+            created if it doesn't exists.
+        :param maxentries: maximum number of tables saved in the cache.
+        """
+        self.cachedir = os.path.expanduser(cachedir)
+        self.maxentries = maxentries
+        if not os.path.exists(self.cachedir):
+            os.makedirs(self.cachedir)
+
+    def get_key(self, array_info, el_angs, az_angs, phase_bank_info):
+        """
+        Compute the key of a phasor table.
+        :param array_info: dictionary with all the information of the phase array.
+        :param el_angs: list of elevation angles of the grid in degrees.
+        :param az_angs: list of azimuth angles of the grid in degrees.
+        :param phase_bank_info: dictionary with the info of the phase bank.
+        :return: hexadecimal hash string.
+        """
+        keydata = {'version'  : self.version,
+                   'array_info' : array_info,
+                   'el_angs'  : np.asarray(el_angs, dtype=np.float64).tolist(),
+                   'az_angs'  : np.asarray(az_angs, dtype=np.float64).tolist(),
+                   'nbits'    : phase_bank_info['const_nbits'],
+                   'bin_pt'   : phase_bank_info['const_bin_pt']}
+        return hashlib.sha1(json.dumps(keydata, sort_keys=True)).hexdigest()
+
+    def load(self, array_info, el_angs, az_angs, phase_bank_info):
+        """
+        Load a steering phasor table from the cache.
+        :param array_info: dictionary with all the information of the phase array.
+        :param el_angs: list of elevation angles of the grid in degrees.
+        :param az_angs: list of azimuth angles of the grid in degrees.
+        :param phase_bank_info: dictionary with the info of the phase bank.
+        :return: tuple (phasors, phasors_fixed) (see save()), or None if
+            the table is not in the cache.
+        """
+        key = self.get_key(array_info, el_angs, az_angs, phase_bank_info)
+        filename = os.path.join(self.cachedir, key + '.npz')
+        if not os.path.exists(filename):
+            return None
+
+        try:
+            tables = np.load(filename)
+            phasors = tables['phasors']
+            phasors_fixed = [tables['phasors_re'], tables['phasors_im']]
+            tables.close()
+        except (IOError, KeyError, ValueError):
+            print "Warning: Corrupted phasor cache file " + filename + ", ignoring it."
+            return None
+
+        os.utime(filename, None) # mark as recently used
+        return phasors, phasors_fixed
+
+    def save(self, array_info, el_angs, az_angs, phase_bank_info, phasors):
+        """
+        Save a steering phasor table in the cache, with its fixed point
+        representation in the phase bank format.
+        :param array_info: dictionary with all the information of the phase array.
+        :param el_angs: list of elevation angles of the grid in degrees.
+        :param az_angs: list of azimuth angles of the grid in degrees.
+        :param phase_bank_info: dictionary with the info of the phase bank.
+        :param phasors: (n_el, n_az, n_ports) array of saturated complex phasors.
+        :return: tuple (phasors, phasors_fixed), where phasors_fixed is the
+            list [real part, imaginary part] of the fixed point phasors.
+        """
+        key = self.get_key(array_info, el_angs, az_angs, phase_bank_info)
+        filename = os.path.join(self.cachedir, key + '.npz')
+
+        nbits = phase_bank_info['const_nbits']
+        bin_pt = phase_bank_info['const_bin_pt']
+        phasors_re, _ = quantize(nbits, bin_pt, np.real(phasors))
+        phasors_im, _ = quantize(nbits, bin_pt, np.imag(phasors))
+
+        # write to a temporary file first, so an interrupted write
+        # never leaves a partial table in the cache
+        tmpfd, tmpname = tempfile.mkstemp(suffix='.tmp', dir=self.cachedir)
+        with os.fdopen(tmpfd, 'wb') as tmpfile:
+            np.savez(tmpfile, phasors=phasors, phasors_re=phasors_re, phasors_im=phasors_im)
+        os.rename(tmpname, filename)
+        self.evict()
+
+        return phasors, [phasors_re, phasors_im]
+
+    def evict(self):
+        """
+        Remove the least recently used tables until the cache has at most
+        maxentries tables.
+        """
+        filenames = glob.glob(os.path.join(self.cachedir, '*.npz'))
+        filenames.sort(key=os.path.getmtime)
+        for filename in filenames[:max(len(filenames)-self.maxentries, 0)]:
+            os.remove(filename)
@@ -1,12 +1,14 @@
 import time, datetime
 import numpy as np
 import matplotlib.pyplot as plt
-from  itertools import chain
+from  itertools import chain, product
+from scipy.interpolate import RegularGridInterpolator
 from ..experiment import Experiment
 from ..calanfigure import CalanFigure
 from beamscan_axis import BeamscanAxis
-from mbf_spectrometer import write_phasor_reg_list
-from ..digital_sideband_separation.dss_calibrator import check_overflow
+from mbf_spectrometer import write_phasor_reg_list, write_phasor_bank
+from phasor_cache import PhasorCache
+from ..fixed_point import saturate_fixed_comp
 
 class SingleBeamscan(Experiment):
     """
@@ -34,6 +36,17 @@ class SingleBeamscan(Experiment):
         self.el_angs = range(elr[0], elr[1]+elr[2], elr[2])
         self.n_angs = len(self.az_angs) * len(self.el_angs)
 
+        # minimum time between live plot redraws [s]
+        self.redraw_interval = 0.5
+        if hasattr(self.settings, 'redraw_interval'):
+            self.redraw_interval = self.settings.redraw_interval
+
+        # adaptive scan: coarse pass with 1 of every 'coarse_step' angles, and
+        # refinement around the coarse points within 'threshold' dB of the peak
+        self.adaptive_scan = None
+        if hasattr(self.settings, 'adaptive_scan'):
+            self.adaptive_scan = self.settings.adaptive_scan
+
         # figure and axis
         self.figure = CalanFigure(n_plots=1, create_gui=False)
         self.figure.create_axis(0, BeamscanAxis, (self.az_angs[0], self.az_angs[-1]), 
@@ -45,53 +58,126 @@ class SingleBeamscan(Experiment):
         self.bf_phase_info['addr_regs'] = self.bf_phase_info['addr_regs'][2]
         self.addrs = range(self.nports)
 
+        # steering phasors of all the scan directions
+        self.phasor_cache = None
+        if hasattr(self.settings, 'phasor_cache'):
+            self.phasor_cache = PhasorCache(**self.settings.phasor_cache)
+        self.phasors, self.phasors_fixed = self.get_steering_phasors()
+
     def perform_single_beamscan(self):
         """
-        Perform the beam scan.
+        Perform the beam scan. The scan image is preallocated and updated
+        one point at a time. In the adaptive scan mode, only a coarse grid
+        and the surroundings of the lobes are measured, and the rest of the
+        image is interpolated from the coarse grid.
         """
         # steering the beam through all positions and get single channel power
         print "Making beamscan..."
         start_time = time.time()
-        scan_data = []
-
-        for el in self.el_angs:
-            for az in self.az_angs:
-                self.steer_beam(self.addrs, az, el)
-
-                spec_data = self.fpga.get_bram_data_sync(self.bf_spec_info)[0] # data only from first beamformer
-                spec_data = self.scale_dbfs_spec_data(spec_data, self.bf_spec_info)
-                scan_data.append(spec_data[self.freq_chnl])
-
-                scan_mat = np.pad(scan_data, (0,self.n_angs-len(scan_data)), 'minimum') # pad the data with the minimum value
-                                                                                        # (for proper imshow plotting)
-                scan_mat = np.reshape(scan_mat, (len(self.az_angs), len(self.el_angs))) # turn the data into a matrix
-                
-                # update plot
-                self.figure.plot_axes(scan_mat)
-                plt.pause(0.00001)
+        n_el, n_az = len(self.el_angs), len(self.az_angs)
+        self.scan_mat = np.full((n_el, n_az), np.nan)
+        self.last_draw_time = 0
+
+        if self.adaptive_scan is None:
+            self.scan_points(product(range(n_el), range(n_az)))
+        
+        else:
+            # coarse pass (always including the grid edges)
+            step = self.adaptive_scan['coarse_step']
+            coarse_el = sorted(set(range(0, n_el, step) + [n_el-1]))
+            coarse_az = sorted(set(range(0, n_az, step) + [n_az-1]))
+            self.scan_points(product(coarse_el, coarse_az))
+            coarse_mat = self.scan_mat[np.ix_(coarse_el, coarse_az)]
+
+            # refine around the coarse points above the threshold
+            refine_mask = np.zeros((n_el, n_az), dtype=bool)
+            lobes = coarse_mat >= np.max(coarse_mat) - self.adaptive_scan['threshold']
+            for ci, cj in zip(*np.nonzero(lobes)):
+                i, j = coarse_el[ci], coarse_az[cj]
+                refine_mask[max(i-step+1, 0):i+step, max(j-step+1, 0):j+step] = True
+            refine_mask &= np.isnan(self.scan_mat)
+            self.scan_points(zip(*np.nonzero(refine_mask)))
+
+            # interpolate the non measured points from the coarse grid
+            interpolator = RegularGridInterpolator((coarse_el, coarse_az), coarse_mat)
+            grid_points = np.array(list(product(range(n_el), range(n_az))))
+            interp_mat = np.reshape(interpolator(grid_points), (n_el, n_az))
+            nmeasured = np.count_nonzero(~np.isnan(self.scan_mat))
+            self.scan_mat = np.where(np.isnan(self.scan_mat), interp_mat, self.scan_mat)
+            print "Measured " + str(nmeasured) + " of " + str(self.n_angs) + " points."
         
+        self.plot_scan_mat()
         print("Beamscan ended. Time beamscanning: " + str(time.time() - start_time))
-        self.print_beamscan_plot(scan_mat, self.figure.axes[0].img.get_extent())
+        self.print_beamscan_plot(self.scan_mat, self.figure.axes[0].img.get_extent())
+
+    def scan_points(self, points):
+        """
+        Measure the power of the beam pointing to some points of the grid,
+        and update the scan image with them. The live plot is redrawn at most
+        once every redraw_interval seconds.
+        :param points: list of (elevation index, azimuth index) of the points.
+        """
+        for i, j in points:
+            if self.phasors_fixed is None:
+                self.write_phasors(self.addrs, self.phasors[i, j])
+            else:
+                self.write_phasors(self.addrs, self.phasors[i, j],
+                    [phasor_data[i, j] for phasor_data in self.phasors_fixed])
+
+            spec_data = self.fpga.get_bram_data_sync(self.bf_spec_info)[0] # data only from first beamformer
+            spec_data = self.scale_dbfs_spec_data(spec_data, self.bf_spec_info)
+            self.scan_mat[i, j] = spec_data[self.freq_chnl]
+
+            if time.time() - self.last_draw_time >= self.redraw_interval:
+                self.plot_scan_mat()
 
-    def steer_beam(self, addrs, az, el):
+    def plot_scan_mat(self):
         """
-        Given a phase array antenna that outputs into the ROACH,
-        set the appropiate phasor constants so that the array points
-        to a given direction (in azimuth and elevation angles). The exact 
-        phasors are computed using the ang2phasors() functions and the 
-        array_info parameter from the config script.
+        Update the live plot with the current scan image. The points not
+        measured yet are plotted with the minimum measured value (for proper
+        imshow plotting).
+        """
+        plot_mat = np.where(np.isnan(self.scan_mat), np.nanmin(self.scan_mat), self.scan_mat)
+        self.figure.plot_axes(plot_mat)
+        plt.pause(0.00001)
+        self.last_draw_time = time.time()
+
+    def get_steering_phasors(self):
+        """
+        Get the steering phasors of all the directions of the scan grid, from
+        the phasor cache if it is configured and has them, or computing them
+        with steering_phasors() (and saving them in the cache).
+        :return: tuple (phasors, phasors_fixed), with phasors the (n_el, n_az, 
+            n_ports) array with the phasors, and phasors_fixed the list [real 
+            part, imaginary part] of the fixed point phasors in the phase bank 
+            format (see PhasorCache.save()), or None if there is no cache.
+        """
+        nbits = self.bf_phase_info['const_nbits']
+        bin_pt = self.bf_phase_info['const_bin_pt']
+        if self.phasor_cache is None:
+            return steering_phasors(self.array_info, self.el_angs, self.az_angs, nbits, bin_pt), None
+
+        cached = self.phasor_cache.load(self.array_info, self.el_angs, 
+            self.az_angs, self.bf_phase_info)
+        if cached is not None:
+            print "Steering phasors loaded from cache."
+            return cached
+        phasors = steering_phasors(self.array_info, self.el_angs, self.az_angs, nbits, bin_pt)
+        return self.phasor_cache.save(self.array_info, self.el_angs, self.az_angs, 
+            self.bf_phase_info, phasors)
+
+    def write_phasors(self, addrs, phasor_list, phasors_fixed=None):
+        """
+        Write the steering phasors of a beam, previously computed with 
+        steering_phasors().
         :param addrs: list of addresses from the phase bank where to set the constants.
-        :param az: azimuth angle to point the beam in degrees.
-        :param el: elevation angle to point the beam in degrees.
+        :param phasor_list: phasor constants for every element of the array.
+        :param phasors_fixed: list [real part, imaginary part] of the phasors
+            already in fixed point (see write_phasor_bank()), or None.
         """
-        phasor_list = angs2phasors(self.array_info, el, az)
-        
-        # harcoded fix_18_17 assumed from model
-        phasor_list = saturate_fixed_comp(18, 17, phasor_list)
-        check_overflow(18, 17, np.real(phasor_list))
-        check_overflow(18, 17, np.imag(phasor_list))
-        
-        write_phasor_reg_list(self.fpga, phasor_list, addrs, self.bf_phase_info, verbose=False)
+        # the overflow check is done in the fixed point conversion
+        write_phasor_bank(self.fpga, phasor_list, addrs, self.bf_phase_info, 
+            verbose=False, phasors_fixed=phasors_fixed)
 
     def print_beamscan_plot(self, scan_mat, extent):
         """
@@ -111,6 +197,45 @@ class SingleBeamscan(Experiment):
 
         plt.savefig('single_beamscan ' + datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S') + '.pdf')
 
+def steering_phasors(array_info, el_angs, az_angs, nbits=18, bin_pt=17):
+    """
+    Computes the phasor constants for every element of a 2D phase array
+    antenna to point a beam to every direction of an elevation/azimuth
+    grid, all at once with array operations. The phasors are saturated
+    to the fixed point representation of the beamformer constants (see
+    saturate_fixed_comp()). All the necesary information on the phase
+    array (geometry and frequency) should be contained in the array_info 
+    dictionary (see angs2phasors()).
+    :param array_info: dictionary with all the information 
+        of the phase array.
+    :param el_angs: list of elevation angles of the grid in degrees.
+    :param az_angs: list of azimuth angles of the grid in degrees.
+    :param nbits: bitwidth of the fixed point constants.
+    :param bin_pt: binary point of the fixed point constants.
+    :return: array of shape (n_el, n_az, n_ports) with the phasor constants
+        of every direction of the grid.
+    """
+    wavelength = array_info['speed'] / array_info['freq']
+
+    # get array element positions in meters (n_ports, 3)
+    el_pos = wavelength * array_info['el_sep'] * np.array(array_info['el_pos'])
+    el_pos = np.reshape(el_pos, (-1, 3))
+
+    # convert angles into standard ISO shperical coordinates in radians
+    # (instead of (0,0) being the array perpendicular direction)
+    theta = np.radians(90 - np.array(el_angs, dtype=np.float64))[:, np.newaxis]
+    phi = np.radians(90 - np.array(az_angs, dtype=np.float64))[np.newaxis, :]
+
+    # directions of arrival (n_el, n_az, 3)
+    a = np.stack(np.broadcast_arrays(-np.sin(theta) * np.cos(phi), 
+        -np.sin(theta) * np.sin(phi), -np.cos(theta)), axis=-1)
+    k = 2 * np.pi / wavelength * a  # wave-number vectors
+
+    # Calculate array manifold vectors (n_el, n_az, n_ports)
+    v = np.exp(-1j * np.einsum('eac,pc->eap', k, el_pos))
+
+    return saturate_fixed_comp(nbits, bin_pt, np.conj(v))
+
 def angs2phasors(array_info, theta, phi): 
     """
     Computes the phasor constants for every element of
@@ -128,57 +253,5 @@ def angs2phasors(array_info, theta, phi):
     :return: phase constants for every element in the array to
         set in order to properly point the array to the desired direction.
     """
-    wavelength = array_info['speed'] / array_info['freq']
-
-    # get array element positions in meters
-    el_pos = wavelength * array_info['el_sep'] * np.array(array_info['el_pos'])
-
-    # convert angles into standard ISO shperical coordinates
-    # (instead of (0,0) being the array perpendicular direction)
-    theta = 90 - theta 
-    phi = 90 - phi
-
-    # convert angles into radians
-    theta = np.radians(theta)
-    phi = np.radians(phi)
-
-    a = np.array([-np.sin(theta) * np.cos(phi), -np.sin(theta) * np.sin(phi), -np.cos(theta)])  # direction of arrival
-    k = 2 * np.pi / wavelength * a  # wave-number vector
-
-    # Calculate array manifold vector
-    v = np.exp(-1j * np.dot(el_pos, k))
-
-    return list(np.conj(v).flatten())
-
-def saturate_fixed_comp(nbits, bin_pt, data):
-    """
-    Receives a complex number and saturates its real
-    and imaginary part, in order that naither of them
-    surpass the upper and lower limits given by a fixed
-    representation of nbits bits and binary point bin_pt.
-    In case of saturation both the real and imaginary part
-    are scaled in order to conserve the angle of the 
-    original data.
-    :param nbits: bitwidth of the signed fixed point representation.
-    :param bin_pt: binary point of the signed fixed point representation.
-    :param data: complex number or data list to check.
-    :return: number or list with the saturated data.
-    """
-    if isinstance(data, complex): # case single data
-        max_val = (2.0**(nbits-1)-1) / (2**bin_pt)
-        min_val = (-2.0**(nbits-1))  / (2**bin_pt)
-
-        data_real = np.real(data)
-        data_imag = np.imag(data)
-
-        # case upper saturation
-        if data_real > max_val or data_imag > max_val:
-            data = data / ((max([data_real, data_imag]) / max_val) + 0.0001)
-        # case lower saturation
-        if data_real < min_val or data_imag < min_val:
-            data = data / ((min([data_real, data_imag]) / min_val) + 0.001)
-        return data
-
-    else: # case list of data
-        return [saturate_fixed_comp(nbits, bin_pt, data_el) for data_el in data]
-        
+    # no saturation (nbits large enough to represent the unit phasors)
+    return list(steering_phasors(array_info, [theta], [phi], 64, 0)[0, 0])
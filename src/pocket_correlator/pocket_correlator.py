@@ -5,6 +5,8 @@ from ..experiment import Experiment, get_nchannels, init_sources, turn_off_sourc
 from ..calanfigure import CalanFigure
 from ..instruments.generator import Generator, create_generator
 from ..axes.spectrum_axis import SpectrumAxis
+from ..frequency_sweep import FrequencySweep
+from ..tone_comb import ToneComb
 from mag_ratio_axis import MagRatioAxis
 from angle_diff_axis import AngleDiffAxis
 
@@ -33,6 +35,14 @@ class PocketCorrelator(Experiment):
         # sources
         self.rf_source = create_generator(self.settings.test_source)
 
+        # tone comb for the sweep. If the config file has the comb_sources 
+        # parameter (list of generators), their tones are added to the test 
+        # source tone to measure several channels at once
+        self.sources = [self.rf_source]
+        if hasattr(self.settings, 'comb_sources'):
+            self.sources += [create_generator(comb_source) for comb_source in self.settings.comb_sources]
+        self.comb = ToneComb(self.sources, self.test_channels)
+
         # figures and axes
         self.n_inputs = len(self.settings.spec_titles)
         self.figure = CalanFigure(n_plots=self.n_inputs+2, create_gui=False)
@@ -58,40 +68,15 @@ class PocketCorrelator(Experiment):
         and compute the magnitude ratios and the phase differences at
         the outputs.
         """
-        ratios = [[] for i in range(len(self.legends))]
-        init_sources(self.rf_source)
+        self.ratios = np.nan * np.ones((len(self.legends), len(self.test_channels)), dtype=np.complex128)
+        init_sources(self.sources)
 
         print "Computing correlation..."
-        for i, chnl in enumerate(self.test_channels):
-            # set generator frequency
-            self.rf_source.set_freq_mhz(self.freqs[chnl])
-            time.sleep(self.settings.pause_time)
-
-            # get spectrum and cross spectrum data
-            pow_data = self.fpga.get_bram_data(self.settings.spec_info)
-            crosspow_data = self.fpga.get_bram_data(self.settings.crosspow_info)
-
-            # combine real and imaginary part of crosspow data
-            crosspow_data = np.array(crosspow_data[0::2]) + 1j*np.array(crosspow_data[1::2])
-
-            # compute the complex ratios (magnitude ratio and phase difference)
-            # use first input as reference
-            aa = pow_data[0][chnl]
-            for j, ab in enumerate(crosspow_data):
-                ratios[j].append(np.conj(ab[chnl]) / aa) # (ab*)* / aa* = a*b / aa* = b/a
-                
-            # plot spectrum
-            spec_data_dbfs = self.scale_dbfs_spec_data(pow_data, self.settings.spec_info)
-            for j, spec in enumerate(spec_data_dbfs):
-                self.figure.axes[j].plot(spec)
-            
-            # plot the magnitude ratio and phase difference
-            self.figure.axes[-2].plotxy(self.test_freqs[:i+1], np.abs(ratios))
-            self.figure.axes[-1].plotxy(self.test_freqs[:i+1], np.angle(ratios, deg=True))
+        sweep = FrequencySweep(self.fpga, self.sources, self.settings.spec_info, plt.pause)
+        sweep.run(self.comb.get_points(self.freqs), self.read_corr_data, self.reduce_corr_point, 
+            self.comb.points_channels)
 
-            plt.pause(self.settings.pause_time)
-
-        self.rf_source.turn_output_off()
+        turn_off_sources(self.sources)
         print "done"
 
         # print plot
@@ -102,10 +87,48 @@ class PocketCorrelator(Experiment):
 
         # save data
         print "Saving data..."
-        ratios_mag = np.abs(ratios).tolist() 
-        ratios_ang = np.angle(ratios, deg=True).tolist() 
+        ratios_mag = np.abs(self.ratios).tolist() 
+        ratios_ang = np.angle(self.ratios, deg=True).tolist() 
         self.testinfo['correlation_magnitudes'] = ratios_mag
         self.testinfo['correlation_angles'] = ratios_ang
         with open(self.datadir+'.json', 'w') as jsonfile:
             json.dump(self.testinfo, jsonfile, indent=4)
         print "done"
+
+    def read_corr_data(self):
+        """
+        Read the power and crosspower data of the current sweep point.
+        :return: tuple with the power data and complex crosspower data.
+        """
+        pow_data = self.fpga.get_bram_data(self.settings.spec_info)
+        crosspow_data = self.fpga.get_bram_data(self.settings.crosspow_info)
+
+        # combine real and imaginary part of crosspow data
+        crosspow_data = np.array(crosspow_data[0::2]) + 1j*np.array(crosspow_data[1::2])
+
+        return pow_data, crosspow_data
+
+    def reduce_corr_point(self, i, data):
+        """
+        Compute the complex ratios (magnitude ratio and phase difference)
+        of the channels of a sweep point (one for each comb tone) and plot 
+        the results.
+        :param i: index of the point in the sweep.
+        :param data: power and crosspower data read with read_corr_data().
+        """
+        pow_data, crosspow_data = data
+
+        for k, chnl in zip(self.comb.points_indices[i], self.comb.points_channels[i]):
+            # use first input as reference
+            aa = pow_data[0][chnl]
+            for j, ab in enumerate(crosspow_data):
+                self.ratios[j][k] = np.conj(ab[chnl]) / aa # (ab*)* / aa* = a*b / aa* = b/a
+            
+        # plot spectrum
+        spec_data_dbfs = self.scale_dbfs_spec_data(pow_data, self.settings.spec_info)
+        for j, spec in enumerate(spec_data_dbfs):
+            self.figure.axes[j].plot(spec)
+        
+        # plot the magnitude ratio and phase difference (unmeasured channels are nan)
+        self.figure.axes[-2].plotxy(self.test_freqs, np.abs(self.ratios))
+        self.figure.axes[-1].plotxy(self.test_freqs, np.angle(self.ratios, deg=True))
@@ -0,0 +1,112 @@
+import threading, Queue
+import numpy as np
+import h5py
+
+class RawDataStore():
+    """
+    Appendable store for the raw data of the sweeps of an experiment (e.g.
+    the calibration and SRR sweeps of an LO combination in the DSS test),
+    saved in a single HDF5 file instead of one file per channel. Every
+    sweep is a group of the file, and every array of a sweep point is a
+    row of a chunked and compressed dataset of the group, indexed by the
+    point index in the sweep (the channels of the point are saved as
+    another dataset of the group).
+    The writes are done in a background thread, so the compression doesn't
+    stall the measurements. The number of points completely written in
+    every sweep is saved as the 'npoints' attribute of its group, and the
+    file is flushed after every point, so an interrupted run can be resumed
+    with the saved points.
+    """
+    def __init__(self, filename):
+        """
+        Open the store, or create it if it doesn't exists.
+        :param filename: name of the HDF5 file.
+        """
+        self.h5file = h5py.File(filename, 'a')
+        self.error = None
+        self.queue = Queue.Queue()
+        self.thread = threading.Thread(target=self.write_loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def append(self, sweep, index, **arrays):
+        """
+        Queue the data of a sweep point to be written in the store.
+        :param sweep: name of the sweep.
+        :param index: index of the point in the sweep.
+        :param arrays: arrays of the point, as keyword arguments.
+        """
+        self.check_error()
+        self.queue.put((sweep, index, arrays))
+
+    def read(self, sweep, npoints):
+        """
+        Read the data of the first points of a sweep. Waits for the pending
+        writes to finish before reading.
+        :param sweep: name of the sweep.
+        :param npoints: number of points to read.
+        :return: list of dictionaries with the arrays of every point. It can
+            be shorter than npoints if not all the points were saved.
+        """
+        self.queue.join()
+        self.check_error()
+        if sweep not in self.h5file:
+            return []
+
+        group = self.h5file[sweep]
+        npoints = min(npoints, group.attrs.get('npoints', 0))
+        return [dict([(key, group[key][i]) for key in group]) for i in range(npoints)]
+
+    def close(self):
+        """
+        Wait for the pending writes to finish and close the store.
+        """
+        self.queue.put(None)
+        self.thread.join()
+        self.h5file.close()
+        self.check_error()
+
+    def check_error(self):
+        """
+        Raise the error of the writer thread, if any.
+        """
+        if self.error is not None:
+            raise self.error
+
+    def write_loop(self):
+        """
+        Writer thread function. Writes the queued points until the store
+        is closed.
+        """
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            try:
+                if self.error is None:
+                    self.write_point(*item)
+            except Exception as error:
+                self.error = error
+            self.queue.task_done()
+
+    def write_point(self, sweep, index, arrays):
+        """
+        Write the data of a sweep point in the file.
+        :param sweep: name of the sweep.
+        :param index: index of the point in the sweep.
+        :param arrays: dictionary with the arrays of the point.
+        """
+        group = self.h5file.require_group(sweep)
+        for key, value in arrays.items():
+            value = np.asarray(value)
+            if key not in group:
+                group.create_dataset(key, shape=(0,)+value.shape, maxshape=(None,)+value.shape,
+                    dtype=value.dtype, chunks=(1,)+value.shape, compression='gzip', shuffle=True)
+            dataset = group[key]
+            if dataset.shape[0] <= index:
+                dataset.resize(index+1, axis=0)
+            dataset[index] = value
+
+        group.attrs['npoints'] = max(group.attrs.get('npoints', 0), index+1)
+        self.h5file.flush()
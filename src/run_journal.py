@@ -0,0 +1,83 @@
+import os, json
+
+class RunJournal():
+    """
+    Persistent journal of a long experiment run. It records the steps
+    completed (e.g. a calibration sweep for an LO combination), the number
+    of points completed in every sweep, and small results (e.g. SRR arrays),
+    so that a crashed or interrupted run can be resumed skipping the
+    finished work. The journal is saved as a json file after every update.
+    """
+    def __init__(self, datadir):
+        """
+        Load the journal from datadir, or create an empty one if it
+        doesn't exists.
+        :param datadir: directory of the data to journal.
+        """
+        self.filename = datadir + '/journal.json'
+        self.journal = {'points': {}, 'done': [], 'results': {}}
+        if os.path.exists(self.filename):
+            with open(self.filename, 'r') as jsonfile:
+                self.journal = json.load(jsonfile)
+
+    def save(self):
+        """
+        Save the journal in its json file. The file is first written in a
+        temporary file and then renamed, so a crash in the middle of the
+        save doesn't corrupt the journal.
+        """
+        tmp_filename = self.filename + '.tmp'
+        with open(tmp_filename, 'w') as jsonfile:
+            json.dump(self.journal, jsonfile, indent=4)
+        os.rename(tmp_filename, self.filename)
+
+    def get_points(self, step):
+        """
+        Get the number of points completed in a sweep.
+        :param step: name of the sweep.
+        :return: number of completed points.
+        """
+        return self.journal['points'].get(step, 0)
+
+    def set_points(self, step, npoints):
+        """
+        Set the number of points completed in a sweep.
+        :param step: name of the sweep.
+        :param npoints: number of completed points.
+        """
+        self.journal['points'][step] = npoints
+        self.save()
+
+    def is_done(self, step):
+        """
+        Check if a step is completed.
+        :param step: name of the step.
+        :return: True if the step is completed, False otherwise.
+        """
+        return step in self.journal['done']
+
+    def set_done(self, step):
+        """
+        Mark a step as completed.
+        :param step: name of the step.
+        """
+        if step not in self.journal['done']:
+            self.journal['done'].append(step)
+            self.save()
+
+    def get_result(self, name):
+        """
+        Get a result saved in the journal.
+        :param name: name of the result.
+        :return: saved result, or None if not saved.
+        """
+        return self.journal['results'].get(name)
+
+    def set_result(self, name, value):
+        """
+        Save a small result in the journal (e.g. an SRR array).
+        :param name: name of the result.
+        :param value: result, a list or a numpy array.
+        """
+        self.journal['results'][name] = [float(val) for val in value]
+        self.save()
@@ -0,0 +1,126 @@
+import time
+import numpy as np
+
+class SettleDetector():
+    """
+    Detects when the spectrometer data is valid after a change in the
+    system (generator retune, constant loading, register change, etc.).
+    It watches the accumulation counter register of the spectrometer
+    ('acc_count_reg' key in bram_info, a register that the FPGA increases
+    by 1 every time a new accumulation is ready in the brams), and the
+    power of the monitored channel. The data is declared valid once a full
+    accumulation has landed after the change, and the power of the channel
+    between consecutive accumulations is stable within tolerance.
+    If the bram_info has no accumulation counter, it waits a fixed time
+    as before.
+    The tolerance and timeout can be set in the config file with the
+    optional parameters settle_tol (relative power variation) and
+    settle_timeout (in seconds).
+    """
+    def __init__(self, calanfpga, bram_info, fixed_time, pause_func=time.sleep):
+        """
+        :param calanfpga: CalanFpga object.
+        :param bram_info: bram_info dictionary of the spectrometer to watch.
+        :param fixed_time: time to wait (in seconds) if the spectrometer has
+            not accumulation counter.
+        :param pause_func: function used for the fixed time waits.
+            Use plt.pause for experiments with live plots.
+        """
+        self.fpga = calanfpga
+        self.settings = self.fpga.settings
+        self.bram_info = bram_info
+        self.acc_count_reg = bram_info.get('acc_count_reg')
+        self.fixed_time = fixed_time
+        self.pause_func = pause_func
+        self.poll_time = 0.001
+        self.settle_times = []
+
+        self.tolerance = 0.05
+        if hasattr(self.settings, 'settle_tol'):
+            self.tolerance = self.settings.settle_tol
+        self.timeout = 10
+        if hasattr(self.settings, 'settle_timeout'):
+            self.timeout = self.settings.settle_timeout
+
+    def wait_settled(self, chnl=None):
+        """
+        Wait until the spectrometer data is valid after a change.
+        The time taken is appended to self.settle_times.
+        :param chnl: channel to monitor (e.g. the channel of the test tone).
+            If None the total power of the spectra is monitored
+            (useful for broadband noise inputs).
+        :return: accumulation counter value of the valid data, or None if
+            there is not accumulation counter.
+        """
+        start_time = time.time()
+        if self.acc_count_reg is None:
+            self.pause_func(self.fixed_time)
+            self.settle_times.append(time.time() - start_time)
+            return None
+
+        # the accumulation in progress could have started before the change,
+        # so wait for a full accumulation after it
+        acc_count = self.wait_acc(self.read_acc_count(), 2, start_time)
+        prev_power = self.read_power(chnl)
+
+        while True:
+            acc_count = self.wait_acc(acc_count, 1, start_time)
+            power = self.read_power(chnl)
+            if np.all(np.abs(power - prev_power) <= self.tolerance * np.abs(prev_power)):
+                break
+            if time.time() - start_time > self.timeout:
+                print "Warning: data not settled after " + str(self.timeout) + "[s]." + \
+                    " Using last accumulation."
+                break
+            prev_power = power
+
+        self.settle_times.append(time.time() - start_time)
+        return self.read_acc_count()
+
+    def wait_acc(self, start_count, n_accs, start_time):
+        """
+        Wait for a number of new accumulations.
+        :param start_count: accumulation counter value to count from.
+        :param n_accs: number of new accumulations to wait.
+        :param start_time: start time of the settle, used for the timeout.
+        :return: accumulation counter value after the wait.
+        """
+        while True:
+            acc_count = self.read_acc_count()
+            # np.uint32 is to deal with overflow in 32-bit registers
+            if np.uint32(acc_count - start_count) >= n_accs:
+                return acc_count
+            if time.time() - start_time > self.timeout:
+                print "Warning: accumulation counter stopped after " + str(self.timeout) + "[s]."
+                return acc_count
+            time.sleep(self.poll_time)
+
+    def read_acc_count(self):
+        """
+        Read the accumulation counter register.
+        :return: accumulation counter value.
+        """
+        return self.fpga.read_reg(self.acc_count_reg)
+
+    def read_power(self, chnl):
+        """
+        Read the power of the monitored channel in all the spectra.
+        :param chnl: channel to monitor. If None the total power is used.
+        :return: array with the power of each spectrum.
+        """
+        data = np.array(self.fpga.get_bram_data(self.bram_info), dtype=np.float64)
+        if chnl is None:
+            return np.sum(data, axis=-1)
+        return data[..., chnl]
+
+    def get_settle_summary(self):
+        """
+        Get a summary string of the settle times recorded.
+        :return: string with the number of settles, and the mean and max
+            settle time.
+        """
+        if not self.settle_times:
+            return "No settles recorded"
+        return str(len(self.settle_times)) + " settles, mean " + \
+            str(np.mean(self.settle_times)) + "[s], max " + \
+            str(np.max(self.settle_times)) + "[s]"
@@ -0,0 +1,44 @@
+import numpy as np
+
+class ToneComb():
+    """
+    Frequency comb made with several generators (one tone per generator),
+    used to measure several channels in a single acquisition. The channels
+    to measure are split in as many interleaved groups as tones, and every
+    acquisition (sweep point) sets one tone in each group. Between
+    acquisitions the comb offset is rotated one channel until all the
+    channels are covered, so the number of acquisitions is the number of
+    channels divided by the number of tones.
+    With a single generator it is equivalent to a standard tone sweep.
+    """
+    def __init__(self, sources, channels):
+        """
+        :param sources: list of generator objects, one for each tone.
+        :param channels: list of channels to measure.
+        """
+        self.sources = sources
+        self.channels = channels
+        self.ntones = len(sources)
+        nchannels = len(channels)
+        spacing = int(np.ceil(nchannels / float(self.ntones)))
+
+        # indices in the channels list of the tones of every acquisition.
+        # When the number of channels is not a multiple of the number of
+        # tones, the last acquisitions have less tones and the remaining
+        # generators keep their previous frequency, which is never a
+        # channel measured in the current acquisition.
+        self.points_indices = []
+        for offset in range(spacing):
+            self.points_indices.append(range(offset, nchannels, spacing))
+        self.points_channels = [[channels[i] for i in indices]
+            for indices in self.points_indices]
+
+    def get_points(self, chnl_freqs):
+        """
+        Get the sweep points of the comb.
+        :param chnl_freqs: array with the tone frequency (in MHz) for every
+            channel of the spectrometer.
+        :return: list of sweep points, each one a list with the frequencies
+            of the tones.
+        """
+        return [[chnl_freqs[chnl] for chnl in chnls] for chnls in self.points_channels]